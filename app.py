@@ -109,7 +109,7 @@ with st.sidebar:
 if st.session_state.page == 'admin':
     st.title("ניהול נתונים ותשתיות")
     
-    tab1, tab2 = st.tabs(["📥 טעינת קבצים", "📜 היסטוריית טעינות"])
+    tab1, tab2, tab3 = st.tabs(["📥 טעינת קבצים", "📜 היסטוריית טעינות", "🕰️ מכונת זמן"])
     
     with tab1:
         st.markdown("##### טעינת דוח שבועי חדש")
@@ -120,13 +120,11 @@ if st.session_state.page == 'admin':
         if uploaded_file:
             with st.spinner("מבצע ETL וניתוח נתונים..."):
                 try:
-                    # Run ETL
-                    clean_df = etl.process_file(uploaded_file)
-                    # Save to DB
-                    upload_id = db.save_snapshot(clean_df, uploaded_file.name)
+                    # Run ETL + Save to DB, chunk by chunk (bounded memory)
+                    upload_id, total_rows = db.save_snapshot_stream(etl.iter_chunks(uploaded_file), uploaded_file.name)
                     
                     st.success(f"✅ הטעינה הושלמה בהצלחה! (מזהה טעינה: {upload_id})")
-                    st.markdown(f"**סיכום טעינה:** {len(clean_df)} רשומות נקלטו בבסיס הנתונים.")
+                    st.markdown(f"**סיכום טעינה:** {total_rows} רשומות נקלטו בבסיס הנתונים.")
                     
                 except ValueError as e:
                     st.error(f"❌ שגיאת מבנה קובץ: {e}")
@@ -141,6 +139,51 @@ if st.session_state.page == 'admin':
         else:
             st.info("עדיין לא בוצעו טעינות.")
 
+    with tab3:
+        st.markdown("##### השוואה בין שני דוחות שבועיים")
+        history = db.get_upload_history()
+        if len(history) < 2:
+            st.info("נדרשות לפחות שתי טעינות כדי להשוות.")
+        else:
+            labels = {row.upload_id: f"#{row.upload_id} • {str(row.upload_date)[:16]} • {row.filename}" for row in history.itertuples()}
+            col_a, col_b = st.columns(2)
+            with col_a:
+                upload_a = st.selectbox("דוח בסיס", list(labels), index=1, format_func=labels.get)
+            with col_b:
+                upload_b = st.selectbox("דוח להשוואה", list(labels), index=0, format_func=labels.get)
+
+            changes = db.diff(int(upload_a), int(upload_b))
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.markdown(f'<div class="metric-card"><div>תהליכים חדשים</div><h2 style="color:{config.COLORS["success"]}">{len(changes["added"])}</h2></div>', unsafe_allow_html=True)
+            with col2:
+                st.markdown(f'<div class="metric-card"><div>תהליכים שנעלמו</div><h2 style="color:{config.COLORS["danger"]}">{len(changes["removed"])}</h2></div>', unsafe_allow_html=True)
+            with col3:
+                st.markdown(f'<div class="metric-card"><div>שינויי סטטוס</div><h2 style="color:{config.COLORS["secondary"]}">{len(changes["status_changed"])}</h2></div>', unsafe_allow_html=True)
+
+            st.markdown("###")
+            for title, key in [("שינויי סטטוס", "status_changed"), ("חדשים", "added"), ("נעלמו", "removed")]:
+                if not changes[key].empty:
+                    with st.expander(f"{title} ({len(changes[key])})"):
+                        st.dataframe(changes[key], use_container_width=True)
+
+            st.markdown("##### תמונת מצב לתאריך")
+            as_of_date = st.date_input("תאריך", value=pd.Timestamp(history['upload_date'].iloc[0]).date())
+            counts = db.status_counts_as_of(as_of_date)
+            if counts:
+                st.bar_chart(pd.Series(counts, name="מועמדים"))
+            else:
+                st.info("לא קיימת טעינה עד לתאריך זה.")
+
+            st.markdown("##### היסטוריית תהליך")
+            app_hash = st.text_input("מזהה תהליך (app_hash)")
+            if app_hash:
+                versions = db.history(app_hash.strip())
+                if versions.empty:
+                    st.info("לא נמצאו גרסאות לתהליך זה.")
+                else:
+                    st.dataframe(versions, use_container_width=True)
+
 # PAGE: DASHBOARD (Phase 2 Preview)
 elif st.session_state.page == 'dashboard':
     df = db.get_latest_snapshot()
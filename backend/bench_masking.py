@@ -0,0 +1,78 @@
+# bench_masking.py
+# Benchmark: masking.mask_frame (unique values, keyed BLAKE2b) vs. the original per-cell sha256 apply.
+# Usage: python bench_masking.py [rows ...]   (default: 100000 1000000)
+import hashlib
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import masking
+
+SENSITIVE = ['ת.ז', 'טלפון נייד', 'כתובת']
+BENCH_KEY = b"bench-mask-key"
+
+
+def legacy_mask_sensitive_data(df):
+    """The original implementation, kept verbatim as the baseline"""
+    sensitive_keywords = ['ת.ז', 'תעודת זהות', 'id', 'טלפון', 'נייד', 'phone', 'כתובת']
+    for col in df.columns:
+        col_lower = str(col).lower()
+        if any(keyword in col_lower for keyword in sensitive_keywords):
+            df[col] = df[col].astype(str).apply(
+                lambda x: hashlib.sha256(x.encode()).hexdigest()[:12] if pd.notnull(x) and str(x).lower() not in ['nan', 'none', ''] else None
+            )
+            df.rename(columns={col: f"{col}_MASKED_SECURE"}, inplace=True)
+    return df
+
+
+def make_export(rows, seed=42):
+    """Synthetic ATS export with three sensitive columns (IDs and phones mostly unique, addresses repeating)"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'שם מועמד': [f"מועמד {i}" for i in range(rows)],
+        'ת.ז': rng.integers(10**8, 10**9, rows),
+        'טלפון נייד': [f"05{a}-{b:07d}" for a, b in zip(rng.integers(0, 9, rows), rng.integers(0, 10**7, rows))],
+        'כתובת': [f"רחוב {i} תל אביב" for i in rng.integers(0, rows // 20 + 1, rows)],
+    })
+    df.loc[::10, 'כתובת'] = None
+    return df
+
+
+def masked(df, executor=None):
+    df = df.copy()
+    masking.mask_frame(df, key=BENCH_KEY, executor=executor)
+    return df
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    workers = min(4, multiprocessing.cpu_count())
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    pool.submit(int).result()
+
+    print(f"{'rows':>10} | {'legacy (s)':>10} | {'mask (s)':>8} | {f'pool x{workers} (s)':>12} | {'speedup':>7}")
+    print("-" * 60)
+    for rows in sizes:
+        df = make_export(rows)
+        legacy_secs, _ = timed(legacy_mask_sensitive_data, df.copy())
+        fast_secs, serial = timed(masked, df)
+        pool_secs, pooled = timed(masked, df, pool)
+        # Same tokens with or without the pool, and empty cells stay empty
+        assert serial.equals(pooled)
+        assert serial['כתובת'].isna().sum() == df['כתובת'].isna().sum()
+        best = min(fast_secs, pool_secs)
+        print(f"{rows:>10,} | {legacy_secs:>10.2f} | {fast_secs:>8.2f} | {pool_secs:>12.2f} | {legacy_secs / best:>6.1f}x")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
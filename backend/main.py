@@ -1,5 +1,6 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 import pandas as pd
 import sqlite3
 import shutil
@@ -10,8 +11,34 @@ import json
 import hashlib
 import io
 import re
+import asyncio
+import atexit
+import base64
+import calendar
+import collections
+import codecs
+import functools
+import itertools
+import multiprocessing
+import openpyxl
+import tempfile
+import threading
+import time
+import zipfile
+import queue
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import sys
+import logging
+
+# מודולי השורש (מנוע ה-Snapshot של Streamlit) משותפים גם ל-API
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+import etl_engine
 
 app = FastAPI()
+logger = logging.getLogger("phoenix")
 
 # ==========================================
 # מנוע קליטת נתוני ATS, אבטחת מידע ואיכות נתונים
@@ -20,51 +47,125 @@ app = FastAPI()
 # ==========================================
 # PII SCRUBBING ENGINE
 # ==========================================
-class PIIScrubber:
-    @staticmethod
-    def scrub_text_for_ai(text: str) -> tuple:
-        """
-        סורק טקסט חופשי ומצנזר נתונים מזהים לפני שליחה ל-AI.
-        מחזיר את הטקסט המצונזר + סטטיסטיקות לצורך Audit Log.
-        """
-        if not text:
-            return text, {}
+# מעבר regex יחיד עם גלאים נפרדים (ת.ז עם ספרת ביקורת, IBAN, כתובות...) - ראו pii.py
+import pii
+from pii import PIIScrubber
+import masking
 
-        stats = {"id_cards": 0, "phones": 0, "emails": 0}
+# ==========================================
+# AUDIT SINK (כתיבה מרוכזת ל-Audit Log)
+# ==========================================
+# אירועים נצברים בזיכרון ונכתבים במנות: כשהמנה מתמלאת או כל AUDIT_FLUSH_SECONDS, בטרנזקציה אחת
+AUDIT_FLUSH_ROWS = int(os.getenv("PHOENIX_AUDIT_FLUSH_ROWS", "200"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("PHOENIX_AUDIT_FLUSH_SECONDS", "0.5"))
+AUDIT_INSERT = "INSERT INTO audit_logs (id, timestamp, action, status, details, user) VALUES (?, ?, ?, ?, ?, ?)"
 
-        id_pattern = r'\b\d{9}\b'
-        stats["id_cards"] = len(re.findall(id_pattern, text))
-        text = re.sub(id_pattern, '[ID_SECURED]', text)
 
-        phone_pattern = r'\b05\d-?\d{7}\b'
-        stats["phones"] = len(re.findall(phone_pattern, text))
-        text = re.sub(phone_pattern, '[PHONE_SECURED]', text)
+class AuditSink:
+    """
+    Buffer בתהליך ל-Audit Log: emit לא נוגע במסד, thread רקע אחד מרוקן את המאגר.
+    flush נכשל => השורות חוזרות לראש המאגר ונכתבות בסבב הבא, כך שהסדר נשמר ושום אירוע לא הולך לאיבוד.
+    close (כיבוי השרת) עוצר את ה-thread ומרוקן את כל מה שנשאר.
+    """
+    def __init__(self, flush_rows=AUDIT_FLUSH_ROWS, flush_seconds=AUDIT_FLUSH_SECONDS):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def emit(self, row):
+        with self._lock:
+            self._buffer.append(row)
+            pending = len(self._buffer)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+        if self._closed:
+            self.flush()
+        elif pending >= self.flush_rows:
+            self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # השורות חזרו למאגר - ננסה שוב בסבב הבא. כל שגיאה (לא רק של SQLite) נרשמת ולא עוצרת את ה-thread
+                logger.exception("Audit sink flush failed; %d events kept for retry", len(self._buffer))
+
+    def flush(self):
+        """כותב את כל מה שבמאגר בטרנזקציה אחת. מחזיר את מספר האירועים שנכתבו"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                with db_pool.writer() as conn:
+                    try:
+                        conn.executemany(AUDIT_INSERT, rows)
+                    except sqlite3.IntegrityError:
+                        # התנגשות מזהה אקראי לא מפילה את כל המנה: שורה-שורה, ומזהה חדש למתנגשת
+                        conn.rollback()
+                        for row in rows:
+                            _insert_audit_row(conn, row)
+                    bump_data_version(conn, "audit")
+                    conn.commit()
+            except BaseException:
+                with self._lock:
+                    self._buffer[:0] = rows
+                raise
+            return len(rows)
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.flush()
+
+
+def _new_audit_id():
+    return f"LOG-{uuid.uuid4().hex[:8].upper()}"
+
+
+def _insert_audit_row(conn, row):
+    while True:
+        try:
+            conn.execute(AUDIT_INSERT, row)
+            return
+        except sqlite3.IntegrityError:
+            row = (_new_audit_id(), *row[1:])
 
-        email_pattern = r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+'
-        stats["emails"] = len(re.findall(email_pattern, text))
-        text = re.sub(email_pattern, '[EMAIL_SECURED]', text)
 
-        return text, stats
+audit_sink = AuditSink()
+atexit.register(audit_sink.close)
 
-def log_audit_action(action: str, status: str, details: str, user: str = "System"):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    log_id = f"LOG-{uuid.uuid4().hex[:6].upper()}"
+
+def log_audit_action(action: str, status: str, details: str, user: str = "System", conn=None):
+    """
+    כתיבה ל-Audit Log. בלי conn האירוע נכנס ל-audit_sink ונכתב במנה הבאה (ללא גישה למסד בבקשה).
+    מי שמחזיק בחיבור הכותב מעביר אותו, והאירוע נכתב מיד כחלק מהטרנזקציה שלו
+    """
     timestamp = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO audit_logs (id, timestamp, action, status, details, user) VALUES (?, ?, ?, ?, ?, ?)",
-              (log_id, timestamp, action, status, details, user))
+    row = (_new_audit_id(), timestamp, action, status, details, user)
+    if conn is None:
+        audit_sink.emit(row)
+        return
+    _insert_audit_row(conn, row)
+    bump_data_version(conn, "audit")
     conn.commit()
-    conn.close()
 
 def mask_sensitive_data(df):
-    sensitive_keywords = ['ת.ז', 'תעודת זהות', 'id', 'טלפון', 'נייד', 'phone', 'כתובת']
-    for col in df.columns:
-        col_lower = str(col).lower()
-        if any(keyword in col_lower for keyword in sensitive_keywords):
-            df[col] = df[col].astype(str).apply(
-                lambda x: hashlib.sha256(x.encode()).hexdigest()[:12] if pd.notnull(x) and str(x).lower() not in ['nan', 'none', ''] else None
-            )
-            df.rename(columns={col: f"{col}_MASKED_SECURE"}, inplace=True)
+    """ממסך במקום עמודות רגישות (ת.ז, טלפון, כתובת) ב-hash מפתחי, לפני שהנתונים נוגעים במסד - ראו masking.py"""
+    # במכונה עם ליבה אחת מאגר התהליכים רק מוסיף עלות העברה
+    masking.mask_frame(df, executor=cpu_work.executor if CPU_WORKERS > 1 else None)
     return df
 
 @app.post("/upload/{file_type}")
@@ -97,17 +198,478 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 DB_PATH = "phoenix_enterprise.db"  # מסד נתונים חדש לגמרי כדי לא להתנגש בישן
 
 # ==========================================
-# 1. ENTITY RELATIONSHIP MODEL (יצירת הטבלאות)
+# CONNECTION POOL (חיבורים קבועים ל-SQLite במצב WAL)
 # ==========================================
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+DB_READ_POOL_SIZE = int(os.getenv("PHOENIX_DB_READERS", "4"))
+DB_STATEMENT_CACHE = 256  # Prepared statements שנשמרים לכל חיבור
+
+# מוחלים פעם אחת על כל חיבור ביצירתו - לא בכל בקשה
+DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",       # קוראים לא נחסמים ע"י כותב
+    "PRAGMA synchronous = NORMAL",     # בטוח ב-WAL, חוסך fsync על כל commit
+    "PRAGMA cache_size = -65536",      # 64MB page cache לחיבור
+    "PRAGMA mmap_size = 268435456",    # 256MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+class ConnectionPool:
+    """
+    מאגר חיבורים קבוע: כותב יחיד (SQLite מאפשר כותב אחד בכל רגע) ומספר קוראים.
+    החיבורים נפתחים בעצלות ונשארים פתוחים לכל אורך חיי התהליך.
+    """
+    def __init__(self, db_path, readers=DB_READ_POOL_SIZE):
+        self.db_path = db_path
+        self._idle_readers = queue.LifoQueue()  # LIFO - החיבור ה"חם" ביותר חוזר ראשון
+        self._reader_slots = threading.BoundedSemaphore(readers)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._all = []
+        self._all_lock = threading.Lock()
+
+    def _connect(self, read_only=False):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+        for pragma in DB_PRAGMAS:
+            conn.execute(pragma)
+        if read_only:
+            conn.execute("PRAGMA query_only = ON")
+        with self._all_lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._idle_readers.get_nowait()
+            except queue.Empty:
+                conn = self._connect(read_only=True)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle_readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    @contextmanager
+    def writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect()
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+            else:
+                # כתיבה שלא נסגרה ב-commit לא "דולפת" לבקשה הבאה
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+
+    def close_all(self):
+        with self._all_lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+        self._writer = None
+        self._idle_readers = queue.LifoQueue()
+
+
+db_pool = ConnectionPool(DB_PATH)
+
+
+def get_read_conn():
+    """Dependency: חיבור קריאה בלבד מהמאגר, מוחזר בסוף הבקשה"""
+    with db_pool.reader() as conn:
+        yield conn
+
+
+def get_write_conn():
+    """Dependency: החיבור הכותב היחיד (בלעדי לאורך הבקשה)"""
+    with db_pool.writer() as conn:
+        yield conn
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    # אירועי Audit שעדיין במאגר נכתבים לפני שהחיבורים נסגרים
+    audit_sink.close()
+    db_pool.close_all()
+
+
+# ==========================================
+# EXECUTION MODEL (מאגרי ביצוע לפי סוג עבודה)
+# ==========================================
+# handler אסינכרוני לא מריץ עבודה חוסמת על ה-event loop. כל סוג עבודה עובר למאגר משלו עם מגבלות משלו:
+#   io     - דיסק ו-SQLite מתוך handlers אסינכרוניים (threads)
+#   cpu    - רינדור PDF, צנזור ומיסוך PII, בתהליכים נפרדים כדי שלא יתחרה ב-GIL עם בקשות ה-GET
+#   ingest - קליטת קבצי ATS (ראו INGESTION JOBS)
+IO_WORKERS = int(os.getenv("PHOENIX_IO_WORKERS", "8"))
+IO_MAX_PENDING = int(os.getenv("PHOENIX_IO_MAX_PENDING", "64"))
+CPU_WORKERS = int(os.getenv("PHOENIX_CPU_WORKERS", str(min(2, os.cpu_count() or 1))))
+CPU_MAX_PENDING = int(os.getenv("PHOENIX_CPU_MAX_PENDING", "8"))
+
+
+class WorkClass:
+    """
+    מאגר ביצוע עם מגבלת קבלה: עד max_pending משימות (רצות + ממתינות), מעבר לזה 429 מיידי
+    במקום תור שגדל בלי גבול. המאגר עצמו נוצר בעצלות, בשימוש הראשון.
+    """
+    def __init__(self, name, make_executor, max_pending):
+        self.name = name
+        self._make_executor = make_executor
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @property
+    def executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = self._make_executor()
+            return self._executor
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(status_code=429, detail=f"השרת עמוס ({self.name}), נסו שוב בעוד רגע")
+        return await self._run_in_slot(fn, *args)
+
+    async def run_queued(self, fn, *args, poll=0.05):
+        """כמו run, אבל ממתין למקום פנוי במקום 429 - לעבודות אצווה שכבר התחילו להזרים תשובה"""
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(poll)
+        return await self._run_in_slot(fn, *args)
+
+    async def _run_in_slot(self, fn, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+io_work = WorkClass("io", lambda: ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io"), IO_MAX_PENDING)
+# spawn ולא fork: fork של תהליך עם threads פתוחים (מאגר החיבורים, הקליטה) אינו בטוח.
+# תהליך העבודה טוען רק את המודול של הפונקציה (pdf_render, pii, masking) - לא את main.
+cpu_work = WorkClass("cpu", lambda: ProcessPoolExecutor(max_workers=CPU_WORKERS,
+                                                         mp_context=multiprocessing.get_context("spawn")),
+                     CPU_MAX_PENDING)
+
+
+@app.on_event("shutdown")
+def shutdown_work_pools():
+    io_work.shutdown()
+    cpu_work.shutdown()
+
+# ==========================================
+# FULL-TEXT SEARCH (FTS5 על שם מועמד, משרה ומגייס)
+# ==========================================
+# rowid של האינדקס = rowid של applications. טריגרים שומרים על סנכרון בכל קליטה, עדכון ו-Revert
+SEARCH_INDEX_TRIGGERS = (
+    '''CREATE TRIGGER IF NOT EXISTS applications_fts_insert AFTER INSERT ON applications BEGIN
+           INSERT INTO applications_fts (rowid, candidate_name, job_title, recruiter)
+           VALUES (new.rowid, (SELECT name FROM candidates WHERE id = new.candidate_id),
+                   (SELECT job_title FROM jobs WHERE id = new.job_id), new.recruiter);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS applications_fts_update AFTER UPDATE OF recruiter, candidate_id, job_id ON applications BEGIN
+           DELETE FROM applications_fts WHERE rowid = old.rowid;
+           INSERT INTO applications_fts (rowid, candidate_name, job_title, recruiter)
+           VALUES (new.rowid, (SELECT name FROM candidates WHERE id = new.candidate_id),
+                   (SELECT job_title FROM jobs WHERE id = new.job_id), new.recruiter);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS applications_fts_delete AFTER DELETE ON applications BEGIN
+           DELETE FROM applications_fts WHERE rowid = old.rowid;
+       END''',
+)
+
+
+def create_search_index(c):
+    """יוצר את אינדקס ה-FTS5 ובונה אותו פעם אחת מהנתונים הקיימים"""
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'applications_fts'").fetchone()
+    if not exists:
+        # unicode61 מפרק גם עברית למילים; prefix מאיץ חיפוש תחיליות קצרות
+        c.execute('''CREATE VIRTUAL TABLE applications_fts USING fts5(
+                     candidate_name, job_title, recruiter, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')''')
+        c.execute('''INSERT INTO applications_fts (rowid, candidate_name, job_title, recruiter)
+                     SELECT a.rowid, c.name, j.job_title, a.recruiter
+                     FROM applications a
+                     LEFT JOIN candidates c ON a.candidate_id = c.id
+                     LEFT JOIN jobs j ON a.job_id = j.id''')
+    for trigger in SEARCH_INDEX_TRIGGERS:
+        c.execute(trigger)
+
+
+def build_search_query(search):
+    """טקסט חופשי -> שאילתת MATCH: כל מילה היא תחילית, וכל המילים חייבות להופיע"""
+    terms = [t.replace('"', '') for t in search.split()]
+    return " ".join(f'"{t}"*' for t in terms if t)
+
+
+# ==========================================
+# STATUS TAXONOMY (סיווג סטטוסים מחושב מראש)
+# ==========================================
+# סיווג סטטוס כמסכת ביטים - תהליך יכול להשתייך לכמה שלבי משפך במקביל
+STATUS_CLOSED, STATUS_HIRED, STATUS_SCREEN, STATUS_INTERVIEW, STATUS_OFFER = 1, 2, 4, 8, 16
+STATUS_CLASS_PATTERNS = {
+    STATUS_CLOSED: ['קליטה', 'גיוס', 'דחייה', 'הסרה', 'ויתור', 'הקפאה'],
+    STATUS_HIRED: ['קליטה', 'גיוס'],
+    STATUS_SCREEN: ['טלפוני', 'ראשוני', 'ראיון HR', 'מנהל'],
+    STATUS_INTERVIEW: ['ראיון HR', 'משאבי אנוש', 'ראיון מנהל', 'מקצועי', 'מרכז הערכה'],
+    STATUS_OFFER: ['הצעת שכר', 'חוזה', 'ממתין לחתימה'],
+}
+STATUS_CLASS_REGEX = {flag: re.compile('|'.join(map(re.escape, patterns)), re.IGNORECASE)
+                      for flag, patterns in STATUS_CLASS_PATTERNS.items()}
+# חתימת הטקסונומיה - שינוי בהגדרות למעלה מפעיל סיווג מחדש של המחרוזות הייחודיות בלבד
+STATUS_TAXONOMY_VERSION = hashlib.md5(json.dumps(STATUS_CLASS_PATTERNS, sort_keys=True).encode()).hexdigest()
+
+
+def classify_status(status):
+    if not status:
+        return 0
+    return sum(flag for flag, regex in STATUS_CLASS_REGEX.items() if regex.search(status))
+
+
+def register_statuses(c, statuses):
+    """מסווג מחרוזות סטטוס שעוד לא נראו (פעם אחת לכל מחרוזת ייחודית, לא לכל שורה)"""
+    c.executemany("INSERT OR IGNORE INTO status_taxonomy (status, status_class) VALUES (?, ?)",
+                  [(s, classify_status(s)) for s in statuses if s is not None])
+
+
+def classify_unclassified(c):
+    """משלים status_class לתהליכים שעוד לא סווגו (מסד מגרסה קודמת)"""
+    register_statuses(c, [s for (s,) in c.execute(
+        "SELECT DISTINCT status FROM applications WHERE status_class IS NULL").fetchall()])
+    c.execute('''UPDATE applications SET status_class = COALESCE(
+                     (SELECT t.status_class FROM status_taxonomy t WHERE t.status = applications.status), 0)
+                 WHERE status_class IS NULL''')
+
+
+def sync_status_taxonomy(c):
+    """
+    אם הגדרות הטקסונומיה השתנו - מסווג מחדש כל מחרוזת ייחודית פעם אחת,
+    ומעדכן רק את התהליכים שהקוד שלהם השתנה (טריגרי הקוביה מעבירים אותם בין דליים).
+    """
+    row = c.execute("SELECT value FROM system_settings WHERE key = 'status_taxonomy_version'").fetchone()
+    if row and row[0] == STATUS_TAXONOMY_VERSION:
+        return
+    changed = [(code, status) for status, old_code in c.execute("SELECT status, status_class FROM status_taxonomy").fetchall()
+               if (code := classify_status(status)) != old_code]
+    c.executemany("UPDATE status_taxonomy SET status_class = ? WHERE status = ?", changed)
+    # עדכון לפי מחרוזת - דרך האינדקס על status
+    c.executemany("UPDATE applications SET status_class = ? WHERE status = ?", changed)
+    if changed:
+        # ה-KPI זזו בין דליים בלי כתיבה של משתמש - ה-ETag של נתוני ה-ATS חייב להשתנות
+        bump_data_version(c, "ats")
+    c.execute("INSERT OR REPLACE INTO system_settings (key, value) VALUES ('status_taxonomy_version', ?)",
+              (STATUS_TAXONOMY_VERSION,))
+
+
+# ==========================================
+# KPI ROLLUP CUBE (אגרגציות מתוחזקות בטריגרים)
+# ==========================================
+SLA_SERVICE_PATTERNS = ['שירות', 'מכירות', 'מוקדים']  # מוקדים: 29 יום, מטה/טכנולוגי: 44 יום
+OVERDUE_DAYS = 40
+
+
+def _like_any(expr, patterns):
+    return " OR ".join(f"{expr} LIKE '%{p}%'" for p in patterns)
 
+
+def _rollup_row_sql(row, department):
+    """ביטויי המפתח והמדדים של שורת applications אחת (new / old / a) בקוביה"""
+    return {
+        "year": f"COALESCE(CAST(strftime('%Y', {row}.start_date) AS INTEGER), 0)",
+        "month": f"COALESCE(CAST(strftime('%m', {row}.start_date) AS INTEGER), 0)",
+        "department": f"COALESCE({department}, '')",
+        "recruiter": f"COALESCE({row}.recruiter, '')",
+        "job_id": f"{row}.job_id",
+        "status_class": f"COALESCE({row}.status_class, 0)",
+        "days": f"COALESCE({row}.days_in_process, 0)",
+        "sla": f"(COALESCE({row}.days_in_process, 0) > CASE WHEN {_like_any(department, SLA_SERVICE_PATTERNS)} THEN 29 ELSE 44 END)",
+        "overdue": f"(COALESCE({row}.days_in_process, 0) > {OVERDUE_DAYS})",
+    }
+
+
+ROLLUP_KEYS = ("year", "month", "department", "recruiter", "job_id", "status_class")
+
+
+def _rollup_add_sql(row):
+    dept = f"(SELECT department FROM jobs WHERE id = {row}.job_id)"
+    r = _rollup_row_sql(row, dept)
+    return f'''INSERT INTO kpi_rollup ({", ".join(ROLLUP_KEYS)}, applications, sum_days, max_days, sla_breaches, overdue)
+               VALUES ({", ".join(r[k] for k in ROLLUP_KEYS)}, 1, {r["days"]}, {r["days"]}, {r["sla"]}, {r["overdue"]})
+               ON CONFLICT ({", ".join(ROLLUP_KEYS)}) DO UPDATE SET
+                   applications = applications + 1, sum_days = sum_days + excluded.sum_days,
+                   max_days = MAX(max_days, excluded.max_days),
+                   sla_breaches = sla_breaches + excluded.sla_breaches, overdue = overdue + excluded.overdue;'''
+
+
+def _rollup_remove_sql(row):
+    dept = f"(SELECT department FROM jobs WHERE id = {row}.job_id)"
+    r = _rollup_row_sql(row, dept)
+    a = _rollup_row_sql("a", dept)
+    key = " AND ".join(f"{k} = {r[k]}" for k in ROLLUP_KEYS)
+    same_bucket = " AND ".join(f"{a[k]} = {r[k]}" for k in ROLLUP_KEYS if k not in ("department", "job_id"))
+    # MAX אינו הפיך: מחושב מחדש רק כשהשורה שיצאה הייתה המקסימום של דלי שנשארו בו תהליכים,
+    # ורק מתוך התהליכים של אותה משרה באותו חודש (האינדקס על משרה + תאריך התחלה)
+    return f'''UPDATE kpi_rollup SET
+                   applications = applications - 1, sum_days = sum_days - {r["days"]},
+                   sla_breaches = sla_breaches - {r["sla"]}, overdue = overdue - {r["overdue"]},
+                   max_days = CASE WHEN applications = 1 OR {r["days"]} < max_days THEN max_days ELSE
+                       (SELECT MAX(a.days_in_process) FROM applications a
+                        WHERE a.job_id = {row}.job_id
+                          AND a.start_date >= date({row}.start_date, 'start of month')
+                          AND a.start_date < date({row}.start_date, 'start of month', '+1 month')
+                          AND {same_bucket}) END
+               WHERE {key};
+               DELETE FROM kpi_rollup WHERE {key} AND applications <= 0;'''
+
+
+def create_kpi_rollup(c):
+    """קוביית KPI ברזולוציית (שנה, חודש, מחלקה, מגייס, משרה, סיווג סטטוס) - מתעדכנת באותה טרנזקציה של הקליטה/Revert"""
+    exists = c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'kpi_rollup'").fetchone()
+    if not exists:
+        # מפתחות NOT NULL: ב-SQLite ערכי NULL במפתח ראשי לא מתנגשים ב-ON CONFLICT
+        c.execute('''CREATE TABLE kpi_rollup (
+                     year INTEGER NOT NULL, month INTEGER NOT NULL, department TEXT NOT NULL, recruiter TEXT NOT NULL,
+                     job_id TEXT NOT NULL, status_class INTEGER NOT NULL,
+                     applications INTEGER NOT NULL, sum_days INTEGER NOT NULL, max_days INTEGER,
+                     sla_breaches INTEGER NOT NULL, overdue INTEGER NOT NULL,
+                     PRIMARY KEY (year, month, department, recruiter, job_id, status_class))''')
+        r = _rollup_row_sql("a", "j.department")
+        c.execute(f'''INSERT INTO kpi_rollup
+                      SELECT {", ".join(r[k] for k in ROLLUP_KEYS)}, COUNT(*), SUM({r["days"]}), MAX({r["days"]}),
+                             SUM({r["sla"]}), SUM({r["overdue"]})
+                      FROM applications a LEFT JOIN jobs j ON a.job_id = j.id
+                      WHERE a.job_id IS NOT NULL
+                      GROUP BY {", ".join(str(i + 1) for i in range(len(ROLLUP_KEYS)))}''')
+
+
+def create_kpi_triggers(c):
+    """הטריגרים נבנים מחדש בכל עלייה - גוף הטריגר נגזר מהקוד ולא רק מהסכמה"""
+    for trigger in ("kpi_rollup_insert", "kpi_rollup_delete", "kpi_rollup_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    c.execute(f"CREATE TRIGGER kpi_rollup_insert AFTER INSERT ON applications BEGIN {_rollup_add_sql('new')} END")
+    c.execute(f"CREATE TRIGGER kpi_rollup_delete AFTER DELETE ON applications BEGIN {_rollup_remove_sql('old')} END")
+    c.execute(f'''CREATE TRIGGER kpi_rollup_update
+                  AFTER UPDATE OF status_class, recruiter, days_in_process, start_date, job_id ON applications BEGIN
+                  {_rollup_remove_sql('old')} {_rollup_add_sql('new')} END''')
+
+
+def load_kpi_buckets(conn, department="all", recruiter="all", timeframe="all", group_by=("year", "month", "status_class")):
+    """
+    דלי הקוביה אחרי חיתוכי הדשבורד, מגולגלים לרזולוציה group_by בתוך SQLite.
+    '30 יום' חוצה חודשים, לכן נבנה באותה צורה ישירות מהתהליכים שבחלון (דרך האינדקס על תאריך ההתחלה).
+    """
+    filters, params = [], []
+    if timeframe == "30days":
+        r = _rollup_row_sql("a", "j.department")
+        source = f'''(SELECT {", ".join(f"{r[k]} AS {k}" for k in ROLLUP_KEYS)},
+                             COUNT(*) AS applications, SUM({r["days"]}) AS sum_days, MAX({r["days"]}) AS max_days,
+                             SUM({r["sla"]}) AS sla_breaches, SUM({r["overdue"]}) AS overdue
+                      FROM applications a LEFT JOIN jobs j ON a.job_id = j.id
+                      WHERE a.start_date >= ?
+                      GROUP BY {", ".join(str(i + 1) for i in range(len(ROLLUP_KEYS)))})'''
+        params.append((pd.Timestamp.now() - pd.Timedelta(days=30)).strftime('%Y-%m-%d'))
+    else:
+        source = "kpi_rollup"
+        if timeframe == "year":
+            filters.append("year = ?")
+            params.append(pd.Timestamp.now().year)
+    if department != "all":
+        filters.append("department = ?")
+        params.append(department)
+    if recruiter != "all":
+        filters.append("recruiter = ?")
+        params.append(recruiter)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    cols = ", ".join(group_by)
+    return pd.read_sql(f'''SELECT {cols}, SUM(applications) AS applications, SUM(sum_days) AS sum_days,
+                                  MAX(max_days) AS max_days, SUM(sla_breaches) AS sla_breaches, SUM(overdue) AS overdue
+                           FROM {source} {where} GROUP BY {cols}''', conn, params=params)
+
+
+# ==========================================
+# FINOPS VENDOR TOTALS (סכומי ספקים מתוחזקים בטריגרים)
+# ==========================================
+# total_paid / active_invoices של ספק נגזרים מהחשבוניות שלו (finops_invoices.vendor = finops_vendors.name)
+FINOPS_PAID_STATUS = "שולם"
+
+
+def _vendor_delta_sql(row, sign):
+    """מוסיף (+) או מוריד (-) את תרומת חשבונית אחת (new / old) מהסכומים של הספק שלה"""
+    paid = f"CASE WHEN {row}.status = '{FINOPS_PAID_STATUS}' THEN COALESCE({row}.amount, 0) ELSE 0 END"
+    return f'''UPDATE finops_vendors SET
+                   total_paid = ROUND(COALESCE(total_paid, 0) {sign} {paid}, 2),
+                   active_invoices = COALESCE(active_invoices, 0) {sign} ({row}.status IS NOT '{FINOPS_PAID_STATUS}')
+               WHERE name = {row}.vendor;'''
+
+
+def _vendor_recompute_sql(name):
+    """חישוב מלא לספק אחד - רק כשהספק עצמו נוצר או שינה שם (סריקה באינדקס המכסה לפי ספק)"""
+    return f'''UPDATE finops_vendors SET
+                   total_paid = ROUND(COALESCE((SELECT SUM(amount) FROM finops_invoices
+                                                WHERE vendor = {name} AND status = '{FINOPS_PAID_STATUS}'), 0), 2),
+                   active_invoices = (SELECT COUNT(*) FROM finops_invoices
+                                      WHERE vendor = {name} AND status IS NOT '{FINOPS_PAID_STATUS}')
+               WHERE name = {name};'''
+
+
+def refresh_vendor_totals(c):
+    """מיישר את כל הספקים מול החשבוניות (מיגרציה ותיקון ידני) - בשגרה הטריגרים מעדכנים בהפרשים"""
+    c.execute(_vendor_recompute_sql("finops_vendors.name"))
+
+
+def create_finops_triggers(c):
+    """כמו טריגרי הקוביה - נבנים מחדש בכל עלייה"""
+    for trigger in ("finops_vendor_invoice_insert", "finops_vendor_invoice_delete", "finops_vendor_invoice_update",
+                    "finops_vendor_insert", "finops_vendor_rename"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    c.execute(f"CREATE TRIGGER finops_vendor_invoice_insert AFTER INSERT ON finops_invoices BEGIN {_vendor_delta_sql('new', '+')} END")
+    c.execute(f"CREATE TRIGGER finops_vendor_invoice_delete AFTER DELETE ON finops_invoices BEGIN {_vendor_delta_sql('old', '-')} END")
+    c.execute(f'''CREATE TRIGGER finops_vendor_invoice_update AFTER UPDATE OF vendor, amount, status ON finops_invoices BEGIN
+                  {_vendor_delta_sql('old', '-')} {_vendor_delta_sql('new', '+')} END''')
+    c.execute(f"CREATE TRIGGER finops_vendor_insert AFTER INSERT ON finops_vendors BEGIN {_vendor_recompute_sql('new.name')} END")
+    c.execute(f"CREATE TRIGGER finops_vendor_rename AFTER UPDATE OF name ON finops_vendors BEGIN {_vendor_recompute_sql('new.name')} END")
+
+
+# ==========================================
+# DATA VERSIONING (מוני גרסה לתחומי הנתונים - גם מיגרציות מקדמות אותם)
+# ==========================================
+# מונה גרסה לכל תחום נתונים, נשמר ב-system_settings ומקודם באותה טרנזקציה של הכתיבה
+def get_data_version(conn, domain="ats"):
+    row = conn.execute("SELECT value FROM system_settings WHERE key = ?", (f"data_version:{domain}",)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_data_version(conn, domain="ats"):
+    """מסמן שהנתונים בתחום השתנו. ה-commit באחריות הקורא"""
+    conn.execute("""INSERT INTO system_settings (key, value) VALUES (?, '1')
+                    ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""", (f"data_version:{domain}",))
+
+
+# ==========================================
+# 1. ENTITY RELATIONSHIP MODEL (סכמה ומיגרציות)
+# ==========================================
+# גרסת הסכמה נשמרת ב-PRAGMA user_version; כל מיגרציה רצה פעם אחת, בסדר, בטרנזקציה משלה.
+# מסד קיים מגרסה 0 עובר את כל השלבים - לכן כל שלב כתוב כך שיהיה בטוח להריץ אותו על סכמה קיימת.
+def _migration_baseline(c):
     # --- טבלאות ATS קיימות ---
     c.execute('''CREATE TABLE IF NOT EXISTS candidates (id TEXT PRIMARY KEY, name TEXT, email TEXT UNIQUE, phone TEXT, source TEXT)''')
     c.execute('''CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, job_title TEXT UNIQUE, department TEXT, hiring_manager TEXT)''')
@@ -117,15 +679,15 @@ def init_db():
     # --- טבלאות FinOps (משודרג!) ---
     c.execute('''CREATE TABLE IF NOT EXISTS finops_invoices (
                  id TEXT PRIMARY KEY, vendor TEXT, date TEXT, due_date TEXT, budget_month TEXT,
-                 amount REAL, category TEXT, subcategory TEXT, status TEXT, 
+                 amount REAL, category TEXT, subcategory TEXT, status TEXT,
                  note TEXT, file_url TEXT)''')
-                 
+
     c.execute('''CREATE TABLE IF NOT EXISTS finops_vendors (
-                 id TEXT PRIMARY KEY, name TEXT UNIQUE, default_category TEXT, 
+                 id TEXT PRIMARY KEY, name TEXT UNIQUE, default_category TEXT,
                  total_paid REAL, active_invoices INTEGER)''')
-                 
+
     c.execute('''CREATE TABLE IF NOT EXISTS finops_categories (
-                 id INTEGER PRIMARY KEY, name TEXT UNIQUE, 
+                 id INTEGER PRIMARY KEY, name TEXT UNIQUE,
                  target REAL, previous_year_spend REAL, code TEXT, notes TEXT, subcategories TEXT)''')
 
     # --- טבלת אבטחת מידע (Audit Logs) ---
@@ -135,11 +697,230 @@ def init_db():
     c.execute('''CREATE TABLE IF NOT EXISTS system_settings (key TEXT PRIMARY KEY, value TEXT)''')
     c.execute('''INSERT OR IGNORE INTO system_settings (key, value) VALUES ('ai_enabled', 'true')''')
 
-    conn.commit()
-    conn.close()
+
+def _migration_sort_indexes(c):
+    # --- אינדקסים למיון ולחיבורים (שאילתות הדשבורד נדחפות ל-SQL) ---
+    # מפתח מורכב (עמודת מיון, app_id) - סדר מלא ויציב שעליו נשען העימוד בסמן (keyset)
+    for old_index in ("idx_applications_days", "idx_applications_status", "idx_applications_recruiter",
+                      "idx_applications_candidate", "idx_applications_job"):
+        c.execute(f"DROP INDEX IF EXISTS {old_index}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_days_key ON applications(days_in_process, app_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_status_key ON applications(status, app_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_recruiter_key ON applications(recruiter, app_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_candidate_key ON applications(candidate_id, app_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_job_key ON applications(job_id, app_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_candidates_name ON candidates(name, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_department ON jobs(department, id)")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_start ON applications(start_date)")
+    # חישוב MAX מחדש בטריגר הקוביה סורק רק משרה וחודש אחד
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_job_start ON applications(job_id, start_date)")
+
+
+def _migration_status_taxonomy(c):
+    # --- טקסונומיית סטטוסים: קוד מסווג לכל מחרוזת ייחודית, נשמר גם על כל תהליך ---
+    c.execute('''CREATE TABLE IF NOT EXISTS status_taxonomy (status TEXT PRIMARY KEY, status_class INTEGER NOT NULL)''')
+    if 'status_class' not in [col[1] for col in c.execute("PRAGMA table_info(applications)")]:
+        c.execute("ALTER TABLE applications ADD COLUMN status_class INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_class ON applications(status_class)")
+    classify_unclassified(c)
+
+
+def _migration_hot_path_indexes(c):
+    # Revert מוחק לפי upload_log_id; יומן האבטחה ויומן הטעינות נקראים לפי זמן
+    c.execute("CREATE INDEX IF NOT EXISTS idx_applications_upload ON applications(upload_log_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs(timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_data_logs_upload_date ON data_logs(upload_date)")
+
+
+def _migration_admin_tables(c):
+    # --- טבלאות שהנתיבים שלהן קיימים אבל לא נוצרו אף פעם (חוקי ETL, קליטת עובדים) ---
+    c.execute('''CREATE TABLE IF NOT EXISTS etl_rules (id TEXT PRIMARY KEY, col_name TEXT, condition TEXT, action TEXT, active BOOLEAN)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS onboarding (
+                 id TEXT PRIMARY KEY, name TEXT, id_num TEXT, role TEXT, department TEXT, manager TEXT,
+                 start_date TEXT, base_salary REAL, global_salary REAL, parking TEXT, car_num TEXT,
+                 referral_name TEXT, referral_id TEXT, diversity TEXT, status TEXT, created_at TEXT)''')
+
+
+def _migration_change_journal(c):
+    # יומן שינויים לכל קליטה: תמונת לפני/אחרי של כל תהליך שנוסף או השתנה - הבסיס ל-Revert מדויק
+    c.execute('''CREATE TABLE IF NOT EXISTS change_journal (
+                 id INTEGER PRIMARY KEY, log_id TEXT NOT NULL, app_id TEXT NOT NULL, op TEXT NOT NULL,
+                 before_status TEXT, before_status_class INTEGER, before_recruiter TEXT, before_days INTEGER,
+                 before_upload_log_id TEXT,
+                 after_status TEXT, after_status_class INTEGER, after_recruiter TEXT, after_days INTEGER)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_change_journal_log ON change_journal(log_id, app_id)")
+
+
+def _migration_audit_filter_indexes(c):
+    # שאילתות Compliance לפי פעולה / משתמש על טווח זמן - הסינון והמיון מאותו אינדקס
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_action_ts ON audit_logs(action, timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_user_ts ON audit_logs(user, timestamp)")
+
+
+def _migration_invoice_blobs(c):
+    # מאגר קבצי חשבוניות לפי תוכן (SHA-256); חשבונית מצביעה על blob דרך file_url
+    c.execute('''CREATE TABLE IF NOT EXISTS invoice_blobs (
+                 sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, content_type TEXT,
+                 original_name TEXT, created_at TEXT NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_finops_invoices_file_url ON finops_invoices(file_url)")
+
+
+def _migration_finops_rollups(c):
+    # סיכומי FinOps בצד השרת: אינדקסים מכסים לקיבוץ לפי קטגוריה/תת-קטגוריה ולפי ספק,
+    # ו-(budget_month, id) לסדר היציב של יומן החשבוניות בעמודים
+    c.execute("CREATE INDEX IF NOT EXISTS idx_finops_invoices_rollup ON finops_invoices(category, subcategory, status, amount)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_finops_invoices_vendor ON finops_invoices(vendor, category, status, amount)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_finops_invoices_ledger ON finops_invoices(budget_month, id)")
+
+
+def _migration_finops_versioning(c):
+    # גרסה לכל קטגוריה (נעילה אופטימית בסנכרון), ויישור חד-פעמי של סכומי הספקים שנשלחו עד עכשיו מהלקוח
+    if 'version' not in [col[1] for col in c.execute("PRAGMA table_info(finops_categories)")]:
+        c.execute("ALTER TABLE finops_categories ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    refresh_vendor_totals(c)
+    # קטגוריות בלי version וסכומי ספקים ישנים שנשמרו בדפדפן לא יכולים לחזור ב-304
+    bump_data_version(c, "finops")
+
+
+# (גרסה, תיאור, פונקציה) - מוסיפים רק בסוף הרשימה, לא משנים מיגרציה שכבר שוחררה
+MIGRATIONS = [
+    (1, "baseline schema", _migration_baseline),
+    (2, "composite sort indexes", _migration_sort_indexes),
+    (3, "status taxonomy", _migration_status_taxonomy),
+    (4, "full-text search index", create_search_index),
+    (5, "kpi rollup cube", create_kpi_rollup),
+    (6, "hot-path indexes (upload_log_id, audit/upload timestamps)", _migration_hot_path_indexes),
+    (7, "etl_rules and onboarding tables", _migration_admin_tables),
+    (8, "per-upload change journal", _migration_change_journal),
+    (9, "audit log action/user indexes", _migration_audit_filter_indexes),
+    (10, "content-addressed invoice blobs", _migration_invoice_blobs),
+    (11, "finops rollup and ledger indexes", _migration_finops_rollups),
+    (12, "category versions and trigger-maintained vendor totals", _migration_finops_versioning),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+    """מריץ את המיגרציות שעוד לא הוחלו. מחזיר את רשימת הגרסאות שהוחלו"""
+    current = get_schema_version(conn)
+    applied = []
+    for version, _description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN")
+        try:
+            migrate(conn.cursor())
+            # user_version נכתב באותה טרנזקציה - מיגרציה שנכשלה לא מסומנת כהוחלה
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def init_db():
+    with db_pool.writer() as conn:
+        run_migrations(conn)
+        # אובייקטים שנגזרים מהקוד (גוף הטריגרים, הגדרות הטקסונומיה) - מסונכרנים בכל עלייה
+        c = conn.cursor()
+        create_kpi_triggers(c)
+        create_finops_triggers(c)
+        sync_status_taxonomy(c)
+        conn.commit()
 
 init_db()
 
+
+# ==========================================
+# QUERY PLAN GUARD (EXPLAIN QUERY PLAN לשאילתות החמות)
+# ==========================================
+# הצורה של השאילתות שרצות בכל טעינת דשבורד / פעולת אדמין. פרמטרים לדוגמה - המתכנן לא תלוי בערכים.
+HOT_QUERIES = {
+    "revert_upload": ("DELETE FROM applications WHERE upload_log_id = ?", ("log",)),
+    "audit_log_recent": ("SELECT * FROM audit_logs ORDER BY timestamp DESC, rowid DESC LIMIT 50", ()),
+    "upload_history": ("SELECT * FROM data_logs ORDER BY upload_date DESC LIMIT 10", ()),
+    "unassigned_recruiters": ("SELECT COUNT(*) FROM applications WHERE recruiter = 'לא שויך' OR recruiter IS NULL", ()),
+    "candidates_by_days": ('''SELECT a.app_id FROM applications a
+                              JOIN candidates c ON a.candidate_id = c.id JOIN jobs j ON a.job_id = j.id
+                              ORDER BY a.days_in_process DESC, a.app_id DESC LIMIT 50''', ()),
+    "candidates_by_status": ('''SELECT a.app_id FROM applications a
+                                JOIN candidates c ON a.candidate_id = c.id JOIN jobs j ON a.job_id = j.id
+                                ORDER BY a.status, a.app_id LIMIT 50''', ()),
+    "candidates_by_name": ('''SELECT a.app_id FROM candidates c
+                              CROSS JOIN applications a ON a.candidate_id = c.id JOIN jobs j ON a.job_id = j.id
+                              ORDER BY c.name, c.id, a.app_id LIMIT 50''', ()),
+    # מקטעי ה-NULL בעימוד keyset (keyset_page) - טווח על אותו אינדקס מיון
+    "candidates_recruiter_nulls": ('''SELECT a.app_id FROM applications a
+                                      JOIN candidates c ON a.candidate_id = c.id JOIN jobs j ON a.job_id = j.id
+                                      WHERE a.recruiter IS NULL AND (a.app_id) < (?)
+                                      ORDER BY a.recruiter DESC, a.app_id DESC LIMIT 50''', ("x",)),
+    "candidates_after_recruiter_nulls": ('''SELECT a.app_id FROM applications a
+                                            JOIN candidates c ON a.candidate_id = c.id JOIN jobs j ON a.job_id = j.id
+                                            WHERE a.recruiter IS NOT NULL
+                                            ORDER BY a.recruiter, a.app_id LIMIT 50''', ()),
+    "applications_by_recruiter": ("SELECT app_id FROM applications WHERE recruiter = ?", ("x",)),
+    "applications_by_status": ("SELECT app_id FROM applications WHERE status = ?", ("x",)),
+    "applications_by_job": ("SELECT app_id FROM applications WHERE job_id = ?", ("x",)),
+    "applications_since": ("SELECT app_id FROM applications WHERE start_date >= ?", ("2024-01-01",)),
+    "ghosting_radar": (f'''SELECT a.app_id FROM applications a
+                           JOIN candidates c ON a.candidate_id = c.id JOIN jobs j ON a.job_id = j.id
+                           WHERE a.days_in_process > 14 AND (a.status_class & {STATUS_CLOSED}) = 0
+                           ORDER BY a.days_in_process DESC LIMIT 8''', ()),
+    "kpi_max_recompute": ('''SELECT MAX(days_in_process) FROM applications
+                             WHERE job_id = ? AND start_date >= ? AND start_date < ?''', ("x", "2024-01-01", "2024-02-01")),
+    "data_version": ("SELECT value FROM system_settings WHERE key = ?", ("data_version:ats",)),
+    "journal_first_images": ("SELECT MIN(id) FROM change_journal WHERE log_id = ? GROUP BY app_id", ("log",)),
+    "audit_log_range": ("SELECT rowid, * FROM audit_logs WHERE timestamp >= ? AND timestamp < ? AND (timestamp, rowid) < (?, ?) "
+                        "ORDER BY timestamp DESC, rowid DESC LIMIT 500", ("2026-01-01", "2026-02-01", "2026-01-15", 1)),
+    "audit_log_by_action": ("SELECT rowid, * FROM audit_logs WHERE timestamp >= ? AND action = ? "
+                            "ORDER BY timestamp DESC, rowid DESC LIMIT 500", ("2026-01-01", "x")),
+    "audit_log_by_user": ("SELECT rowid, * FROM audit_logs WHERE timestamp >= ? AND user = ? "
+                          "ORDER BY timestamp DESC, rowid DESC LIMIT 500", ("2026-01-01", "x")),
+    "invoice_blob_refs": ("SELECT 1 FROM finops_invoices WHERE file_url = ?", ("api/finops/blobs/x",)),
+    "finops_category_rollup": ('''SELECT category, subcategory, (category IS ? OR status IS ?) AS pending, SUM(amount), COUNT(*)
+                                  FROM finops_invoices GROUP BY category, subcategory, pending''', ("x", "y")),
+    "finops_vendor_rollup": ('''SELECT vendor, SUM(amount), COUNT(*) FROM finops_invoices
+                                WHERE NOT (category IS ? OR status IS ?) GROUP BY vendor''', ("x", "y")),
+    "finops_ledger_page": ('''SELECT * FROM finops_invoices WHERE (budget_month, id) < (?, ?)
+                              ORDER BY budget_month DESC, id DESC LIMIT 100''', ("2026-01", "x")),
+    "finops_ledger_by_month": ('''SELECT * FROM finops_invoices WHERE budget_month >= ? AND budget_month <= ?
+                                  ORDER BY budget_month DESC, id DESC LIMIT 100''', ("2026-01", "2026-12")),
+}
+
+
+def _plan_problem(detail):
+    """סריקה מלאה של טבלה, או מיון של כל התוצאה ב-B-tree זמני"""
+    if detail.startswith("SCAN ") and "USING" not in detail and "VIRTUAL TABLE" not in detail \
+            and detail != "SCAN CONSTANT ROW":
+        return "full scan"
+    if detail == "USE TEMP B-TREE FOR ORDER BY":
+        return "sort"
+    return None
+
+
+def check_query_plans(conn, queries=None):
+    """EXPLAIN QUERY PLAN לכל שאילתה חמה; מחזיר את התוכנית ואת הבעיות שנמצאו בה"""
+    report = []
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        problems = [f"{kind}: {detail}" for detail in plan if (kind := _plan_problem(detail))]
+        report.append({"query": name, "plan": plan, "problems": problems})
+    return report
+
+
+def assert_query_plans(conn, queries=None):
+    """נכשל (AssertionError) אם שאילתה חמה נפלה לסריקה מלאה - לשימוש ב-CI אחרי שינויי סכמה"""
+    failing = [r for r in check_query_plans(conn, queries) if r["problems"]]
+    assert not failing, "; ".join(f"{r['query']}: {', '.join(r['problems'])}" for r in failing)
+
+
 # ==========================================
 # מילון נורמליזציה (Standardization Dictionary)
 # ==========================================
@@ -155,7 +936,41 @@ DEPT_NORMALIZATION = {
 # ==========================================
 # שאילתת תאימות ל-UI הקיים (View Pattern)
 # ==========================================
-def get_unified_data(conn):
+# ==========================================
+# UNIFIED VIEW CACHE
+# ==========================================
+class VersionedFrameCache:
+    """
+    מחזיק בזיכרון DataFrame אחד לכל גרסת נתונים.
+    בקשות מקבילות על גרסה ישנה ממתינות לבנייה אחת (single-flight) במקום לסרוק כל אחת בעצמה.
+    """
+    def __init__(self, loader, domain="ats"):
+        self.loader = loader
+        self.domain = domain
+        self._version = None
+        self._frame = None
+        self._build_lock = threading.Lock()
+
+    def get(self, conn):
+        version = get_data_version(conn, self.domain)
+        frame = self._frame
+        if frame is None or self._version != version:
+            with self._build_lock:
+                # ייתכן שבקשה אחרת כבר בנתה את הגרסה בזמן שחיכינו
+                if self._frame is None or self._version != version:
+                    self._frame = self.loader(conn)
+                    self._version = version
+                frame = self._frame
+        # עותק רדוד: ב-Copy-on-Write של pandas (ברירת המחדל מ-3.0, ולכן pandas>=3.0 ב-requirements) שינוי בעותק לא נוגע במטמון
+        return frame.copy(deep=False)
+
+    def invalidate(self):
+        with self._build_lock:
+            self._frame = None
+            self._version = None
+
+
+def _load_unified_data(conn):
     """מייצר את הטבלה השטוחה שהדשבורד שלנו מכיר מתוך 3 הטבלאות המקושרות"""
     query = '''
         SELECT
@@ -176,6 +991,48 @@ def get_unified_data(conn):
     return pd.read_sql(query, conn)
 
 
+unified_data_cache = VersionedFrameCache(_load_unified_data, domain="ats")
+
+
+def get_unified_data(conn):
+    """הטבלה השטוחה מהמטמון - נבנית מחדש רק כשגרסת נתוני ה-ATS השתנתה"""
+    return unified_data_cache.get(conn)
+
+
+# ==========================================
+# CONDITIONAL GET (ETag לפי גרסת נתונים)
+# ==========================================
+# רמזי Cache-Control: no-cache = הדפדפן שומר אבל מאמת בכל פעם (304 זול); meta משתנה לעתים רחוקות
+CACHE_REVALIDATE = "private, no-cache"
+CACHE_SHORT = "private, max-age=60, stale-while-revalidate=300"
+# מבנה התשובות: מיגרציה או שינוי צורה בלי מיגרציה (מקדמים את API_REVISION) פוסלים כל ETag ישן,
+# אחרת דפדפן שמאמת גוף מלפני העדכון מקבל 304 ונשאר עם המבנה הישן
+API_REVISION = 1
+ETAG_SCHEMA = f"s{SCHEMA_VERSION}.{API_REVISION}"
+
+
+def versioned(*domains, cache_control=CACHE_REVALIDATE, daily=False):
+    """
+    Dependency לנתיבי GET: ה-ETag נגזר מגרסת מבנה התשובות, מגרסאות התחומים ומה-URL (כולל פרמטרים),
+    בלי לחשב את התשובה.
+    If-None-Match תואם -> 304 מיד. daily - התשובה תלויה גם בתאריך של היום (חלון 30 יום, החודש הנוכחי).
+    """
+    def check_etag(request: Request, response: Response, conn: sqlite3.Connection = Depends(get_read_conn)):
+        parts = [ETAG_SCHEMA, *(f"{domain}{get_data_version(conn, domain)}" for domain in domains)]
+        if daily:
+            parts.append(datetime.now().strftime("%Y%m%d"))
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        digest = hashlib.md5(f"{request.url.path}?{query}".encode()).hexdigest()[:12]
+        etag = f'W/"{"-".join(parts)}-{digest}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+
+        client_tags = [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+        if "*" in client_tags or etag in client_tags or etag[2:] in client_tags:
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return check_etag
+
+
 @app.get("/")
 def read_root():
     return {"status": "Phoenix Enterprise Brain is Active 🧠"}
@@ -184,318 +1041,687 @@ def read_root():
 # ==========================================
 # 2. מנוע ה-ETL (קליטה, ניקוי, חלוקה לטבלאות)
 # ==========================================
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    log_id = str(uuid.uuid4())[:8]
-    temp_file = f"temp_{file.filename}"
+# זיהוי עמודות דינמי (תומך בכמה וריאציות של שמות מהאקסל)
+ATS_COLUMN_MAP = {
+    'שם מועמד': 'name', 'שם': 'name',
+    'דוא"ל': 'email', 'אימייל': 'email', 'מייל': 'email',
+    'שם המשרה': 'job_title', 'משרה': 'job_title',
+    'מצב שיוך למשרה': 'status', 'סטטוס': 'status',
+    'מגייס': 'recruiter', 'מגייסת': 'recruiter',
+    'תחילת גיוס': 'start_date', 'תאריך פתיחה': 'start_date',
+    'רמה 2': 'department', 'מחלקה': 'department', 'חטיבה': 'department',
+    'מקור הגעה': 'source', 'מקור': 'source',
+    'טלפון': 'phone', 'נייד': 'phone', 'טלפון נייד': 'phone'
+}
+
+
+def normalize_ats_frame(df):
+    """Transform: מיפוי עמודות, השלמת חוסרים ונורמליזציה של דוח ATS גולמי"""
+    df.columns = df.columns.str.strip()
+    df.rename(columns=ATS_COLUMN_MAP, inplace=True)
+
+    # Transform: טיפול בחוסרים (Data Imputation)
+    if 'name' not in df.columns:
+        raise Exception("חובה לכלול עמודת שם מועמד")
+    if 'job_title' not in df.columns:
+        raise Exception("חובה לכלול עמודת שם משרה")
+    if 'email' not in df.columns:
+        df['email'] = df['name'].map(str).str.replace(' ', '.', regex=False) + "@unknown.com"
+    if 'source' not in df.columns:
+        df['source'] = "Organic / Unknown"
+    if 'start_date' not in df.columns:
+        df['start_date'] = pd.Timestamp.now()
+    if 'department' not in df.columns:
+        df['department'] = "General"
+    if 'status' not in df.columns:
+        df['status'] = "חדש"
+    if 'recruiter' not in df.columns:
+        df['recruiter'] = "לא שויך"
+    if 'phone' not in df.columns:
+        df['phone'] = None
+
+    # Transform: נורמליזציה
+    df['department'] = df['department'].replace(DEPT_NORMALIZATION)
+    df['start_date'] = pd.to_datetime(df['start_date'], errors='coerce').fillna(pd.Timestamp.now())
+    df['days_in_process'] = (pd.Timestamp.now() - df['start_date']).dt.days.fillna(0).astype(int)
+    return df
 
+
+# ==========================================
+# STREAMING EXTRACT (קריאה במקטעים בזיכרון חסום)
+# ==========================================
+ATS_CHUNK_ROWS = 50_000
+
+
+def iter_upload_frames(stream, chunk_rows=ATS_CHUNK_ROWS):
+    """Extract: מחזיר את הקובץ כרצף של DataFrames בגודל קבוע, ישירות מה-spool של ההעלאה.
+    הזיהוי והקריאה משותפים עם מנוע ה-ETL (etl_engine) - הקידוד נבחר לפי הקובץ כולו, כך שמקטע מאוחר לא נכשל"""
+    yield from etl_engine.iter_raw_frames(stream, chunk_rows)
+
+
+# ==========================================
+# BULK LOAD ENGINE (Set-based Upsert)
+# ==========================================
+STAGING_COLUMNS = ['app_id', 'candidate_id', 'job_id', 'name', 'email', 'phone', 'source', 'job_title',
+                   'department', 'status', 'recruiter', 'start_date', 'days_in_process']
+
+
+def _stable_ids(values):
+    """מזהה קבוע (uuid5) - מחושב פעם אחת לכל ערך ייחודי ומופץ חזרה לכל העמודה"""
+    id_map = {v: str(uuid.uuid5(uuid.NAMESPACE_URL, v)) for v in values.unique()}
+    return values.map(id_map)
+
+
+def build_staging_frame(df):
+    """מחשב את מזהי המועמד, המשרה והתהליך כעמודות שלמות (ללא לולאה על שורות)"""
+    staged = pd.DataFrame({
+        'name': df['name'].map(str),
+        'email': df['email'].map(str),
+        # טוקן ממוסך (mask_sensitive_data) או None - אף פעם לא המספר עצמו
+        'phone': df['phone'].astype(object).where(df['phone'].notna(), None),
+        'source': df['source'].map(str),
+        'job_title': df['job_title'].map(str),
+        'department': df['department'].map(str),
+        'status': df['status'].map(str),
+        'recruiter': df['recruiter'].map(str),
+        'start_date': df['start_date'].dt.strftime('%Y-%m-%d'),
+        'days_in_process': df['days_in_process'].astype(int),
+    })
+    staged['candidate_id'] = _stable_ids(staged['email'])  # מזהה קבוע לפי אימייל
+    staged['job_id'] = _stable_ids(staged['job_title'])
+    staged['app_id'] = staged['candidate_id'] + "_" + staged['job_id']
+    return staged[STAGING_COLUMNS]
+
+
+# אותו חישוב כמו ב-normalize_ats_frame (היום המקומי פחות תאריך ההתחלה), בתוך SQLite
+DAYS_IN_PROCESS_SQL = "CAST(julianday('now', 'localtime') - julianday(applications.start_date) AS INTEGER)"
+
+
+def journal_changes(c, log_id):
+    """
+    רושם ביומן את תמונת הלפני/אחרי של כל תהליך שהאצווה שב-Staging עומדת להוסיף (I) או לשנות (U).
+    רץ באותה טרנזקציה של ה-UPSERT, ועם אותו תנאי שינוי - שורות ללא שינוי לא נרשמות.
+    days_in_process נגזר מ-start_date ומשתנה כל יום, לכן אינו חלק מתנאי השינוי (אחרת כל קליטה ביום
+    אחר הייתה מעתיקה את כל הטבלה ליומן).
+    """
+    c.execute('''INSERT INTO change_journal (log_id, app_id, op,
+                     before_status, before_status_class, before_recruiter, before_days, before_upload_log_id,
+                     after_status, after_status_class, after_recruiter, after_days)
+                 SELECT ?, s.app_id, CASE WHEN a.app_id IS NULL THEN 'I' ELSE 'U' END,
+                        a.status, a.status_class, a.recruiter, a.days_in_process, a.upload_log_id,
+                        s.status, COALESCE(t.status_class, 0), s.recruiter, s.days_in_process
+                 FROM staging_applications s
+                 LEFT JOIN applications a ON a.app_id = s.app_id
+                 LEFT JOIN status_taxonomy t ON t.status = s.status
+                 WHERE a.app_id IS NULL
+                    OR a.status IS NOT s.status OR a.recruiter IS NOT s.recruiter
+                 ORDER BY s.rowid''', (log_id,))
+
+
+def revert_from_journal(c, log_id):
+    """
+    מריץ את היומן של קליטה אחורה: תהליך שהקליטה הוסיפה נמחק, ותהליך שהיא עדכנה חוזר לתמונת ה"לפני"
+    של הרישום הראשון שלו (כך שגם כמה אצוות באותה קליטה מתבטלות נכון). העבודה היא לפי מספר השינויים.
+    תהליך שקליטה מאוחרת יותר כבר שינתה (upload_log_id אחר) לא נדרס. מועמדים ומשרות שנשארו ללא
+    תהליכים נמחקים באותו מעבר. הקורא אחראי על הטרנזקציה.
+    """
+    first_images = '''SELECT * FROM change_journal
+                      WHERE id IN (SELECT MIN(id) FROM change_journal WHERE log_id = ? GROUP BY app_id)'''
+    journaled = c.execute("SELECT EXISTS (SELECT 1 FROM change_journal WHERE log_id = ?)", (log_id,)).fetchone()[0]
+    if journaled:
+        # days_in_process מחושב מחדש מ-start_date ולא משוחזר מהיומן - ערך ה"לפני" כבר לא עדכני
+        restored = c.execute(f'''UPDATE applications SET
+                                      status = j.before_status, status_class = j.before_status_class,
+                                      recruiter = j.before_recruiter,
+                                      days_in_process = COALESCE({DAYS_IN_PROCESS_SQL}, j.before_days),
+                                      upload_log_id = j.before_upload_log_id
+                                  FROM ({first_images}) j
+                                  WHERE applications.app_id = j.app_id AND j.op = 'U'
+                                    AND applications.upload_log_id = ?''', (log_id, log_id)).rowcount
+        removed = c.execute(f'''DELETE FROM applications
+                                 WHERE upload_log_id = ?
+                                   AND app_id IN (SELECT app_id FROM ({first_images}) WHERE op = 'I')
+                                 RETURNING candidate_id, job_id''', (log_id, log_id)).fetchall()
+        c.execute("DELETE FROM change_journal WHERE log_id = ?", (log_id,))
+    else:
+        # קליטה מלפני היומן - אין תמונת "לפני", נשאר רק למחוק את מה שמסומן עליה
+        restored = 0
+        removed = c.execute("DELETE FROM applications WHERE upload_log_id = ? RETURNING candidate_id, job_id",
+                            (log_id,)).fetchall()
+
+    # ניקוי יתומים - רק המועמדים והמשרות של התהליכים שנמחקו, דרך האינדקסים על candidate_id / job_id
+    candidates = {(cand,) for cand, _ in removed}
+    jobs = {(job,) for _, job in removed}
+    c.executemany('''DELETE FROM candidates WHERE id = ?
+                     AND NOT EXISTS (SELECT 1 FROM applications a WHERE a.candidate_id = candidates.id)''', candidates)
+    candidates_swept = max(c.rowcount, 0)
+    c.executemany('''DELETE FROM jobs WHERE id = ?
+                     AND NOT EXISTS (SELECT 1 FROM applications a WHERE a.job_id = jobs.id)''', jobs)
+    jobs_swept = max(c.rowcount, 0)
+    return {"rows_restored": restored, "rows_deleted": len(removed),
+            "candidates_swept": candidates_swept, "jobs_swept": jobs_swept}
+
+
+def bulk_load_applications(conn, df, log_id):
+    """
+    Load: טוען אצווה שלמה בטרנזקציה אחת דרך טבלת Staging זמנית.
+    מועמדים ומשרות נכנסים ב-INSERT OR IGNORE, ותהליכים ב-UPSERT (ON CONFLICT DO UPDATE)
+    שנוגע רק בשורות שהשתנו בפועל. מחזיר ספירת שורות חדשות / מעודכנות / ללא שינוי.
+    """
+    staged = build_staging_frame(df)
+    cols = ', '.join(STAGING_COLUMNS)
+    c = conn.cursor()
+
+    c.execute("BEGIN IMMEDIATE")
     try:
-        with open(temp_file, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        c.execute(f"CREATE TEMP TABLE IF NOT EXISTS staging_applications ({cols}, PRIMARY KEY (app_id))")
+        c.execute("DELETE FROM staging_applications")
+        # OR REPLACE: אם אותו תהליך מופיע פעמיים בקובץ - השורה האחרונה קובעת (כמו בעדכון הישן)
+        c.executemany(f"INSERT OR REPLACE INTO staging_applications ({cols}) VALUES ({', '.join('?' * len(STAGING_COLUMNS))})",
+                      staged.itertuples(index=False, name=None))
+
+        c.execute('''SELECT COUNT(*),
+                            COALESCE(SUM(a.app_id IS NULL), 0),
+                            COALESCE(SUM(a.status IS s.status AND a.recruiter IS s.recruiter), 0)
+                     FROM staging_applications s LEFT JOIN applications a ON a.app_id = s.app_id''')
+        total, inserted, unchanged = c.fetchone()
+
+        c.execute('''INSERT OR IGNORE INTO candidates (id, name, email, phone, source)
+                     SELECT candidate_id, name, email, phone, source FROM staging_applications ORDER BY rowid''')
+        c.execute('''INSERT OR IGNORE INTO jobs (id, job_title, department)
+                     SELECT job_id, job_title, department FROM staging_applications ORDER BY rowid''')
+        # כל מחרוזת סטטוס מסווגת פעם אחת; התהליך מקבל את הקוד שלה ב-JOIN
+        register_statuses(c, staged['status'].unique())
+        journal_changes(c, log_id)
+        c.execute('''INSERT INTO applications (app_id, candidate_id, job_id, status, status_class, recruiter, start_date, days_in_process, upload_log_id)
+                     SELECT s.app_id, s.candidate_id, s.job_id, s.status, COALESCE(t.status_class, 0),
+                            s.recruiter, s.start_date, s.days_in_process, ?
+                     FROM staging_applications s LEFT JOIN status_taxonomy t ON t.status = s.status WHERE true
+                     ON CONFLICT(app_id) DO UPDATE SET
+                         status = excluded.status, status_class = excluded.status_class, recruiter = excluded.recruiter,
+                         days_in_process = excluded.days_in_process, upload_log_id = excluded.upload_log_id
+                     WHERE applications.status IS NOT excluded.status
+                        OR applications.recruiter IS NOT excluded.recruiter''', (log_id,))
+        # days_in_process נגזר: מתרענן גם בתהליכים שלא השתנו, בלי יומן ובלי להעביר אותם לקליטה הזו
+        c.execute('''UPDATE applications SET days_in_process = s.days_in_process
+                     FROM staging_applications s
+                     WHERE applications.app_id = s.app_id
+                       AND applications.days_in_process IS NOT s.days_in_process''')
+
+        c.execute("DELETE FROM staging_applications")
+        bump_data_version(conn, "ats")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"rows_inserted": inserted, "rows_updated": total - inserted - unchanged, "rows_unchanged": unchanged}
+
+
+# ==========================================
+# INGESTION JOBS (עבודות קליטה ברקע)
+# ==========================================
+# מספר הקליטות שרצות במקביל - השאר ממתינות בתור כדי לא להרעיב את ה-API
+INGEST_MAX_CONCURRENCY = int(os.getenv("PHOENIX_INGEST_WORKERS", "2"))
+INGEST_MAX_QUEUED = int(os.getenv("PHOENIX_INGEST_MAX_QUEUED", "20"))
+INGEST_JOB_TTL_SECONDS = 6 * 60 * 60
+INGEST_SPOOL_DIR = os.path.join(tempfile.gettempdir(), "phoenix_ingest")
+
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_CONCURRENCY, thread_name_prefix="ingest")
+ingest_jobs = {}
+ingest_jobs_lock = threading.Lock()
+
+
+def _update_ingest_job(job_id, **fields):
+    with ingest_jobs_lock:
+        ingest_jobs[job_id].update(fields)
+
 
-        # Extract
+def _prune_ingest_jobs():
+    """מנקה מהזיכרון עבודות שהסתיימו מזמן (התוצאה עצמה נשמרת ב-data_logs)"""
+    cutoff = time.time() - INGEST_JOB_TTL_SECONDS
+    with ingest_jobs_lock:
+        for job_id in [j for j, job in ingest_jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+            del ingest_jobs[job_id]
+
+
+def _spool_upload(src, path):
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(src, buffer, 1024 * 1024)
+
+
+def estimate_total_rows(stream):
+    """הערכה זולה של מספר השורות בקובץ (לחישוב אחוז התקדמות) בלי לפרסר אותו"""
+    file_format = etl_engine.sniff_format(stream)
+    try:
+        if file_format == "csv":
+            lines = sum(block.count(b"\n") for block in iter(lambda: stream.read(1024 * 1024), b""))
+            return max(lines - 1, 0)
+        if file_format == "xlsx":
+            wb = openpyxl.load_workbook(stream, read_only=True)
+            try:
+                max_row = wb.active.max_row
+            finally:
+                wb.close()
+            return max(max_row - 1, 0) if max_row else None
+        return None
+    finally:
+        stream.seek(0)
+
+
+def _log_ingest_job(job_id, filename, rows_processed, status):
+    with db_pool.writer() as conn:
+        conn.execute("INSERT INTO data_logs (log_id, filename, upload_date, rows_processed, status) VALUES (?, ?, ?, ?, ?)",
+                     (job_id, filename, pd.Timestamp.now().strftime("%Y-%m-%d %H:%M"), rows_processed, status))
+        bump_data_version(conn, "ats")
+        conn.commit()
+
+
+def run_ingest_job(job_id, spool_path, filename):
+    """Worker: Extract -> Transform -> Load לכל מקטע בנפרד, עם עדכון התקדמות אחרי כל מקטע"""
+    rows_processed = 0
+    load_stats = {"rows_inserted": 0, "rows_updated": 0, "rows_unchanged": 0}
+    started = time.time()
+    _update_ingest_job(job_id, phase="counting", started_at=started)
+
+    try:
         try:
-            df = pd.read_csv(temp_file)
-        except Exception:
+            with open(spool_path, "rb") as stream:
+                _update_ingest_job(job_id, rows_total=estimate_total_rows(stream), phase="loading")
+
+                # הזיכרון חסום בגודל מקטע ולא בגודל הקובץ
+                for chunk in iter_upload_frames(stream):
+                    # מיסוך לפני כל שלב אחר - ערך מזהה גולמי לא מגיע ל-Staging או למסד
+                    chunk = normalize_ats_frame(mask_sensitive_data(chunk))
+                    # הכותב מוחזק רק לזמן טעינת המקטע - בקשות כתיבה אחרות משתחלות בין מקטעים
+                    with db_pool.writer() as conn:
+                        chunk_stats = bulk_load_applications(conn, chunk, job_id)
+                    for key, value in chunk_stats.items():
+                        load_stats[key] += value
+                    rows_processed += len(chunk)
+                    elapsed = time.time() - started
+                    _update_ingest_job(job_id, rows_done=rows_processed,
+                                       rows_per_sec=int(rows_processed / elapsed) if elapsed > 0 else None)
+
+            # רישום ביומן לפני פרסום "completed" - ה-UI מרענן את /admin/health ברגע שהעבודה מסתיימת
+            _log_ingest_job(job_id, filename, rows_processed, "Success")
+        except Exception as e:
             try:
-                df = pd.read_csv(temp_file, encoding='iso-8859-8')
-            except Exception:
-                df = pd.read_excel(temp_file)
-
-        # זיהוי עמודות דינמי (תומך בכמה וריאציות של שמות מהאקסל)
-        df.columns = df.columns.str.strip()
-        col_map = {
-            'שם מועמד': 'name', 'שם': 'name',
-            'דוא"ל': 'email', 'אימייל': 'email', 'מייל': 'email',
-            'שם המשרה': 'job_title', 'משרה': 'job_title',
-            'מצב שיוך למשרה': 'status', 'סטטוס': 'status',
-            'מגייס': 'recruiter', 'מגייסת': 'recruiter',
-            'תחילת גיוס': 'start_date', 'תאריך פתיחה': 'start_date',
-            'רמה 2': 'department', 'מחלקה': 'department', 'חטיבה': 'department',
-            'מקור הגעה': 'source', 'מקור': 'source'
-        }
-        df.rename(columns=col_map, inplace=True)
-
-        # Transform: טיפול בחוסרים (Data Imputation)
-        if 'name' not in df.columns:
-            raise Exception("חובה לכלול עמודת שם מועמד")
-        if 'job_title' not in df.columns:
-            raise Exception("חובה לכלול עמודת שם משרה")
-        if 'email' not in df.columns:
-            df['email'] = df['name'].apply(lambda x: f"{str(x).replace(' ', '.')}@unknown.com")
-        if 'source' not in df.columns:
-            df['source'] = "Organic / Unknown"
-        if 'start_date' not in df.columns:
-            df['start_date'] = pd.Timestamp.now()
-        if 'department' not in df.columns:
-            df['department'] = "General"
-        if 'status' not in df.columns:
-            df['status'] = "חדש"
-        if 'recruiter' not in df.columns:
-            df['recruiter'] = "לא שויך"
-
-        # Transform: נורמליזציה
-        df['department'] = df['department'].replace(DEPT_NORMALIZATION)
-        df['start_date'] = pd.to_datetime(df['start_date'], errors='coerce').fillna(pd.Timestamp.now())
-        df['days_in_process'] = (pd.Timestamp.now() - df['start_date']).dt.days.fillna(0).astype(int)
-
-        # Load: פתיחת חיבור למסד הנתונים והזרקת נתונים לטבלאות נפרדות
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+                # מקטעים שכבר נטענו נשארים במסד - נרשמים ביומן כדי שאפשר יהיה לבצע להם Rollback
+                if rows_processed > 0:
+                    _log_ingest_job(job_id, filename, rows_processed, "Failed")
+            finally:
+                _update_ingest_job(job_id, phase="failed", error=str(e), result={"rows_processed": rows_processed, **load_stats})
+        else:
+            _update_ingest_job(job_id, phase="completed", result={"rows_processed": rows_processed, **load_stats})
+    finally:
+        # קובץ ה-spool נמחק וזמן הסיום נרשם גם כשהרישום ביומן נכשל
+        try:
+            os.remove(spool_path)
+        finally:
+            _update_ingest_job(job_id, finished_at=time.time())
 
-        rows_processed = 0
-
-        for _, row in df.iterrows():
-            # 1. טיפול במועמד (Upsert)
-            c_id = str(uuid.uuid5(uuid.NAMESPACE_URL, str(row['email'])))  # מזהה קבוע לפי אימייל
-            c.execute("INSERT OR IGNORE INTO candidates (id, name, email, source) VALUES (?, ?, ?, ?)",
-                      (c_id, str(row['name']), str(row['email']), str(row['source'])))
-
-            # 2. טיפול במשרה (Insert OR Ignore)
-            j_id = str(uuid.uuid5(uuid.NAMESPACE_URL, str(row['job_title'])))
-            c.execute("INSERT OR IGNORE INTO jobs (id, job_title, department) VALUES (?, ?, ?)",
-                      (j_id, str(row['job_title']), str(row['department'])))
-
-            # 3. טיפול בתהליך (Upsert לפי מועמד+משרה)
-            app_id = f"{c_id}_{j_id}"
-            c.execute("SELECT status FROM applications WHERE app_id = ?", (app_id,))
-            exists = c.fetchone()
-
-            if exists:
-                # עדכון סטטוס לתהליך קיים
-                c.execute('''UPDATE applications SET status = ?, recruiter = ?, days_in_process = ?, upload_log_id = ?
-                             WHERE app_id = ?''',
-                          (str(row['status']), str(row['recruiter']), int(row['days_in_process']), log_id, app_id))
-            else:
-                # תהליך חדש
-                c.execute('''INSERT INTO applications (app_id, candidate_id, job_id, status, recruiter, start_date, days_in_process, upload_log_id)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (app_id, c_id, j_id, str(row['status']), str(row['recruiter']), row['start_date'].strftime('%Y-%m-%d'), int(row['days_in_process']), log_id))
 
-            rows_processed += 1
+@app.post("/upload", status_code=202)
+async def upload_file(file: UploadFile = File(...)):
+    """מקבל את הקובץ, מעביר אותו לתור הקליטה ומחזיר מיד מזהה עבודה (202 Accepted)"""
+    # בלי מפתח מיסוך כל מקטע ייכשל ב-mask_frame - עדיף לסרב לפני שהקובץ נשמר בכלל
+    if masking.MASK_KEY is None:
+        raise HTTPException(status_code=503, detail="הקליטה מושבתת: לא הוגדר מפתח מיסוך (PHOENIX_MASK_KEY)")
+    _prune_ingest_jobs()
+    with ingest_jobs_lock:
+        queued = sum(1 for job in ingest_jobs.values() if job["phase"] == "queued")
+    if queued >= INGEST_MAX_QUEUED:
+        raise HTTPException(status_code=429, detail="תור הקליטה מלא, נסו שוב בעוד מספר דקות")
 
-        # רישום ביומן
-        c.execute("INSERT INTO data_logs (log_id, filename, upload_date, rows_processed, status) VALUES (?, ?, ?, ?, ?)",
-                  (log_id, file.filename, pd.Timestamp.now().strftime("%Y-%m-%d %H:%M"), rows_processed, "Success"))
+    log_id = str(uuid.uuid4())[:8]
+    os.makedirs(INGEST_SPOOL_DIR, exist_ok=True)
+    spool_path = os.path.join(INGEST_SPOOL_DIR, f"{log_id}.upload")
+    # ההעתקה חוסמת (דיסק) ולכן רצה במאגר ה-io ולא על ה-event loop
+    await io_work.run(_spool_upload, file.file, spool_path)
+
+    with ingest_jobs_lock:
+        ingest_jobs[log_id] = {
+            "job_id": log_id, "filename": file.filename, "phase": "queued",
+            "rows_done": 0, "rows_total": None, "rows_per_sec": None,
+            "queued_at": time.time(), "started_at": None, "finished_at": None,
+            "result": None, "error": None
+        }
+    ingest_executor.submit(run_ingest_job, log_id, spool_path, file.filename)
 
-        conn.commit()
-        conn.close()
-        os.remove(temp_file)
+    return {"message": "Upload queued", "job_id": log_id, "status_url": f"/upload/jobs/{log_id}"}
 
-        return {"message": "ETL Completed successfully", "rows_processed": rows_processed}
 
-    except Exception as e:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/upload/jobs/{job_id}")
+def get_upload_job(job_id: str):
+    """סטטוס עבודת קליטה: שלב, התקדמות (שורות שנקלטו / סה"כ), קצב ותוצאה סופית"""
+    with ingest_jobs_lock:
+        job = dict(ingest_jobs[job_id]) if job_id in ingest_jobs else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Upload job {job_id} not found")
+
+    if job["rows_total"]:
+        job["progress_pct"] = min(100, int(job["rows_done"] * 100 / job["rows_total"]))
+    else:
+        job["progress_pct"] = 100 if job["phase"] == "completed" else None
+    return job
 
 
 # ==========================================
 # 3. DATA GOVERNANCE API (Admin Tools)
 # ==========================================
-@app.get("/admin/health")
-def get_data_health():
+@app.get("/admin/health", dependencies=[Depends(versioned("ats"))])
+def get_data_health(conn: sqlite3.Connection = Depends(get_read_conn)):
     """חישוב בריאות נתונים משוקלל על פני הטבלאות"""
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM candidates")
-        total_candidates = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM applications")
-        total_apps = c.fetchone()[0]
-
-        # מציאת חוסרים
-        c.execute("SELECT COUNT(*) FROM applications WHERE recruiter = 'לא שויך' OR recruiter IS NULL")
-        missing_rec = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM jobs WHERE department = 'General' OR department IS NULL")
-        missing_dept = c.fetchone()[0]
-
-        logs_df = pd.read_sql("SELECT * FROM data_logs ORDER BY upload_date DESC LIMIT 10", conn)
-
-        health_score = 100
-        if total_apps > 0:
-            health_score = max(0, int(100 - (((missing_rec + missing_dept) / (total_apps + total_candidates)) * 100)))
-
-        missing_data = []
-        if missing_rec > 0:
-            missing_data.append({"field": "תהליכים ללא מגייס", "count": missing_rec})
-        if missing_dept > 0:
-            missing_data.append({"field": "משרות ללא שיוך מחלקתי", "count": missing_dept})
-
-        return {
-            "health_score": health_score,
-            "total_records": total_apps,
-            "missing_data": missing_data,
-            "logs": logs_df.to_dict(orient="records")
-        }
-    finally:
-        conn.close()
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM candidates")
+    total_candidates = c.fetchone()[0]
+    c.execute("SELECT COUNT(*) FROM applications")
+    total_apps = c.fetchone()[0]
+
+    # מציאת חוסרים
+    c.execute("SELECT COUNT(*) FROM applications WHERE recruiter = 'לא שויך' OR recruiter IS NULL")
+    missing_rec = c.fetchone()[0]
+    c.execute("SELECT COUNT(*) FROM jobs WHERE department = 'General' OR department IS NULL")
+    missing_dept = c.fetchone()[0]
+
+    logs_df = pd.read_sql("SELECT * FROM data_logs ORDER BY upload_date DESC LIMIT 10", conn)
+
+    health_score = 100
+    if total_apps > 0:
+        health_score = max(0, int(100 - (((missing_rec + missing_dept) / (total_apps + total_candidates)) * 100)))
+
+    missing_data = []
+    if missing_rec > 0:
+        missing_data.append({"field": "תהליכים ללא מגייס", "count": missing_rec})
+    if missing_dept > 0:
+        missing_data.append({"field": "משרות ללא שיוך מחלקתי", "count": missing_dept})
+
+    return {
+        "health_score": health_score,
+        "total_records": total_apps,
+        "missing_data": missing_data,
+        "logs": logs_df.to_dict(orient="records")
+    }
+
+
+@app.get("/admin/schema")
+def get_schema_status(conn: sqlite3.Connection = Depends(get_read_conn)):
+    """גרסת הסכמה ובדיקת תוכניות השאילתות החמות (status=degraded אם משהו נפל לסריקה מלאה)"""
+    plans = check_query_plans(conn)
+    return {
+        "schema_version": get_schema_version(conn),
+        "latest_version": SCHEMA_VERSION,
+        "migrations": [{"version": v, "description": d} for v, d, _ in MIGRATIONS],
+        "status": "degraded" if any(p["problems"] for p in plans) else "ok",
+        "query_plans": plans
+    }
 
 
 @app.post("/admin/revert/{log_id}")
-def revert_upload(log_id: str):
-    """מחיקת כל הנתונים שנוצרו על ידי קובץ מסוים (Rollback)"""
-    conn = sqlite3.connect(DB_PATH)
+def revert_upload(log_id: str, conn: sqlite3.Connection = Depends(get_write_conn)):
+    """ביטול קובץ מסוים (Rollback): תהליכים שנוספו בו נמחקים ותהליכים שעודכנו בו חוזרים למצבם הקודם"""
     c = conn.cursor()
     try:
-        # מוחק תהליכים שנוצרו בהעלאה זו
-        c.execute("DELETE FROM applications WHERE upload_log_id = ?", (log_id,))
+        c.execute("BEGIN IMMEDIATE")
+        # מריץ את יומן השינויים של ההעלאה אחורה (כולל ניקוי מועמדים ומשרות יתומים)
+        result = revert_from_journal(c, log_id)
         # מעדכן את הסטטוס ביומן
         c.execute("UPDATE data_logs SET status = 'Reverted' WHERE log_id = ?", (log_id,))
-        # (בונוס עתידי: לנקות מועמדים "יתומים" שאין להם יותר תהליכים)
+        bump_data_version(conn, "ats")
         conn.commit()
-        return {"message": f"Upload {log_id} has been reverted successfully."}
+        return {"message": f"Upload {log_id} has been reverted successfully.", **result}
     except Exception as e:
+        conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 
 # ==========================================
 # 4. DASHBOARD API (Endpoints for the UI)
 # ==========================================
-@app.get("/meta")
-def get_meta():
-    conn = sqlite3.connect(DB_PATH)
+@app.get("/meta", dependencies=[Depends(versioned("ats", cache_control=CACHE_SHORT))])
+def get_meta(conn: sqlite3.Connection = Depends(get_read_conn)):
     try:
-        df = get_unified_data(conn)
-        departments = [d for d in df['department'].dropna().unique().tolist() if str(d).strip()]
-        recruiters = [r for r in df['recruiter'].dropna().unique().tolist() if str(r).strip()]
-        return {"departments": sorted(departments), "recruiters": sorted(recruiters)}
+        return _meta_payload(get_unified_data(conn))
     except Exception:
         return {"departments": [], "recruiters": []}
-    finally:
-        conn.close()
 
 
-@app.get("/stats")
-def get_stats(timeframe: str = "all", department: str = "all", recruiter: str = "all"):
-    conn = sqlite3.connect(DB_PATH)
+def _meta_payload(df):
+    departments = [d for d in df['department'].dropna().unique().tolist() if str(d).strip()]
+    recruiters = [r for r in df['recruiter'].dropna().unique().tolist() if str(r).strip()]
+    return {"departments": sorted(departments), "recruiters": sorted(recruiters)}
+
+
+@app.get("/stats", dependencies=[Depends(versioned("ats", daily=True))])
+def get_stats(timeframe: str = "all", department: str = "all", recruiter: str = "all", conn: sqlite3.Connection = Depends(get_read_conn)):
     try:
-        df = get_unified_data(conn)
-        df['start_date'] = pd.to_datetime(df['start_date'])
+        # הפעלת סינונים חכמים (Slicers) - על דליי הקוביה ולא על התהליכים עצמם
+        buckets = load_kpi_buckets(conn, department, recruiter, timeframe)
     except Exception:
-        return {"total_candidates": 0, "hired_this_month": 0, "avg_days": 0, "sla_alerts": 0, "chart_data": []}
-    finally:
-        conn.close()
+        buckets = None
+    return _stats_payload(buckets, timeframe)
 
-    if df.empty:
-        return {"total_candidates": 0, "hired_this_month": 0, "avg_days": 0, "sla_alerts": 0, "chart_data": []}
 
-    # הפעלת סינונים חכמים (Slicers)
-    if department != "all":
-        df = df[df['department'] == department]
-    if recruiter != "all":
-        df = df[df['recruiter'] == recruiter]
-    if timeframe == "30days":
-        df = df[df['start_date'] >= (pd.Timestamp.now() - pd.Timedelta(days=30))]
-    elif timeframe == "year":
-        df = df[df['start_date'].dt.year == pd.Timestamp.now().year]
+def _stats_payload(buckets, timeframe):
+    """מדדי הכותרת והגרף מתוך דליי (שנה, חודש, סיווג) שכבר עברו את החיתוכים"""
+    empty = {"total_candidates": 0, "hired_this_month": 0, "avg_days": 0, "sla_alerts": 0, "chart_data": []}
+    if buckets is None or buckets.empty:
+        return empty
 
-    closed_statuses = ['קליטה', 'גיוס', 'דחייה', 'הסרה', 'ויתור', 'הקפאה']
-    df['is_active'] = ~df['status'].str.contains('|'.join(closed_statuses), case=False, na=False)
+    now = pd.Timestamp.now()
+    is_hired = (buckets['status_class'] & STATUS_HIRED) > 0
+    is_active = (buckets['status_class'] & STATUS_CLOSED) == 0
+    recent = buckets['year'] >= (now.year - 1) if timeframe == "all" else pd.Series(True, index=buckets.index)
 
-    recent_df = df[df['start_date'].dt.year >= (pd.Timestamp.now().year - 1)].copy() if timeframe == "all" else df.copy()
+    total = int(buckets['applications'].sum())
+    this_month = (buckets['year'] == now.year) & (buckets['month'] == now.month)
+    hired_count = int(buckets.loc[recent & is_hired & this_month, 'applications'].sum())
 
-    total = len(df)
-    current_month = pd.Timestamp.now().month
-    hired_df = recent_df[(recent_df['status'].str.contains('קליטה|גיוס', case=False, na=False)) & (recent_df['start_date'].dt.month == current_month)]
-    hired_count = len(hired_df)
+    all_hired = buckets[recent & is_hired]
+    avg_days = int(all_hired['sum_days'].sum() / all_hired['applications'].sum()) if not all_hired.empty else 0
 
-    all_hired = recent_df[recent_df['status'].str.contains('קליטה|גיוס', case=False, na=False)]
-    avg_days = int(all_hired['days_in_process'].mean()) if not all_hired.empty else 0
+    # חישוב SLA אדפטיבי (לפי סוג משרה - מוקדים מול מטה/טכנולוגי) - מחושב לכל תהליך כבר בקוביה
+    sla_count = int(buckets.loc[recent & is_active, 'sla_breaches'].sum())
 
-    # חישוב SLA אדפטיבי (לפי סוג משרה - מוקדים מול מטה/טכנולוגי)
-    active_df = recent_df[recent_df['is_active']]
-    sla_count = len(active_df[
-        ((active_df['department'].str.contains('שירות|מכירות|מוקדים', case=False, na=False)) & (active_df['days_in_process'] > 29)) |
-        ((~active_df['department'].str.contains('שירות|מכירות|מוקדים', case=False, na=False)) & (active_df['days_in_process'] > 44))
-    ])
-
-    graph_df = recent_df.copy()
-    graph_df['month_name'] = graph_df['start_date'].dt.strftime('%b')
-    graph_df['month_num'] = graph_df['start_date'].dt.month
-    chart_data = graph_df.groupby(['month_num', 'month_name']).size().reset_index(name='candidates').sort_values('month_num')
-    formatted_chart = [{"name": row['month_name'], "candidates": int(row['candidates'])} for _, row in chart_data.iterrows()]
+    # הגרף מקובץ לפי שנה וחודש - ינואר של שתי שנים שונות הם שני עמודים
+    graph = buckets[recent & (buckets['year'] > 0)]
+    chart_data = graph.groupby(['year', 'month'])['applications'].sum().reset_index().sort_values(['year', 'month'])
+    formatted_chart = [{"name": pd.Timestamp(year=int(row.year), month=int(row.month), day=1).strftime('%b'),
+                        "year": int(row.year), "month": int(row.month), "candidates": int(row.applications)}
+                       for row in chart_data.itertuples()]
 
     return {"total_candidates": total, "hired_this_month": hired_count, "avg_days": avg_days, "sla_alerts": sla_count, "chart_data": formatted_chart}
 
 
-@app.get("/candidates")
-def get_candidates(page: int = 1, limit: int = 50, search: str = "", sort_by: str = "days_in_process", sort_dir: str = "desc"):
-    offset = (page - 1) * limit
-    conn = sqlite3.connect(DB_PATH)
+def encode_cursor(values):
+    """סמן אטום לעמוד הבא: ערכי מפתח המיון של השורה האחרונה (כולל app_id לשבירת שוויון)"""
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode()).decode()
 
+
+def decode_cursor(cursor, expected_len):
     try:
-        df = get_unified_data(conn)
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
     except Exception:
-        return {"data": [], "page": page, "total": 0}
-    finally:
-        conn.close()
+        values = None
+    if not isinstance(values, list) or len(values) != expected_len:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
 
-    if df.empty:
-        return {"data": [], "page": page, "total": 0}
+def _keyset_segments(sort_keys, direction, values):
+    """
+    התנאים שממשיכים מהסמן, לפי סדר הסריקה. SQLite ממיין NULL לפני כל ערך (ראשון ב-ASC, אחרון ב-DESC),
+    ו-NULL לא עונה לאף השוואה - לכן קבוצת ה-NULL במפתח הראשון (recruiter, department...) היא מקטע נפרד,
+    בשאילתה משלו על אותו אינדקס (IS NULL / IS NOT NULL הם עדיין טווח באינדקס ולא OR שמבטל אותו).
+    """
+    first, rest = sort_keys[0], sort_keys[1:]
+    op = ">" if direction == "ASC" else "<"
+    rest_sql = f"({', '.join(rest)}) {op} ({', '.join('?' * len(rest))})"
+    if values[0] is None:
+        after_in_nulls = (f"{first} IS NULL AND {rest_sql}", values[1:])
+        return [after_in_nulls, (f"{first} IS NOT NULL", [])] if direction == "ASC" else [after_in_nulls]
+    # התנאי על המפתח הראשון לבדו מאפשר סריקת טווח על האינדקס; ה-row value מדייק את נקודת ההמשך
+    after = (f"{first} {op}= ? AND ({', '.join(sort_keys)}) {op} ({', '.join('?' * len(sort_keys))})",
+             [values[0], *values])
+    return [after] if direction == "ASC" else [after, (f"{first} IS NULL", [])]
+
+
+def keyset_page(conn, select, source, where, params, sort_keys, direction, cursor, limit, offset=0):
+    """
+    עמוד אחד בעימוד keyset: ממשיכים מהמפתח האחרון במקום לדלג על offset שורות,
+    כך שעמוד עמוק עולה כמו הראשון ולא זז כשנכנסות שורות חדשות.
+    sort_keys - ביטויי המיון לפי הסדר, האחרון ייחודי (a.app_id); רק הראשון יכול להיות NULL.
+    offset נתמך רק לעמוד הפתיחה (תאימות לעימוד לפי מספר עמוד).
+    """
+    segments = _keyset_segments(sort_keys, direction, decode_cursor(cursor, len(sort_keys))) if cursor else [(None, [])]
+    keys_sql = ", ".join(f"{key} AS _key{i}" for i, key in enumerate(sort_keys))
+    order_sql = ", ".join(f"{key} {direction}" for key in sort_keys)
+
+    frames, wanted = [], limit + 1
+    for condition, condition_params in segments:
+        conditions = [c for c in (where, condition) if c]
+        where_sql = f"WHERE {' AND '.join(f'({c})' for c in conditions)}" if conditions else ""
+        df = pd.read_sql(f"SELECT {select}, {keys_sql} {source} {where_sql} ORDER BY {order_sql} LIMIT ? OFFSET ?",
+                         conn, params=(*params, *condition_params, wanted, 0 if cursor else offset))
+        frames.append(df)
+        wanted -= len(df)
+        if wanted <= 0:
+            break
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    key_cols = [f"_key{i}" for i in range(len(sort_keys))]
+    next_cursor = None
+    if len(df) > limit:
+        df = df.iloc[:limit]
+        next_cursor = encode_cursor([None if pd.isna(v) else v.item() if hasattr(v, "item") else v
+                                     for v in df.iloc[-1][key_cols]])
+    return df.drop(columns=key_cols), next_cursor
 
-    # 1. חיפוש
-    if search:
-        mask = (
-            df['candidate_name'].str.contains(search, case=False, na=False) |
-            df['job_title'].str.contains(search, case=False, na=False) |
-            df['recruiter'].str.contains(search, case=False, na=False)
-        )
-        df = df[mask]
 
-    # 2. מיון חכם
+@app.get("/candidates")
+def get_candidates(page: int = 1, limit: int = 50, search: str = "", sort_by: str = "days_in_process", sort_dir: str = "desc",
+                   cursor: str = None, conn: sqlite3.Connection = Depends(get_read_conn)):
+    """
+    חיפוש, מיון ועימוד בתוך SQLite - העבודה תלויה בגודל העמוד ולא בכמות התהליכים.
+    לגלילה עמוקה: next_cursor מהתשובה נשלח כ-cursor בבקשה הבאה (אז page מתעלם והספירה לא מחושבת שוב).
+    """
+    # 1. חיפוש (FTS5, תחיליות מילים)
+    where, params = "", []
+    match = build_search_query(search) if search else ""
+    if match:
+        # ה-+ מונע מהמתכנן להפוך את רשימת ההתאמות ללולאה פנימית על כל שורה של טבלת המיון
+        where = "+a.rowid IN (SELECT rowid FROM applications_fts WHERE applications_fts MATCH ?)"
+        params.append(match)
+
+    # 2. מיון חכם (רשימה סגורה - אין הזרקת SQL דרך sort_by)
+    # הטבלה שמחזיקה את עמודת המיון נסרקת ראשונה לפי האינדקס שלה (CROSS JOIN קובע את הסדר),
+    # כך ש-LIMIT עוצר אחרי עמוד אחד במקום למיין את כל התהליכים
+    applications_first = '''FROM applications a
+                            JOIN candidates c ON a.candidate_id = c.id
+                            JOIN jobs j ON a.job_id = j.id'''
+    candidates_first = '''FROM candidates c
+                          CROSS JOIN applications a ON a.candidate_id = c.id
+                          JOIN jobs j ON a.job_id = j.id'''
+    jobs_first = '''FROM jobs j
+                    CROSS JOIN applications a ON a.job_id = j.id
+                    JOIN candidates c ON a.candidate_id = c.id'''
+    # מפתחות המיון תואמים את האינדקסים המורכבים, ו-app_id תמיד אחרון לסדר מלא
     valid_columns = {
-        "candidate_name": "candidate_name",
-        "job_title": "job_title",
-        "status": "status",
-        "recruiter": "recruiter",
-        "days_in_process": "days_in_process",
-        "department": "department"
+        "candidate_name": (("c.name", "c.id", "a.app_id"), candidates_first),
+        "job_title": (("j.job_title", "a.app_id"), jobs_first),
+        "status": (("a.status", "a.app_id"), applications_first),
+        "recruiter": (("a.recruiter", "a.app_id"), applications_first),
+        "days_in_process": (("a.days_in_process", "a.app_id"), applications_first),
+        "department": (("j.department", "j.id", "a.app_id"), jobs_first)
     }
-    safe_sort_col = valid_columns.get(sort_by, "days_in_process")
-    ascending = sort_dir.lower() == "asc"
+    sort_keys, source = valid_columns.get(sort_by, valid_columns["days_in_process"])
+    direction = "ASC" if sort_dir.lower() == "asc" else "DESC"
 
-    df = df.sort_values(safe_sort_col, ascending=ascending)
+    total = None
+    try:
+        if not cursor:
+            # לכל תהליך יש תמיד מועמד ומשרה (נוצרים לפניו בקליטה), לכן הספירה לא צריכה את ה-JOIN
+            total = conn.execute(f"SELECT COUNT(*) FROM applications a {'WHERE ' + where if where else ''}", params).fetchone()[0]
+            if total == 0:
+                return {"data": [], "page": page, "total": 0, "next_cursor": None}
+        select = '''c.name as candidate_name, c.email, c.source, j.job_title, j.department,
+                    a.status, a.recruiter, a.start_date, a.days_in_process, a.upload_log_id, a.app_id'''
+        df_page, next_cursor = keyset_page(conn, select, source, where, params, sort_keys, direction,
+                                           cursor, limit, offset=(page - 1) * limit)
+    except HTTPException:
+        raise
+    except Exception:
+        return {"data": [], "page": page, "total": 0, "next_cursor": None}
 
-    total = len(df)
-    df_page = df.iloc[offset:offset + limit]
+    # NULL (מגייס/סטטוס ריקים) יוצא null ב-JSON ולא NaN
+    return {"data": _records(df_page), "page": page, "total": total, "next_cursor": next_cursor}
 
-    return {"data": df_page.to_dict(orient="records"), "page": page, "total": total}
+
+def _job_buckets(conn, active_only=True):
+    """
+    דליי הקוביה מקובצים למשרה ומגייס, עם שם המשרה והמחלקה.
+    active_only=False מחזיר גם את התהליכים הסגורים (עמודת active מבדילה) - לשימוש ה-/dashboard.
+    """
+    where = "WHERE (status_class & :closed) = 0" if active_only else ""
+    # מקבצים קודם ומצרפים את jobs אחר כך - JOIN על כמה מאות שורות ולא על כל דלי בקוביה
+    return pd.read_sql(f'''SELECT g.job_id, j.job_title, j.department, g.recruiter, g.active,
+                                  g.applications, g.sum_days, g.max_days, g.overdue
+                           FROM (SELECT job_id, recruiter, (status_class & :closed) = 0 AS active,
+                                        SUM(applications) AS applications, SUM(sum_days) AS sum_days,
+                                        MAX(max_days) AS max_days, SUM(overdue) AS overdue
+                                 FROM kpi_rollup {where}
+                                 GROUP BY job_id, recruiter, active) g
+                           JOIN jobs j ON j.id = g.job_id''', conn, params={"closed": STATUS_CLOSED})
+
+
+def _job_summary(active):
+    """
+    מעבר קיבוץ אחד לכל משרה (לפי שם) על דליי משרה/מגייס פעילים - משרת גם את /jobs וגם את צווארי הבקבוק.
+    המגייס המוביל נבחר פעם לפי מספר תהליכים ופעם לפי חריגות ('' בקוביה = לא שויך);
+    בשוויון נבחר המגייס הראשון לפי שם, כך שהתוצאה לא תלויה בסדר השורות מה-SQL.
+    """
+    summary = active.groupby('job_title').agg(
+        applications=('applications', 'sum'), sum_days=('sum_days', 'sum'), max_days=('max_days', 'max'),
+        overdue=('overdue', 'sum'), department=('department', 'first'))
+    for weight in ('applications', 'overdue'):
+        leaders = active.sort_values([weight, 'recruiter'], ascending=[False, True]).drop_duplicates('job_title')
+        summary[f'recruiter_by_{weight}'] = leaders.set_index('job_title')['recruiter']
+    return summary.reset_index()
 
 
-@app.get("/jobs")
-def get_jobs():
-    conn = sqlite3.connect(DB_PATH)
+@app.get("/jobs", dependencies=[Depends(versioned("ats"))])
+def get_jobs(conn: sqlite3.Connection = Depends(get_read_conn)):
+    """
+    סיכום המשרות הפתוחות (רק תהליכים פעילים).
+    recruiter הוא המגייס עם מספר התהליכים הפעילים הגדול ביותר במשרה (בשוויון - הראשון לפי שם),
+    ולא המגייס של השורה הראשונה כמו בעבר: הנתון מגיע מקוביית kpi_rollup שאין בה סדר שורות.
+    """
     try:
-        df = get_unified_data(conn)
+        # ניקח רק מועמדים שעדיין פעילים בתהליך
+        summary = _job_summary(_job_buckets(conn))
     except Exception:
         return []
-    finally:
-        conn.close()
-
-    if df.empty:
-        return []
+    return _jobs_payload(summary)
 
-    # הגדרת סטטוסים סופיים (בדיוק כמו בדשבורד)
-    closed_statuses = ['קליטה', 'גיוס', 'דחייה', 'הסרה', 'ויתור', 'הקפאה']
-    df['is_active'] = ~df['status'].str.contains('|'.join(closed_statuses), case=False, na=False)
 
-    # ניקח רק מועמדים שעדיין פעילים בתהליך
-    active_df = df[df['is_active']]
+def _jobs_payload(summary):
+    if summary.empty:
+        return []
 
     jobs_summary = []
 
-    # קיבוץ לפי שם המשרה
-    for job_title, group in active_df.groupby('job_title'):
-        active_candidates_count = len(group)
-        avg_days = int(group['days_in_process'].mean())
-        max_days = int(group['days_in_process'].max())
-        sla_breaches = len(group[group['days_in_process'] > 40])
+    # שורה לכל משרה (הקיבוץ כבר נעשה ב-_job_summary)
+    for job in summary.itertuples(index=False):
+        job_title = job.job_title
+        active_candidates_count = int(job.applications)
+        avg_days = int(job.sum_days / active_candidates_count)
+        max_days = int(job.max_days)
+        sla_breaches = int(job.overdue)
 
-        department = group['department'].iloc[0] if pd.notna(group['department'].iloc[0]) else "כללי"
-        recruiter = group['recruiter'].iloc[0] if pd.notna(group['recruiter'].iloc[0]) else "לא שויך"
+        department = job.department if pd.notna(job.department) else "כללי"
+        recruiter = job.recruiter_by_applications or "לא שויך"
 
         jobs_summary.append({
             "job_title": job_title,
@@ -515,43 +1741,33 @@ def get_jobs():
 
 
 @app.get("/executive-brief")
-def get_executive_brief():
-    conn = sqlite3.connect(DB_PATH)
+def get_executive_brief(conn: sqlite3.Connection = Depends(get_read_conn)):
     try:
-        df = get_unified_data(conn)
-        df['start_date'] = pd.to_datetime(df['start_date'])
+        buckets = load_kpi_buckets(conn)
+        summary = _job_summary(_job_buckets(conn))
     except Exception:
         return {"error": "No data"}
-    finally:
-        conn.close()
+    return _brief_payload(buckets, summary)
 
-    if df.empty:
+
+def _brief_payload(buckets, summary):
+    if buckets.empty:
         return {"error": "No data"}
 
-    closed_statuses = ['קליטה', 'גיוס', 'דחייה', 'הסרה', 'ויתור', 'הקפאה']
-    df['is_active'] = ~df['status'].str.contains('|'.join(closed_statuses), case=False, na=False)
-    active_df = df[df['is_active']]
+    is_active = (buckets['status_class'] & STATUS_CLOSED) == 0
 
     # Metrics
-    total_active = len(active_df)
-    sla_breaches = len(active_df[active_df['days_in_process'] > 40])
+    total_active = int(buckets.loc[is_active, 'applications'].sum())
+    sla_breaches = int(buckets.loc[is_active, 'overdue'].sum())
 
-    current_month = pd.Timestamp.now().month
-    current_year = pd.Timestamp.now().year
-    hired_this_month = len(df[(df['status'].str.contains('קליטה|גיוס', case=False, na=False)) &
-                              (df['start_date'].dt.month == current_month) &
-                              (df['start_date'].dt.year == current_year)])
+    now = pd.Timestamp.now()
+    hired_this_month = int(buckets.loc[((buckets['status_class'] & STATUS_HIRED) > 0) &
+                                       (buckets['month'] == now.month) &
+                                       (buckets['year'] == now.year), 'applications'].sum())
 
     # חישוב צווארי הבקבוק המרכזיים
-    bottlenecks = []
-    for job_title, group in active_df.groupby('job_title'):
-        breaches = len(group[group['days_in_process'] > 40])
-        if breaches > 0:
-            bottlenecks.append({
-                "job": job_title,
-                "breaches": breaches,
-                "recruiter": str(group['recruiter'].iloc[0]) if pd.notna(group['recruiter'].iloc[0]) else "לא מוגדר"
-            })
+    bottlenecks = [{"job": job.job_title, "breaches": int(job.overdue), "recruiter": job.recruiter_by_overdue or "לא מוגדר"}
+                   for job in summary[summary['overdue'] > 0].itertuples(index=False)]
 
     bottlenecks.sort(key=lambda x: x['breaches'], reverse=True)
     top_3 = bottlenecks[:3]
@@ -578,29 +1794,57 @@ def get_executive_brief():
     }
 
 
-@app.get("/intelligence")
-def get_intelligence():
+@app.get("/dashboard", dependencies=[Depends(versioned("ats", daily=True))])
+def get_dashboard(timeframe: str = "all", department: str = "all", recruiter: str = "all", conn: sqlite3.Connection = Depends(get_read_conn)):
+    """
+    דף הבית בבקשה אחת: stats, meta, executive_brief ו-jobs מאותן טעינות.
+    דליי (שנה, חודש, סיווג) נקראים פעם אחת ומשרתים את התקציר ואת ה-stats (כשאין חיתוך שדורש שאילתה משלו),
+    ודליי משרה/מגייס (פעילים וסגורים) משרתים את jobs, צווארי הבקבוק ורשימות ה-meta.
+    """
+    try:
+        buckets = load_kpi_buckets(conn)
+        job_buckets = _job_buckets(conn, active_only=False)
+        if timeframe == "30days" or department != "all" or recruiter != "all":
+            sliced = load_kpi_buckets(conn, department, recruiter, timeframe)
+        elif timeframe == "year":
+            sliced = buckets[buckets['year'] == pd.Timestamp.now().year]
+        else:
+            sliced = buckets
+    except Exception:
+        return {"stats": _stats_payload(None, timeframe), "meta": {"departments": [], "recruiters": []},
+                "executive_brief": {"error": "No data"}, "jobs": []}
+
+    summary = _job_summary(job_buckets[job_buckets['active'] == 1])
+    return {
+        "stats": _stats_payload(sliced, timeframe),
+        "meta": _meta_payload(job_buckets),
+        "executive_brief": _brief_payload(buckets, summary),
+        "jobs": _jobs_payload(summary)
+    }
+
+
+@app.get("/intelligence", dependencies=[Depends(versioned("ats"))])
+def get_intelligence(conn: sqlite3.Connection = Depends(get_read_conn)):
     """מנוע הפקת תובנות, משפכים, ורדאר סיכונים מהדאטה האמיתי"""
-    conn = sqlite3.connect(DB_PATH)
     try:
-        df = get_unified_data(conn)
+        buckets = load_kpi_buckets(conn, group_by=("status_class",))
     except Exception:
         return {"error": "No data"}
-    finally:
-        conn.close()
 
-    if df.empty:
+    if buckets.empty:
         return {"error": "No data"}
 
     # --- 1. משפך המרה דינמי מבוסס נתונים אמיתיים (Real Funnel) ---
-    total_candidates = len(df)
+    total_candidates = int(buckets['applications'].sum())
+
+    def in_stage(flag):
+        return int(buckets.loc[(buckets['status_class'] & flag) > 0, 'applications'].sum())
 
-    # חיפוש טקסטואלי חכם של הסטטוסים
     cv_review = total_candidates  # כולם מתחילים פה
-    phone_screen = len(df[df['status'].str.contains('טלפוני|ראשוני|ראיון HR|מנהל', case=False, na=False)])
-    interviews = len(df[df['status'].str.contains('ראיון HR|משאבי אנוש|ראיון מנהל|מקצועי|מרכז הערכה', case=False, na=False)])
-    offers = len(df[df['status'].str.contains('הצעת שכר|חוזה|ממתין לחתימה', case=False, na=False)])
-    hired = len(df[df['status'].str.contains('קליטה|גיוס', case=False, na=False)])
+    phone_screen = in_stage(STATUS_SCREEN)
+    interviews = in_stage(STATUS_INTERVIEW)
+    offers = in_stage(STATUS_OFFER)
+    hired = in_stage(STATUS_HIRED)
 
     # יצירת המבנה שהפרונטאנד מצפה לו
     funnel = [
@@ -612,12 +1856,14 @@ def get_intelligence():
     ]
 
     # --- 2. רדאר נטישה (Ghosting Predictor) אמיתי ---
-    closed_statuses = ['קליטה', 'גיוס', 'דחייה', 'הסרה', 'ויתור', 'הקפאה']
-    df['is_active'] = ~df['status'].str.contains('|'.join(closed_statuses), case=False, na=False)
-    active_df = df[df['is_active']]
-
-    # מועמדים פעילים שתקועים מעל 14 יום בלי תזוזה
-    risk_df = active_df[active_df['days_in_process'] > 14].sort_values('days_in_process', ascending=False).head(8)
+    # מועמדים פעילים שתקועים מעל 14 יום בלי תזוזה - 8 הראשונים לפי האינדקס על ימים בתהליך
+    risk_df = pd.read_sql(f'''
+        SELECT c.name AS candidate_name, j.job_title, a.recruiter, a.days_in_process
+        FROM applications a
+        JOIN candidates c ON a.candidate_id = c.id
+        JOIN jobs j ON a.job_id = j.id
+        WHERE a.days_in_process > 14 AND (a.status_class & {STATUS_CLOSED}) = 0
+        ORDER BY a.days_in_process DESC LIMIT 8''', conn)
 
     ghosting_risks = []
     for _, row in risk_df.iterrows():
@@ -631,7 +1877,8 @@ def get_intelligence():
             "recruiter": row['recruiter'] if pd.notna(row['recruiter']) else "לא שויך"
         })
 
-    baseline_days = int(active_df['days_in_process'].mean()) if not active_df.empty else 0
+    active = buckets[(buckets['status_class'] & STATUS_CLOSED) == 0]
+    baseline_days = int(active['sum_days'].sum() / active['applications'].sum()) if not active.empty else 0
 
     return {
         "funnel": funnel,
@@ -643,43 +1890,145 @@ def get_intelligence():
     }
 
 
-@app.get("/drilldown")
-def get_drilldown(month_name: str, timeframe: str = "all", department: str = "all", recruiter: str = "all"):
-    """שולף את רשימת המועמדים המדויקת של חודש ספציפי (לפי חיתוכים)"""
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        df = get_unified_data(conn)
-        df['start_date'] = pd.to_datetime(df['start_date'])
-    except Exception:
-        return []
-    finally:
-        conn.close()
+@app.get("/drilldown")
+def get_drilldown(month_name: str, timeframe: str = "all", department: str = "all", recruiter: str = "all", year: int = None,
+                  limit: int = 100, cursor: str = None, conn: sqlite3.Connection = Depends(get_read_conn)):
+    """שולף את רשימת המועמדים המדויקת של חודש ספציפי (לפי חיתוכים), בעמודים לפי סמן"""
+    empty = {"data": [], "next_cursor": None}
+    month_abbrs = list(calendar.month_abbr)
+    if month_name not in month_abbrs[1:]:
+        return empty
+
+    # --- חיתוך ספציפי לחודש שנלחץ בגרף (עמודי הגרף מפרידים בין שנים) ---
+    filters = ["strftime('%m', a.start_date) = ?"]
+    params = [f"{month_abbrs.index(month_name):02d}"]
+    if year is not None:
+        filters.append("strftime('%Y', a.start_date) = ?")
+        params.append(str(year))
+
+    # --- מפעילים את אותם סינונים מהדשבורד הראשי ---
+    if department != "all":
+        filters.append("j.department = ?")
+        params.append(department)
+    if recruiter != "all":
+        filters.append("a.recruiter = ?")
+        params.append(recruiter)
+    if timeframe == "30days":
+        filters.append("a.start_date >= ?")
+        params.append((pd.Timestamp.now() - pd.Timedelta(days=30)).strftime('%Y-%m-%d'))
+    elif timeframe == "year":
+        filters.append("strftime('%Y', a.start_date) = ?")
+        params.append(str(pd.Timestamp.now().year))
+
+    source = '''FROM applications a
+                JOIN candidates c ON a.candidate_id = c.id
+                JOIN jobs j ON a.job_id = j.id'''
+    select = "c.name AS candidate_name, j.job_title, a.status, a.recruiter, a.days_in_process, a.app_id"
+    try:
+        df_month, next_cursor = keyset_page(conn, select, source, " AND ".join(filters), params,
+                                            ("a.days_in_process", "a.app_id"), "DESC", cursor, limit)
+    except HTTPException:
+        raise
+    except Exception:
+        return empty
+
+    return {"data": df_month.fillna("").to_dict(orient="records"), "next_cursor": next_cursor}
+
+
+# ==========================================
+# TIME MACHINE API (השוואת דוחות שבועיים לאורך זמן)
+# ==========================================
+# ההיסטוריה השבועית נשמרת במסד של מנוע ה-Snapshot (db_manager.py בתיקיית השורש)
+SNAPSHOT_DB_PATH = os.getenv("PHOENIX_SNAPSHOT_DB", os.path.join(PROJECT_ROOT, "phoenix_talent_os.db"))
+snapshot_db_lock = threading.Lock()  # חיבור יחיד משותף - שאילתה אחת בכל רגע
+_snapshot_db = None
+
+
+def get_snapshot_db():
+    """פותח את מסד ה-Snapshot בשימוש הראשון ולא בטעינת המודול (הפתיחה יוצרת ומעדכנת את הסכמה).
+    יש לקרוא בתוך snapshot_db_lock."""
+    global _snapshot_db
+    if _snapshot_db is None:
+        from db_manager import DatabaseManager
+        _snapshot_db = DatabaseManager(SNAPSHOT_DB_PATH)
+    return _snapshot_db
 
-    if df.empty:
-        return []
 
-    # --- מפעילים את אותם סינונים מהדשבורד הראשי ---
-    if department != "all":
-        df = df[df['department'] == department]
-    if recruiter != "all":
-        df = df[df['recruiter'] == recruiter]
+@app.on_event("shutdown")
+def close_snapshot_db():
+    global _snapshot_db
+    with snapshot_db_lock:
+        if _snapshot_db is not None:
+            _snapshot_db.conn.close()
+            _snapshot_db = None
 
-    if timeframe == "30days":
-        df = df[df['start_date'] >= (pd.Timestamp.now() - pd.Timedelta(days=30))]
-    elif timeframe == "year":
-        df = df[df['start_date'].dt.year == pd.Timestamp.now().year]
 
-    # --- חיתוך ספציפי לחודש שנלחץ בגרף ---
-    df['month_short'] = df['start_date'].dt.strftime('%b')
-    df_month = df[df['month_short'] == month_name].copy()
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
 
-    if df_month.empty:
-        return []
 
-    df_month = df_month.sort_values('days_in_process', ascending=False)
+def _parse_point_in_time(upload_id, date):
+    if upload_id is not None:
+        return upload_id
+    if date:
+        try:
+            when = pd.Timestamp(date)
+        except (TypeError, ValueError):
+            when = pd.NaT
+        if pd.isna(when):
+            raise HTTPException(status_code=400, detail=f"תאריך לא תקין: {date}")
+        return when
+    raise HTTPException(status_code=400, detail="יש לציין upload_id או date")
+
+
+@app.get("/history/uploads")
+def get_snapshot_uploads():
+    with snapshot_db_lock:
+        return _records(get_snapshot_db().get_upload_history())
+
+
+@app.get("/history/as-of")
+def get_snapshot_as_of(upload_id: int = None, date: str = None, limit: int = 100, offset: int = 0):
+    """תמונת המצב כפי שהייתה בטעינה מסוימת או בתאריך מסוים (עם פילוח סטטוסים ועמוד של רשומות)"""
+    when = _parse_point_in_time(upload_id, date)
+    with snapshot_db_lock:
+        snapshot_db = get_snapshot_db()
+        resolved = snapshot_db.resolve_upload(when)
+        if resolved is None:
+            raise HTTPException(status_code=404, detail="לא נמצאה טעינה לנקודת הזמן המבוקשת")
+        by_status = snapshot_db.status_counts_as_of(resolved)
+        rows = snapshot_db.get_snapshot_as_of(resolved, limit, offset)
+    return {"upload_id": resolved, "total": sum(by_status.values()), "by_status": by_status,
+            "data": _records(rows), "limit": limit, "offset": offset}
+
+
+@app.get("/history/diff")
+def get_snapshot_diff(upload_a: int = None, upload_b: int = None, date_a: str = None, date_b: str = None):
+    """מה השתנה בין שני שבועות: תהליכים חדשים, תהליכים שנעלמו ושינויי סטטוס"""
+    a = _parse_point_in_time(upload_a, date_a)
+    b = _parse_point_in_time(upload_b, date_b)
+    with snapshot_db_lock:
+        snapshot_db = get_snapshot_db()
+        resolved_a, resolved_b = snapshot_db.resolve_upload(a), snapshot_db.resolve_upload(b)
+        if resolved_a is None or resolved_b is None:
+            raise HTTPException(status_code=404, detail="לא נמצאה טעינה לנקודת הזמן המבוקשת")
+        changes = snapshot_db.diff(resolved_a, resolved_b)
+    return {
+        "upload_a": resolved_a,
+        "upload_b": resolved_b,
+        "summary": {key: len(df) for key, df in changes.items()},
+        **{key: _records(df) for key, df in changes.items()}
+    }
+
 
-    records = df_month[['candidate_name', 'job_title', 'status', 'recruiter', 'days_in_process']].fillna("").to_dict(orient="records")
-    return records
+@app.get("/history/applications/{app_hash}")
+def get_application_history(app_hash: str):
+    """כל הגרסאות של תהליך גיוס בודד לאורך הטעינות"""
+    with snapshot_db_lock:
+        versions = get_snapshot_db().history(app_hash)
+    if versions.empty:
+        raise HTTPException(status_code=404, detail=f"Application {app_hash} not found")
+    return _records(versions)
 
 
 @app.get("/admin/costs")
@@ -712,37 +2061,237 @@ def get_automations():
 # 4. FINOPS & BUDGET API (ניהול תקציב)
 # ==========================================
 
-@app.get("/api/finops/data")
-def get_finops_data():
-    conn = sqlite3.connect(DB_PATH)
+# --- חשבוניות שעוד לא מופו לקטגוריה לא נספרות בניצול התקציב (כמו ב-UI) ---
+FINOPS_PENDING_CATEGORY = "כללי למיפוי"
+FINOPS_PENDING_STATUS = "ממתין למיפוי"
+# IS ולא = : חשבונית עם category/status ריקים (NULL) נחשבת ממופה, לא "לא ידוע"
+FINOPS_PENDING_SQL = "(category IS ? OR status IS ?)"
+FINOPS_PENDING_PARAMS = (FINOPS_PENDING_CATEGORY, FINOPS_PENDING_STATUS)
+FINOPS_PAGE_DEFAULT = 100
+FINOPS_PAGE_MAX = 1000
+BUDGET_MONTH = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def _load_categories(conn):
+    rows = _row_cursor(conn).execute("SELECT * FROM finops_categories ORDER BY id").fetchall()
+    return [{**dict(row), "subcategories": json.loads(row["subcategories"]) if row["subcategories"] else []}
+            for row in rows]
+
+
+@app.get("/api/finops/data", dependencies=[Depends(versioned("finops"))])
+def get_finops_data(conn: sqlite3.Connection = Depends(get_read_conn)):
+    """קטגוריות וספקים (נתוני אב). החשבוניות עצמן - /api/finops/invoices בעמודים, והסיכומים - /api/finops/summary"""
     try:
-        categories_df = pd.read_sql("SELECT * FROM finops_categories", conn)
-        categories = categories_df.to_dict(orient="records")
-        for cat in categories:
-            cat['subcategories'] = json.loads(cat['subcategories']) if cat['subcategories'] else []
-
-        vendors_df = pd.read_sql("SELECT * FROM finops_vendors", conn)
-        invoices_df = pd.read_sql("SELECT * FROM finops_invoices ORDER BY date DESC", conn)
-
-        return {
-            "categories": categories,
-            "vendors": vendors_df.to_dict(orient="records"),
-            "invoices": invoices_df.to_dict(orient="records")
-        }
+        vendors = _row_cursor(conn).execute("SELECT * FROM finops_vendors ORDER BY name").fetchall()
+        return {"categories": _load_categories(conn), "vendors": [dict(row) for row in vendors]}
     except Exception as e:
-        return {"error": str(e), "categories": [], "vendors": [], "invoices": []}
+        return {"error": str(e), "categories": [], "vendors": []}
+
+
+def _budget_month_filters(month_from, month_to):
+    """טווח חודשי שיוך [month_from, month_to] בפורמט YYYY-MM - ממוין לקסיקוגרפית, אז מספיקה השוואת מחרוזות"""
+    where, params = [], []
+    for name, value, op in (("month_from", month_from, ">="), ("month_to", month_to, "<=")):
+        if value:
+            if not BUDGET_MONTH.match(value):
+                raise HTTPException(status_code=400, detail=f"ערך לא תקין ל-{name}: {value} (YYYY-MM)")
+            where.append(f"budget_month {op} ?")
+            params.append(value)
+    return where, params
+
+
+def _pct(part, whole):
+    return round(part / whole * 100, 1) if whole else None
+
+
+@app.get("/api/finops/summary", dependencies=[Depends(versioned("finops"))])
+def get_finops_summary(month_from: str = None, month_to: str = None, conn: sqlite3.Connection = Depends(get_read_conn)):
+    """
+    סיכומי ההוצאה מחושבים ב-SQLite (GROUP BY על אינדקסים מכסים) במקום בדפדפן:
+    לפי קטגוריה ותת-קטגוריה מול target / previous_year_spend, לפי חודש שיוך ולפי ספק.
+    גודל התשובה תלוי במספר הקטגוריות, החודשים והספקים - לא במספר החשבוניות.
+    """
+    where, params = _budget_month_filters(month_from, month_to)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    mapped_sql = " AND ".join([*where, f"NOT {FINOPS_PENDING_SQL}"])
+
+    # 1. קטגוריה + תת-קטגוריה, ובאותו מעבר גם סך החשבוניות שממתינות למיפוי
+    rows = conn.execute(f'''SELECT category, subcategory, {FINOPS_PENDING_SQL} AS pending, SUM(amount), COUNT(*)
+                            FROM finops_invoices {where_sql} GROUP BY category, subcategory, pending''',
+                        (*FINOPS_PENDING_PARAMS, *params)).fetchall()
+    pending = {"count": 0, "amount": 0.0}
+    spend = {}
+    for category, subcategory, is_pending, amount, count in rows:
+        amount = amount or 0.0
+        if is_pending:
+            pending["count"] += count
+            pending["amount"] += amount
+            continue
+        entry = spend.setdefault(category, {"spend": 0.0, "invoices": 0, "subcategories": {}})
+        entry["spend"] += amount
+        entry["invoices"] += count
+        entry["subcategories"][subcategory] = {"name": subcategory, "spend": amount, "invoices": count}
+
+    # 2. actual מול היעד ומול השנה הקודמת; קטגוריה שיש לה חשבוניות אבל לא מוגדרת - בלי יעד
+    categories = []
+    for cat in _load_categories(conn):
+        entry = spend.pop(cat["name"], {"spend": 0.0, "invoices": 0, "subcategories": {}})
+        categories.append({"id": cat["id"], "name": cat["name"], "code": cat["code"],
+                           "target": cat["target"], "previous_year_spend": cat["previous_year_spend"], **entry})
+    categories += [{"id": None, "name": name, "code": None, "target": None, "previous_year_spend": None, **entry}
+                   for name, entry in spend.items()]
+    for cat in categories:
+        target, previous = cat["target"] or 0, cat["previous_year_spend"] or 0
+        cat["variance"] = cat["spend"] - target
+        cat["utilization_pct"] = _pct(cat["spend"], target)
+        cat["yoy_change_pct"] = _pct(cat["spend"] - previous, previous)
+        cat["subcategories"] = sorted(cat["subcategories"].values(), key=lambda s: -s["spend"])
+
+    # 3. לפי חודש שיוך ולפי ספק (חשבוניות ממופות בלבד)
+    months = conn.execute(f'''SELECT budget_month, SUM(amount), COUNT(*) FROM finops_invoices WHERE {mapped_sql}
+                              GROUP BY budget_month ORDER BY budget_month''', (*params, *FINOPS_PENDING_PARAMS)).fetchall()
+    vendors = conn.execute(f'''SELECT vendor, SUM(amount), COUNT(*) FROM finops_invoices WHERE {mapped_sql}
+                               GROUP BY vendor ORDER BY SUM(amount) DESC''', (*params, *FINOPS_PENDING_PARAMS)).fetchall()
+
+    total_spend = sum(cat["spend"] for cat in categories)
+    total_target = sum(cat["target"] or 0 for cat in categories)
+    return {
+        "total_spend": total_spend,
+        "total_target": total_target,
+        "utilization_pct": _pct(total_spend, total_target),
+        "invoices": sum(cat["invoices"] for cat in categories),
+        "pending": pending,
+        "categories": categories,
+        "months": [{"budget_month": m, "spend": s or 0.0, "invoices": n} for m, s, n in months],
+        "vendors": [{"vendor": v, "spend": s or 0.0, "invoices": n} for v, s, n in vendors],
+    }
+
+
+@app.get("/api/finops/invoices", dependencies=[Depends(versioned("finops"))])
+def list_finops_invoices(category: str = None, subcategory: str = None, vendor: str = None, status: str = None,
+                         month_from: str = None, month_to: str = None, pending: bool = None, q: str = None,
+                         limit: int = FINOPS_PAGE_DEFAULT, cursor: str = None,
+                         conn: sqlite3.Connection = Depends(get_read_conn)):
+    """
+    יומן החשבוניות בעמודים, מהחודש האחרון לראשון. q - חיפוש תת-מחרוזת בספק / קטגוריה (כמו החיפוש ביומן),
+    pending=true - רק תיבת הממתינים למיפוי, pending=false - רק ממופות.
+    Keyset על (budget_month, id): next_cursor נשלח כ-cursor בבקשה הבאה; total מחושב רק בעמוד הראשון.
+    """
+    limit = max(1, min(limit, FINOPS_PAGE_MAX))
+    where, params = _budget_month_filters(month_from, month_to)
+    for column, value in (("category", category), ("subcategory", subcategory), ("vendor", vendor), ("status", status)):
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if pending is not None:
+        where.append(FINOPS_PENDING_SQL if pending else f"NOT {FINOPS_PENDING_SQL}")
+        params.extend(FINOPS_PENDING_PARAMS)
+    if q:
+        where.append("(instr(vendor, ?) > 0 OR instr(category, ?) > 0)")
+        params.extend([q, q])
+
+    total = None
+    if not cursor:
+        total = conn.execute(f"SELECT COUNT(*) FROM finops_invoices {'WHERE ' + ' AND '.join(where) if where else ''}",
+                             params).fetchone()[0]
+    else:
+        month, last_id = decode_cursor(cursor, 2)
+        # NULL ממוין אחרון ב-DESC ולא משתתף בהשוואת row value - הזנב של חודשים חסרים מטופל בנפרד
+        if month is None:
+            where.append("budget_month IS NULL AND id < ?")
+            params.append(last_id)
+        else:
+            where.append("((budget_month, id) < (?, ?) OR budget_month IS NULL)")
+            params.extend([month, last_id])
+
+    sql = "SELECT * FROM finops_invoices"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY budget_month DESC, id DESC LIMIT ?"
+    rows = _row_cursor(conn).execute(sql, (*params, limit + 1)).fetchall()
+
+    page = rows[:limit]
+    next_cursor = encode_cursor([page[-1]["budget_month"], page[-1]["id"]]) if len(rows) > limit else None
+    return {"items": [dict(row) for row in page], "count": len(page), "total": total, "next_cursor": next_cursor}
+
+# --- מאגר קבצי חשבוניות לפי תוכן (Content-Addressed) ---
+INVOICE_BLOB_DIR = os.path.join("uploads", "invoices", "blobs")
+INVOICE_BLOB_URL = "api/finops/blobs/"  # file_url יחסי ל-API, כמו שה-UI מצפה
+INVOICE_MAX_BYTES = int(os.getenv("PHOENIX_INVOICE_MAX_BYTES", str(20 * 1024 * 1024)))
+# blob שהועלה אבל עוד לא נשמר בחשבונית לא נמחק בניקוי בחלון הזה
+INVOICE_BLOB_GRACE_SECONDS = 24 * 60 * 60
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+
+def invoice_blob_path(digest):
+    """שתי רמות fan-out (ab/cd/abcd...) - אף תיקייה לא מחזיקה עשרות אלפי קבצים"""
+    return os.path.join(INVOICE_BLOB_DIR, digest[:2], digest[2:4], digest)
+
+
+def spool_invoice_blob(src):
+    """
+    מעתיק את ההעלאה במקטעים לקובץ זמני ומחשב SHA-256 תוך כדי. חריגה מהתקרה => ValueError והקובץ הזמני נמחק.
+    מחזיר (digest, size, tmp_path) - ההעברה למקום הסופי נעשית ב-store_invoice_blob, תחת נעילת הכותב.
+    """
+    os.makedirs(INVOICE_BLOB_DIR, exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    # הקובץ הזמני באותה מערכת קבצים - כדי ש-os.replace יהיה אטומי
+    fd, tmp_path = tempfile.mkstemp(dir=INVOICE_BLOB_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: src.read(1024 * 1024), b""):
+                size += len(block)
+                if size > INVOICE_MAX_BYTES:
+                    raise ValueError(f"הקובץ חורג מהגודל המותר ({INVOICE_MAX_BYTES // (1024 * 1024)}MB)")
+                digest.update(block)
+                out.write(block)
+        return digest.hexdigest(), size, tmp_path
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def store_invoice_blob(conn, tmp_path, digest, size, content_type, original_name):
+    """
+    קובע את ה-blob: בדיקת הקיום, העברת הקובץ והשורה ב-invoice_blobs - כולם תחת נעילת הכותב, כמו הניקוי,
+    כך שניקוי לא יכול למחוק את הקובץ בין הבדיקה לשמירת השורה. הקובץ הזמני נמחק רק אחרי ה-commit.
+    מחזיר is_duplicate
+    """
+    try:
+        final_path = invoice_blob_path(digest)
+        duplicate = os.path.exists(final_path)
+        if not duplicate:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+        # העלאה חוזרת של אותו תוכן מתחילה את חלון החסד מחדש - ה-sha256 הוחזר ללקוח ועוד לא נשמר בחשבונית
+        conn.execute('''INSERT INTO invoice_blobs (sha256, size, content_type, original_name, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(sha256) DO UPDATE SET created_at = excluded.created_at''',
+                     (digest, size, content_type, original_name, pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+        return duplicate
     finally:
-        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _upload_invoice_blob(file):
+    digest, size, tmp_path = spool_invoice_blob(file.file)
+    with db_pool.writer() as conn:
+        duplicate = store_invoice_blob(conn, tmp_path, digest, size, file.content_type, file.filename)
+    return digest, size, duplicate
+
 
 @app.post("/api/finops/upload_invoice")
 async def upload_invoice(file: UploadFile = File(...)):
-    """מקבל קובץ PDF/תמונה של חשבונית, שומר אותו ומחזיר נתונים ראשוניים"""
-    os.makedirs("uploads/invoices", exist_ok=True)
-    file_path = f"uploads/invoices/{uuid.uuid4().hex[:8]}_{file.filename}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+    """מקבל קובץ PDF/תמונה של חשבונית, שומר אותו (פעם אחת לכל תוכן) ומחזיר נתונים ראשוניים"""
+    if file.size is not None and file.size > INVOICE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"הקובץ חורג מהגודל המותר ({INVOICE_MAX_BYTES // (1024 * 1024)}MB)")
+    try:
+        digest, size, duplicate = await io_work.run(_upload_invoice_blob, file)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
     extracted_data = {
         "id": f"INV-{uuid.uuid4().hex[:6].upper()}",
         "vendor": "ספק לא מזוהה (זיהוי AI)",
@@ -751,92 +2300,278 @@ async def upload_invoice(file: UploadFile = File(...)):
         "category": "כללי למיפוי",
         "subcategory": "אחר",
         "status": "ממתין למיפוי",
-        "file_url": file_path
+        "file_url": INVOICE_BLOB_URL + digest
     }
-    
-    return {"message": "Invoice processed", "extracted_data": extracted_data}
+
+    return {"message": "Invoice processed", "extracted_data": extracted_data,
+            "blob": {"sha256": digest, "size": size, "duplicate": duplicate}}
+
+
+@app.get("/api/finops/blobs/{digest}")
+def get_invoice_blob(digest: str, conn: sqlite3.Connection = Depends(get_read_conn)):
+    """הקובץ עצמו (לתצוגת החשבונית ב-UI). התוכן של blob לא משתנה לעולם - ולכן מטמון immutable"""
+    if not SHA256_HEX.fullmatch(digest):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    row = conn.execute("SELECT content_type FROM invoice_blobs WHERE sha256 = ?", (digest,)).fetchone()
+    path = invoice_blob_path(digest)
+    if row is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return FileResponse(path, media_type=row[0] or "application/octet-stream",
+                        headers={"ETag": f'"{digest}"', "Cache-Control": "private, max-age=31536000, immutable"})
+
+
+@app.get("/api/finops/invoice/{invoice_id}/blob")
+def get_invoice_blob_info(invoice_id: str, conn: sqlite3.Connection = Depends(get_read_conn)):
+    """מיפוי חשבונית -> blob: hash, גודל, סוג ושם הקובץ המקורי"""
+    row = conn.execute('''SELECT i.file_url, b.sha256, b.size, b.content_type, b.original_name, b.created_at
+                          FROM finops_invoices i
+                          LEFT JOIN invoice_blobs b ON i.file_url = ? || b.sha256
+                          WHERE i.id = ?''', (INVOICE_BLOB_URL, invoice_id)).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    file_url, digest, size, content_type, original_name, created_at = row
+    if digest is None:
+        # חשבונית ישנה (קובץ לפי שם) או חשבונית בלי קובץ
+        return {"invoice_id": invoice_id, "file_url": file_url, "blob": None}
+    return {"invoice_id": invoice_id, "file_url": file_url,
+            "blob": {"sha256": digest, "size": size, "content_type": content_type,
+                     "original_name": original_name, "created_at": created_at}}
+
+
+@app.post("/api/finops/blobs/sweep")
+def sweep_invoice_blobs(conn: sqlite3.Connection = Depends(get_write_conn)):
+    """מוחק blobs שאף finops_invoices.file_url לא מפנה אליהם (אחרי חלון החסד של העלאות שעוד לא נשמרו)"""
+    cutoff = (pd.Timestamp.now() - pd.Timedelta(seconds=INVOICE_BLOB_GRACE_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
+    # קודם השורות (התנאים נבדקים ב-DELETE עצמו, תחת נעילת הכותב) ורק אחרי ה-commit הקבצים:
+    # העלאה חוזרת מחכה לנעילה, ואחריה כבר לא מוצאת את הקובץ וכותבת אותו מחדש
+    orphans = [digest for digest, in conn.execute(
+        '''DELETE FROM invoice_blobs AS b
+           WHERE created_at < ?
+             AND NOT EXISTS (SELECT 1 FROM finops_invoices i WHERE i.file_url = ? || b.sha256)
+           RETURNING sha256''',
+        (cutoff, INVOICE_BLOB_URL)).fetchall()]
+    conn.commit()
+    freed = 0
+    for digest in orphans:
+        path = invoice_blob_path(digest)
+        if os.path.exists(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+    return {"blobs_deleted": len(orphans), "bytes_freed": freed}
 
 @app.post("/api/finops/save_invoice")
-def save_invoice(invoice: dict):
-    conn = sqlite3.connect(DB_PATH)
+def save_invoice(invoice: dict, conn: sqlite3.Connection = Depends(get_write_conn)):
+    # UPSERT ולא INSERT OR REPLACE: עדכון מפעיל את טריגר ה-UPDATE (REPLACE מוחק בלי להפעיל טריגר DELETE)
     c = conn.cursor()
-    try:
-        c.execute('''INSERT OR REPLACE INTO finops_invoices 
-                     (id, vendor, date, due_date, budget_month, amount, category, subcategory, status, note, file_url) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (invoice['id'], invoice['vendor'], invoice['date'], invoice.get('dueDate', ''), 
-                   invoice.get('budgetMonth', ''), invoice['amount'], invoice['category'], 
-                   invoice.get('subcategory', ''), invoice['status'], invoice.get('note', ''), invoice.get('fileUrl', '')))
-        conn.commit()
-        return {"message": "Invoice saved"}
-    finally:
-        conn.close()
+    c.execute('''INSERT INTO finops_invoices 
+                 (id, vendor, date, due_date, budget_month, amount, category, subcategory, status, note, file_url) 
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT(id) DO UPDATE SET
+                     vendor = excluded.vendor, date = excluded.date, due_date = excluded.due_date,
+                     budget_month = excluded.budget_month, amount = excluded.amount, category = excluded.category,
+                     subcategory = excluded.subcategory, status = excluded.status, note = excluded.note,
+                     file_url = excluded.file_url''',
+              (invoice['id'], invoice['vendor'], invoice['date'], invoice.get('dueDate', ''), 
+               invoice.get('budgetMonth', ''), invoice['amount'], invoice['category'], 
+               invoice.get('subcategory', ''), invoice['status'], invoice.get('note', ''), invoice.get('fileUrl', '')))
+    bump_data_version(conn, "finops")
+    conn.commit()
+    return {"message": "Invoice saved"}
 
 @app.delete("/api/finops/invoice/{invoice_id}")
-def delete_invoice(invoice_id: str):
-    conn = sqlite3.connect(DB_PATH)
+def delete_invoice(invoice_id: str, conn: sqlite3.Connection = Depends(get_write_conn)):
     c = conn.cursor()
-    try:
-        c.execute("DELETE FROM finops_invoices WHERE id = ?", (invoice_id,))
-        conn.commit()
-        return {"message": "Deleted"}
-    finally:
-        conn.close()
+    c.execute("DELETE FROM finops_invoices WHERE id = ?", (invoice_id,))
+    bump_data_version(conn, "finops")
+    conn.commit()
+    return {"message": "Deleted"}
 
 @app.post("/api/finops/save_vendor")
-def save_vendor(vendor: dict):
-    conn = sqlite3.connect(DB_PATH)
+def save_vendor(vendor: dict, conn: sqlite3.Connection = Depends(get_write_conn)):
+    # total_paid / active_invoices לא מתקבלים מהלקוח - הטריגרים מחשבים אותם מהחשבוניות
     c = conn.cursor()
     try:
-        c.execute('''INSERT OR REPLACE INTO finops_vendors (id, name, default_category, total_paid, active_invoices)
-                     VALUES (?, ?, ?, ?, ?)''', 
-                  (vendor['id'], vendor['name'], vendor.get('defaultCategory', ''), vendor.get('totalPaid', 0), vendor.get('activeInvoices', 0)))
-        conn.commit()
-        return {"message": "Vendor saved"}
-    finally:
-        conn.close()
+        c.execute('''INSERT INTO finops_vendors (id, name, default_category, total_paid, active_invoices)
+                     VALUES (?, ?, ?, 0, 0)
+                     ON CONFLICT(id) DO UPDATE SET name = excluded.name, default_category = excluded.default_category''',
+                  (vendor['id'], vendor['name'], vendor.get('defaultCategory', '')))
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        raise HTTPException(status_code=409, detail=f"ספק בשם {vendor['name']} כבר קיים")
+    bump_data_version(conn, "finops")
+    conn.commit()
+    return {"message": "Vendor saved"}
+
+
+def _category_values(cat):
+    """השדות שנשמרים לקטגוריה, מנורמלים להשוואה בין מה שבמסד לבין מה שהלקוח שלח"""
+    subcategories = cat.get('subcategories') or []
+    if isinstance(subcategories, str):
+        subcategories = json.loads(subcategories)
+    return (cat['name'], float(cat.get('target') or 0),
+            float(cat.get('previousYearSpend', cat.get('previous_year_spend')) or 0),
+            cat.get('code') or '', cat.get('notes') or '', json.dumps(subcategories))
+
 
 @app.post("/api/finops/save_categories")
-def save_categories(categories: list):
-    conn = sqlite3.connect(DB_PATH)
+def save_categories(payload: dict, conn: sqlite3.Connection = Depends(get_write_conn)):
+    """
+    סנכרון הקטגוריות לפי הפרש: {"categories": [...], "deleted": [{"id", "version"}, ...]}.
+    קטגוריה בלי version חדשה; קיימת מתעדכנת רק אם ה-version שנשלח הוא הנוכחי (נעילה אופטימית),
+    וקטגוריה שלא השתנתה לא נכתבת. קטגוריה שלא נשלחה ולא סומנה כמחוקה נשארת (אולי עורך אחר הוסיף אותה).
+    התנגשות כלשהי -> 409 עם המצב הנוכחי, ושום שינוי לא נשמר.
+    """
+    incoming, deleted = payload.get('categories', []), payload.get('deleted', [])
     c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
     try:
-        c.execute("DELETE FROM finops_categories")
-        for cat in categories:
-            subs = json.dumps(cat.get('subcategories', []))
-            c.execute('''INSERT INTO finops_categories (id, name, target, previous_year_spend, code, notes, subcategories)
-                         VALUES (?, ?, ?, ?, ?, ?, ?)''', 
-                      (cat['id'], cat['name'], cat.get('target', 0), cat.get('previousYearSpend', 0), cat.get('code', ''), cat.get('notes', ''), subs))
-        conn.commit()
-        return {"message": "Categories synced"}
-    finally:
-        conn.close()
+        current = {row["id"]: row for row in _row_cursor(conn).execute("SELECT * FROM finops_categories")}
+        inserts, updates, deletes, renames, conflicts = [], [], [], [], []
+        unchanged = 0
+        for cat in incoming:
+            values, version = _category_values(cat), cat.get('version')
+            existing = current.get(cat['id'])
+            if existing is None:
+                if version is not None:
+                    conflicts.append({"id": cat['id'], "name": cat['name'], "reason": "deleted"})
+                else:
+                    inserts.append((cat['id'], *values))
+            elif version != existing["version"]:
+                conflicts.append({"id": cat['id'], "name": existing["name"], "reason": "modified",
+                                  "version": existing["version"]})
+            elif values == _category_values(dict(existing)):
+                unchanged += 1
+            else:
+                updates.append((*values, cat['id'], version))
+                if values[0] != existing["name"]:
+                    renames.append((values[0], existing["name"]))
+        for item in deleted:
+            existing = current.get(item['id'])
+            if existing is None:
+                continue  # כבר נמחקה - אותו מצב סופי
+            if item.get('version') != existing["version"]:
+                conflicts.append({"id": item['id'], "name": existing["name"], "reason": "modified",
+                                  "version": existing["version"]})
+            else:
+                deletes.append((item['id'], existing["version"]))
+
+        if not conflicts:
+            # מחיקות ועדכונים לפני הוספות - שם שהתפנה יכול לעבור לקטגוריה אחרת באותו סנכרון
+            c.executemany("DELETE FROM finops_categories WHERE id = ? AND version = ?", deletes)
+            c.executemany('''UPDATE finops_categories SET name = ?, target = ?, previous_year_spend = ?, code = ?,
+                                    notes = ?, subcategories = ?, version = version + 1
+                             WHERE id = ? AND version = ?''', updates)
+            c.executemany('''INSERT INTO finops_categories (id, name, target, previous_year_spend, code, notes, subcategories)
+                             VALUES (?, ?, ?, ?, ?, ?, ?)''', inserts)
+            # חשבוניות מקושרות לקטגוריה בשם - שינוי שם עובר אליהן, אחרת ההוצאה שלהן "נעלמת" מהסיכום
+            c.executemany("UPDATE finops_invoices SET category = ? WHERE category = ?", renames)
+            if deletes or updates or inserts:
+                bump_data_version(conn, "finops")
+            conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        raise HTTPException(status_code=409, detail={"message": f"שם קטגוריה כפול: {e}", "categories": _load_categories(conn)})
+    except Exception:
+        conn.rollback()
+        raise
+
+    if conflicts:
+        conn.rollback()
+        raise HTTPException(status_code=409, detail={"message": "הקטגוריות שונו במקביל", "conflicts": conflicts,
+                                                     "categories": _load_categories(conn)})
+    return {"message": "Categories synced", "inserted": len(inserts), "updated": len(updates),
+            "deleted": len(deletes), "unchanged": unchanged, "categories": _load_categories(conn)}
 
 # ==========================================
 # SECURITY & AUDIT API
 # ==========================================
 
-@app.get("/api/security/audit-logs")
-def get_audit_logs():
-    conn = sqlite3.connect(DB_PATH)
+AUDIT_PAGE_DEFAULT = 500
+AUDIT_PAGE_MAX = 5000
+
+
+def _row_cursor(conn):
+    """Cursor שמחזיר sqlite3.Row - בלי לשנות את row_factory של חיבור משותף מהמאגר"""
+    cur = conn.cursor()
+    cur.row_factory = sqlite3.Row
+    return cur
+
+
+def _audit_row(row):
+    return {"id": row["id"], "timestamp": row["timestamp"], "action": row["action"],
+            "status": row["status"], "details": row["details"], "user": row["user"]}
+
+
+@app.get("/api/security/audit-logs", dependencies=[Depends(versioned("audit"))])
+def get_audit_logs(conn: sqlite3.Connection = Depends(get_read_conn)):
+    """50 האירועים האחרונים (פיד חי לדשבורד האבטחה)"""
     try:
-        logs_df = pd.read_sql("SELECT * FROM audit_logs ORDER BY timestamp DESC LIMIT 50", conn)
-        logs = []
-        for _, row in logs_df.iterrows():
-            time_part = row["timestamp"].split(" ")[1] if " " in str(row["timestamp"]) else row["timestamp"]
-            logs.append({
-                "id": row["id"],
-                "time": time_part,
-                "action": row["action"],
-                "status": row["status"],
-                "details": row["details"],
-                "user": row["user"]
-            })
-        return logs
+        rows = _row_cursor(conn).execute("SELECT * FROM audit_logs ORDER BY timestamp DESC, rowid DESC LIMIT 50").fetchall()
+        return [{**_audit_row(row), "time": row["timestamp"].split(" ")[1] if " " in str(row["timestamp"]) else row["timestamp"]}
+                for row in rows]
     except Exception:
         return []
-    finally:
-        conn.close()
+
+
+def _audit_timestamp(value, name):
+    """פרמטר זמן מהמשתמש ('2026-01-31' או '2026-01-31 08:00') -> פורמט העמודה, שממוין לקסיקוגרפית"""
+    try:
+        return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=f"ערך לא תקין ל-{name}: {value}")
+
+
+@app.get("/api/security/audit-logs/search", dependencies=[Depends(versioned("audit"))])
+def search_audit_logs(start: str = None, end: str = None, action: str = None, user: str = None,
+                      status: str = None, limit: int = AUDIT_PAGE_DEFAULT, cursor: str = None,
+                      conn: sqlite3.Connection = Depends(get_read_conn)):
+    """
+    היסטוריית Audit ל-Compliance: טווח זמן [start, end), סינון לפי פעולה / משתמש / סטטוס,
+    מהחדש לישן. Keyset paging על (timestamp, rowid) - כל עמוד הוא חיפוש באינדקס, לא OFFSET שסורק את כל מה שלפניו.
+    """
+    limit = max(1, min(limit, AUDIT_PAGE_MAX))
+    where, params = [], []
+    if start:
+        where.append("timestamp >= ?")
+        params.append(_audit_timestamp(start, "start"))
+    if end:
+        where.append("timestamp < ?")
+        params.append(_audit_timestamp(end, "end"))
+    for column, value in (("action", action), ("user", user), ("status", status)):
+        if value:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if cursor:
+        timestamp, rowid = decode_cursor(cursor, 2)
+        if not isinstance(timestamp, str) or not isinstance(rowid, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        where.append("(timestamp, rowid) < (?, ?)")
+        params.extend([timestamp, rowid])
+
+    sql = "SELECT rowid, * FROM audit_logs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp DESC, rowid DESC LIMIT ?"
+    rows = _row_cursor(conn).execute(sql, (*params, limit + 1)).fetchall()
+
+    page = rows[:limit]
+    next_cursor = encode_cursor([page[-1]["timestamp"], page[-1]["rowid"]]) if len(rows) > limit else None
+    return {"items": [_audit_row(row) for row in page], "count": len(page), "next_cursor": next_cursor}
+
+
+def _audit_scrub(stats, documents=1):
+    items_scrubbed = sum(stats.values())
+    if items_scrubbed > 0:
+        details = pii.default_scrubber.describe(stats)
+        if documents > 1:
+            details += f" ב-{documents} מסמכים"
+        log_audit_action("Data Scrubbing (PII)", "Success", details, "System Auto")
+    return items_scrubbed
+
+
+def _scrub_and_audit(raw_text):
+    safe_text, stats = PIIScrubber.scrub_text_for_ai(raw_text)
+    return safe_text, _audit_scrub(stats)
 
 
 @app.post("/api/ai/analyze-cv")
@@ -844,12 +2579,7 @@ async def analyze_cv_safely(request: Request):
     candidate_text = await request.json()
     raw_text = candidate_text.get("text", "")
 
-    safe_text, stats = PIIScrubber.scrub_text_for_ai(raw_text)
-
-    items_scrubbed = stats.get('id_cards', 0) + stats.get('phones', 0) + stats.get('emails', 0)
-    if items_scrubbed > 0:
-        details = f"צונזרו {stats['id_cards']} ת.ז, {stats['phones']} טלפונים, {stats['emails']} אימיילים"
-        log_audit_action("Data Scrubbing (PII)", "Success", details, "System Auto")
+    safe_text, items_scrubbed = await io_work.run(_scrub_and_audit, raw_text)
 
     return {
         "status": "success",
@@ -859,9 +2589,71 @@ async def analyze_cv_safely(request: Request):
     }
 
 
+# גודל אצווה מקסימלי לבקשה אחת; מעבר לזה הלקוח מפצל
+SCRUB_BATCH_MAX = int(os.getenv("PHOENIX_SCRUB_BATCH_MAX", "20000"))
+
+
+@app.post("/api/ai/scrub-batch")
+async def scrub_cv_batch(request: Request):
+    """צנזור אלפי קורות חיים בבקשה אחת - הרשימה מחולקת לפרוסות שרצות במקביל במאגר ה-CPU"""
+    body = await request.json()
+    texts = [t or "" for t in body.get("texts", [])]
+    if len(texts) > SCRUB_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"עד {SCRUB_BATCH_MAX} מסמכים בבקשה")
+
+    size = max(1, -(-len(texts) // CPU_WORKERS))
+    slices = [texts[i:i + size] for i in range(0, len(texts), size)]
+    results = await asyncio.gather(*(cpu_work.run(pii.scrub_batch, part) for part in slices))
+
+    totals = pii.default_scrubber.empty_stats()
+    items = []
+    for scrubbed, stats in itertools.chain.from_iterable(results):
+        for key, count in stats.items():
+            totals[key] += count
+        items.append({"scrubbed_text": scrubbed, "items_secured": sum(stats.values())})
+
+    _audit_scrub(totals, len(texts))
+    return {"status": "success", "count": len(items), "stats": totals, "results": items}
+
+
+# הפלט נצבר בזיכרון עד הגודל הזה ומעבר לו נשפך לקובץ זמני
+SCRUB_STREAM_SPOOL = 8 * 1024 * 1024
+
+
+def _scrub_chunk(stream, spool, text, final=False):
+    out = stream.finish(text) if final else stream.feed(text)
+    spool.write(out.encode("utf-8"))
+
+
+@app.post("/api/ai/scrub-stream")
+async def scrub_cv_stream(request: Request):
+    """
+    צנזור מסמך גדול בזרימה: גוף הבקשה (UTF-8) מצונזר במקטעים תוך כדי קריאה, בלי לטעון את כולו לזיכרון.
+    הפלט נצבר ב-SpooledTemporaryFile ומוחזר אחרי שהגוף נקרא (קריאת הגוף מתוך StreamingResponse מתחרה על receive)
+    """
+    stream = pii.default_scrubber.stream()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    spool = tempfile.SpooledTemporaryFile(max_size=SCRUB_STREAM_SPOOL)
+    try:
+        async for chunk in request.stream():
+            await io_work.run(_scrub_chunk, stream, spool, decoder.decode(chunk))
+        await io_work.run(_scrub_chunk, stream, spool, decoder.decode(b"", final=True), True)
+        _audit_scrub(stream.stats)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+
+    def body():
+        with spool:
+            yield from iter(lambda: spool.read(1024 * 1024), b"")
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8",
+                             headers={"X-PII-Items-Secured": str(sum(stream.stats.values()))})
+
+
 @app.get("/api/security/status")
-def get_security_status():
-    conn = sqlite3.connect(DB_PATH)
+def get_security_status(conn: sqlite3.Connection = Depends(get_read_conn)):
     try:
         c = conn.cursor()
         c.execute("SELECT value FROM system_settings WHERE key = 'ai_enabled'")
@@ -870,40 +2662,36 @@ def get_security_status():
         return {"ai_enabled": is_enabled}
     except Exception:
         return {"ai_enabled": False}
-    finally:
-        conn.close()
 
 
-@app.post("/api/security/toggle-ai")
-async def toggle_ai_status(request: Request):
-    payload = await request.json()
-    new_status = 'true' if payload.get('enable', False) else 'false'
-    conn = sqlite3.connect(DB_PATH)
-    try:
+def _set_ai_status(new_status):
+    with db_pool.writer() as conn:
         c = conn.cursor()
         c.execute("UPDATE system_settings SET value = ? WHERE key = 'ai_enabled'", (new_status,))
         conn.commit()
 
         action_desc = "הפעלת מנוע AI" if new_status == 'true' else "כיבוי חירום למנוע AI (Kill Switch)"
         status_color = "Warning" if new_status == 'true' else "Danger"
-        log_audit_action("שינוי מדיניות אבטחה", status_color, action_desc, "Super Admin")
+        log_audit_action("שינוי מדיניות אבטחה", status_color, action_desc, "Super Admin", conn)
+
 
+@app.post("/api/security/toggle-ai")
+async def toggle_ai_status(request: Request):
+    payload = await request.json()
+    new_status = 'true' if payload.get('enable', False) else 'false'
+    try:
+        await io_work.run(_set_ai_status, new_status)
         return {"status": "success", "ai_enabled": new_status == 'true'}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
         
         # ==========================================
 # 5. DATA QUARANTINE & ETL RULES API
 # ==========================================
-
-# הוסף את השורה הזו לתוך פונקציית init_db() שלך:
-# c.execute('''CREATE TABLE IF NOT EXISTS etl_rules (id TEXT PRIMARY KEY, col_name TEXT, condition TEXT, action TEXT, active BOOLEAN)''')
-
 @app.get("/api/admin/rules")
-def get_etl_rules():
-    conn = sqlite3.connect(DB_PATH)
+def get_etl_rules(conn: sqlite3.Connection = Depends(get_write_conn)):
     try:
         df = pd.read_sql("SELECT * FROM etl_rules", conn)
         # אם הטבלה ריקה, נחזיר את חוקי הבסיס כדיפולט וגם נשמור אותם
@@ -920,12 +2708,9 @@ def get_etl_rules():
         return df.to_dict(orient="records")
     except Exception as e:
         return []
-    finally:
-        conn.close()
 
 @app.post("/api/admin/rules")
-def save_etl_rule(rule: dict):
-    conn = sqlite3.connect(DB_PATH)
+def save_etl_rule(rule: dict, conn: sqlite3.Connection = Depends(get_write_conn)):
     try:
         c = conn.cursor()
         rule_id = rule.get('id', f"r-{uuid.uuid4().hex[:6]}")
@@ -933,23 +2718,19 @@ def save_etl_rule(rule: dict):
         c.execute('''INSERT OR REPLACE INTO etl_rules (id, col_name, condition, action, active) 
                      VALUES (?, ?, ?, ?, ?)''', 
                   (rule_id, rule['col_name'], rule['condition'], rule['action'], rule.get('active', True)))
+        bump_data_version(conn, "ats")
         conn.commit()
         return {"status": "success", "id": rule_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        conn.close()
 
 @app.delete("/api/admin/rules/{rule_id}")
-def delete_etl_rule(rule_id: str):
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        c = conn.cursor()
-        c.execute("DELETE FROM etl_rules WHERE id = ?", (rule_id,))
-        conn.commit()
-        return {"status": "success"}
-    finally:
-        conn.close()
+def delete_etl_rule(rule_id: str, conn: sqlite3.Connection = Depends(get_write_conn)):
+    c = conn.cursor()
+    c.execute("DELETE FROM etl_rules WHERE id = ?", (rule_id,))
+    bump_data_version(conn, "ats")
+    conn.commit()
+    return {"status": "success"}
 
 
 # ==========================================
@@ -983,8 +2764,7 @@ def get_inbox_analytics():
     # ==========================================
 # 7. TOOLBOX API (Real Actions: PDF & Fan-out)
 # ==========================================
-from fastapi.responses import FileResponse
-from fpdf import FPDF # <-- חובה להתקין: pip install fpdf2
+import pdf_render
 import smtplib
 from email.message import EmailMessage
 
@@ -1010,6 +2790,93 @@ async def trigger_onboarding_fan_out(payload: dict):
     return {"status": "success", "message": f"Fan-out completed for {emp_name}", "tickets": tickets}
 
 
+# --- שירות רינדור PDF: בזיכרון, בתהליכי ה-CPU, עם מטמון תוצאות ---
+# גבולות המטמון (מסמך הצעה טיפוסי ~2KB, דוח ~1.5KB)
+PDF_CACHE_ENTRIES = int(os.getenv("PHOENIX_PDF_CACHE_ENTRIES", "256"))
+PDF_CACHE_BYTES = int(os.getenv("PHOENIX_PDF_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+
+class RenderCache:
+    """
+    מטמון LRU של PDF-ים מוכנים לפי hash של התוכן (כולל גרסת הנתונים שהמסמך נשען עליה).
+    בקשות זהות שמגיעות בזמן רינדור ממתינות לאותו רינדור (single-flight).
+    כל הגישה היא מתוך ה-event loop, ולכן בלי מנעולים.
+    """
+    def __init__(self, max_entries=PDF_CACHE_ENTRIES, max_bytes=PDF_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def get_or_render(self, key, produce):
+        """produce - coroutine function שמחזירה את ה-bytes; נקראת רק בהחטאה"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            content = await produce()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # מסומנת כנקראה גם אם אף אחד לא המתין
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(content)
+        self._store(key, content)
+        return content
+
+    def _store(self, key, content):
+        self._entries[key] = content
+        self._bytes += len(content)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+
+pdf_cache = RenderCache()
+
+
+def _pdf_response(content, filename):
+    return Response(content=content, media_type="application/pdf",
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@app.on_event("startup")
+def sweep_legacy_pdf_files():
+    """גרסאות קודמות שמרו כל PDF בתיקיית העבודה ולא מחקו אותו - ניקוי חד-פעמי של השאריות"""
+    for name in os.listdir(os.getcwd()):
+        if re.fullmatch(r"(report_|Phoenix_Offer_)[0-9a-f]{6}\.pdf", name):
+            try:
+                os.remove(os.path.join(os.getcwd(), name))
+            except OSError:
+                pass
+
+
+def _report_version():
+    with db_pool.reader() as conn:
+        return get_data_version(conn, "ats")
+
+
+def _report_counts():
+    with db_pool.reader() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM applications WHERE (status_class & ?) > 0", (STATUS_HIRED,))
+        hires_count = c.fetchone()[0]
+        c.execute("SELECT COUNT(*) FROM applications WHERE days_in_process > 40")
+        sla_breaches = c.fetchone()[0]
+    return hires_count, sla_breaches
+
+
 @app.post("/api/tools/generate-report")
 async def generate_pdf_report(payload: dict):
     """
@@ -1017,47 +2884,19 @@ async def generate_pdf_report(payload: dict):
     הערה: נדרשת התקנת הספריה fpdf2 בשרת.
     """
     report_type = payload.get("type", "weekly_hiring")
-    
-    # 1. שאיבת נתונים אמיתיים ממסד הנתונים כדי לשים בדוח
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM applications WHERE status LIKE '%קליטה%' OR status LIKE '%גיוס%'")
-        hires_count = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM applications WHERE days_in_process > 40")
-        sla_breaches = c.fetchone()[0]
-    finally:
-        conn.close()
 
-    # 2. יצירת ה-PDF (פשוט אך פונקציונלי)
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # הערה: עברית ב-FPDF דורשת פונט מתאים. לשם הדגמה מהירה שעובדת מיד, נייצר דוח באנגלית.
-    pdf.set_font("helvetica", "B", 16)
-    pdf.cell(0, 10, "TAHub Executive Summary", ln=True, align="C")
-    pdf.set_font("helvetica", "I", 10)
-    pdf.cell(0, 10, f"Generated on: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M')}", ln=True, align="C")
-    
-    pdf.ln(10)
-    pdf.set_font("helvetica", "B", 12)
-    pdf.cell(0, 10, f"Report Type: {report_type.replace('_', ' ').title()}", ln=True)
-    
-    pdf.ln(5)
-    pdf.set_font("helvetica", "", 12)
-    pdf.cell(0, 10, f"Total Hires Processed: {hires_count}", ln=True)
-    pdf.cell(0, 10, f"SLA Breaches Detected: {sla_breaches}", ln=True)
-    
-    pdf.ln(10)
-    pdf.multi_cell(0, 10, "AI Insight: Recruitment volume remains steady. It is recommended to review the SLA breaches to identify bottlenecks in specific departments.")
-    
-    # שמירת הקובץ באופן זמני
-    filename = f"report_{uuid.uuid4().hex[:6]}.pdf"
-    file_path = os.path.join(os.getcwd(), filename)
-    pdf.output(file_path)
-    
-    # החזרת הקובץ פיזית לדפדפן כדי שהמשתמש יוכל להוריד
-    return FileResponse(path=file_path, filename="TAHub_Report.pdf", media_type="application/pdf")
+    # 1. דוח זהה על אותה גרסת נתונים מוגש מהמטמון - בלי שאילתות ובלי רינדור.
+    # "Generated on" מודפס בדוח, לכן הדקה היא חלק מהמפתח (כמו יום ההנפקה במכתב ההצעה)
+    generated_at = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M')
+    key = RenderCache.key("report", report_type, await io_work.run(_report_version), generated_at)
+
+    async def render():
+        hires_count, sla_breaches = await io_work.run(_report_counts)
+        # 2. יצירת ה-PDF בזיכרון בתהליך נפרד (pdf_render) והחזרתו ישירות לדפדפן
+        return await cpu_work.run(pdf_render.render_report_pdf, report_type, hires_count, sla_breaches, generated_at)
+
+    content = await pdf_cache.get_or_render(key, render)
+    return _pdf_response(content, "TAHub_Report.pdf")
 
 @app.post("/api/tools/generate-offer-pdf")
 async def generate_offer_pdf(request: Request):
@@ -1066,96 +2905,106 @@ async def generate_offer_pdf(request: Request):
     משמיט לחלוטין עלויות מעסיק ועמלות חברת השמה.
     """
     payload = await request.json()
-    candidate_name = payload.get("candidateName", "Candidate")
-    is_comparative = payload.get("isComparative", False)
-    proposed = payload.get("proposed", {})
-    current = payload.get("current", {})
-    
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Header - Phoenix Branding
-    pdf.set_fill_color(0, 38, 73) # Phoenix Navy Blue #002649
-    pdf.rect(0, 0, 210, 30, 'F')
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("helvetica", "B", 18)
-    pdf.set_y(10)
-    pdf.cell(0, 10, "Total Rewards & Compensation Offer", ln=True, align="C")
-    
-    # Reset colors for body
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(15)
-    
-    pdf.set_font("helvetica", "B", 14)
-    pdf.cell(0, 10, f"Prepared for: {candidate_name}", ln=True)
-    pdf.set_font("helvetica", "", 10)
-    pdf.cell(0, 5, f"Date: {pd.Timestamp.now().strftime('%d/%m/%Y')}", ln=True)
-    pdf.ln(10)
-
-    # ---------------------------------------------------------
-    # MAIN OFFER HIGHLIGHT (Total Value)
-    # ---------------------------------------------------------
-    pdf.set_font("helvetica", "B", 14)
-    pdf.set_text_color(239, 107, 0) # Phoenix Orange #EF6B00
-    total_val = proposed.get("totalPackageValue", 0)
-    pdf.cell(0, 10, f"Total Monthly Package Value: {total_val:,.0f} ILS", ln=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(5)
-
-    # ---------------------------------------------------------
-    # DETAILS TABLE
-    # ---------------------------------------------------------
-    pdf.set_fill_color(240, 245, 250)
-    pdf.set_font("helvetica", "B", 10)
-    
-    # Table Headers
-    pdf.cell(70, 10, "Component", border=1, fill=True)
-    if is_comparative:
-        pdf.cell(60, 10, "Current Package", border=1, align="C", fill=True)
-    pdf.cell(60, 10, "Phoenix Offer", border=1, align="C", fill=True)
-    pdf.ln(10)
-    
-    pdf.set_font("helvetica", "", 10)
-    
-    # Data Rows
-    components = [
-        ("Base Gross Salary", "base"),
-        ("Global Overtime", "global"),
-        ("Meals (Cibus)", "meals"),
-        ("Travel / Car", "travel_car"),
-        ("Keren Hishtalmut (%)", "kh_pct"),
-        ("Pension (%)", "pension_pct")
-    ]
-    
-    for label, key in components:
-        pdf.cell(70, 10, label, border=1)
-        if is_comparative:
-            curr_val = current.get(key, "-")
-            pdf.cell(60, 10, f"{curr_val}", border=1, align="C")
-        
-        prop_val = proposed.get(key, "-")
-        pdf.cell(60, 10, f"{prop_val}", border=1, align="C")
-        pdf.ln(10)
-
-    # ---------------------------------------------------------
-    # DISCLAIMER (Legal text requested)
-    # ---------------------------------------------------------
-    pdf.ln(20)
-    pdf.set_font("helvetica", "I", 8)
-    pdf.set_text_color(100, 100, 100)
-    disclaimer = (
-        "Disclaimer: This document is an offer proposal only and holds no legal binding validity. "
-        "It is valid for 30 days from the date of issue. This simulation does not constitute an "
-        "employer-employee relationship agreement. Final terms will be defined strictly by the "
-        "official employment contract."
-    )
-    pdf.multi_cell(0, 5, disclaimer)
-
-    filename = f"Phoenix_Offer_{uuid.uuid4().hex[:6]}.pdf"
-    file_path = os.path.join(os.getcwd(), filename)
-    pdf.output(file_path)
-    
-    return FileResponse(path=file_path, filename=filename, media_type="application/pdf")
+    issued_on = pd.Timestamp.now().strftime('%d/%m/%Y')
+
+    key = RenderCache.key("offer", payload, issued_on)
+    content = await pdf_cache.get_or_render(
+        key, lambda: cpu_work.run(pdf_render.render_offer_pdf, payload, issued_on))
+    return _pdf_response(content, f"Phoenix_Offer_{key[:6]}.pdf")
+
+
+# --- הצעות שכר באצווה (קמפייני גיוס למוקדים): ZIP שמוזרם תוך כדי רינדור ---
+OFFER_BATCH_MAX = int(os.getenv("PHOENIX_OFFER_BATCH_MAX", "2000"))
+OFFER_BATCH_SLICE = 16  # מסמכים למשימה אחת בתהליך עבודה
+
+
+class _ZipStreamSink(io.RawIOBase):
+    """יעד כתיבה לא-seekable ל-zipfile: הבתים נאספים עד ה-drain הבא ונשלחים ללקוח, כך שהארכיון לא נשמר בזיכרון"""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _offer_filename(index, payload):
+    name = re.sub(r'[\\/:*?"<>|\s]+', "_", str(payload.get("candidateName", "Candidate"))).strip("_") or "Candidate"
+    return f"{index + 1:04d}_{name[:60]}.pdf"
+
+
+async def _render_offer_slices(offers, issued_on):
+    """מנות של OFFER_BATCH_SLICE מסמכים, עד CPU_WORKERS מנות במקביל; כל מנה מוחזרת ברגע שהסתיימה"""
+    slices = iter(range(0, len(offers), OFFER_BATCH_SLICE))
+    pending = set()
+
+    def launch():
+        start = next(slices, None)
+        if start is not None:
+            pending.add(asyncio.ensure_future(cpu_work.run_queued(
+                pdf_render.render_offer_batch, offers[start:start + OFFER_BATCH_SLICE], issued_on, start)))
+
+    for _ in range(CPU_WORKERS):
+        launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                launch()
+                yield task.result()
+    finally:
+        # הלקוח התנתק באמצע - מנות שעוד לא רצו לא נשלחות לרינדור
+        for task in pending:
+            task.cancel()
+
+
+@app.post("/api/tools/generate-offer-pdf/batch")
+async def generate_offer_pdf_batch(payload: dict):
+    """
+    הצעות שכר לרשימת מועמדים (כל פריט באותו מבנה של generate-offer-pdf) כ-ZIP אחד.
+    המסמכים נכנסים לארכיון לפי סדר סיום הרינדור, ו-manifest.json בסוף מפרט לכל פריט קובץ או שגיאה.
+    """
+    offers = payload.get("offers", [])
+    if not isinstance(offers, list) or not offers:
+        raise HTTPException(status_code=400, detail="נדרשת רשימת offers")
+    if len(offers) > OFFER_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"עד {OFFER_BATCH_MAX} הצעות בבקשה")
+    issued_on = pd.Timestamp.now().strftime('%d/%m/%Y')
+
+    async def archive():
+        sink = _ZipStreamSink()
+        manifest = [None] * len(offers)
+        # PDF כבר דחוס פנימית - STORED חוסך CPU על ה-event loop בלי לוותר על גודל
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+            async for results in _render_offer_slices(offers, issued_on):
+                for index, content, error in results:
+                    item = offers[index] if isinstance(offers[index], dict) else {}
+                    entry = {"index": index, "candidateName": item.get("candidateName"), "status": "ok" if error is None else "error"}
+                    if error is None:
+                        entry["file"] = _offer_filename(index, item)
+                        zf.writestr(entry["file"], content)
+                    else:
+                        entry["error"] = error
+                    manifest[index] = entry
+                yield sink.drain()
+            zf.writestr("manifest.json", json.dumps({"issued_on": issued_on, "count": len(offers),
+                                                     "errors": sum(e["status"] == "error" for e in manifest),
+                                                     "items": manifest}, ensure_ascii=False, indent=2))
+        yield sink.drain()
+        failed = sum(e["status"] == "error" for e in manifest)
+        log_audit_action("Bulk Offer Letters", "Success" if not failed else "Partial",
+                         f"הופקו {len(offers) - failed} הצעות שכר ב-ZIP ({failed} שגיאות)", "Recruiter")
+
+    return StreamingResponse(archive(), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="Phoenix_Offers_{issued_on.replace("/", "-")}.zip"'})
 
 # ==========================================
 # 8. PRE-BOARDING & ONBOARDING API
@@ -1164,20 +3013,9 @@ async def generate_offer_pdf(request: Request):
 from fastapi import UploadFile, File, Form
 import json
 
-@app.post("/api/onboarding")
-async def create_onboarding(payload: dict):
-    """
-    מקבל את כל המידע מה-Wizard (כולל הצ'קליסט, הזכאויות והניתובים).
-    שומר את הרשומה במסד הנתונים כ'ממתין לקליטה'.
-    """
-    conn = sqlite3.connect(DB_PATH)
-    try:
+def _save_onboarding_wizard(ob_id, full_name, payload):
+    with db_pool.writer() as conn:
         c = conn.cursor()
-        ob_id = f"ob-{uuid.uuid4().hex[:6]}"
-        
-        # שמירת נתוני מועמד בסיסיים שיוצגו בטבלה
-        full_name = f"{payload.get('firstName', '')} {payload.get('lastName', '')}"
-        
         c.execute('''INSERT INTO onboarding 
                      (id, name, id_num, role, department, manager, start_date, base_salary, global_salary, parking, car_num, referral_name, referral_id, diversity, status, created_at)
                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
@@ -1186,54 +3024,57 @@ async def create_onboarding(payload: dict):
                    payload.get('parkingType') != 'לא', payload.get('carNum', ''), payload.get('refName', ''), 
                    payload.get('refEmpNum', ''), payload.get('hasDisability') and 'מוגבלות' or '', 'pending', pd.Timestamp.now().isoformat()))
         conn.commit()
-        
+
         # כאן השרת בפרודקשן שולח את המיילים האמיתיים לנמענים (HRO, לוגיסטיקה וכו')
-        log_audit_action("Onboarding Wizard", "Success", f"קליטה מקיפה שוגרה עבור {full_name}", "Recruiter")
-        
-        return {"status": "success", "id": ob_id, "message": "Onboarding wizard completed"}
-    finally:
-        conn.close()
+        log_audit_action("Onboarding Wizard", "Success", f"קליטה מקיפה שוגרה עבור {full_name}", "Recruiter", conn)
+
+
+@app.post("/api/onboarding")
+async def create_onboarding(payload: dict):
+    """
+    מקבל את כל המידע מה-Wizard (כולל הצ'קליסט, הזכאויות והניתובים).
+    שומר את הרשומה במסד הנתונים כ'ממתין לקליטה'.
+    """
+    ob_id = f"ob-{uuid.uuid4().hex[:6]}"
+    
+    # שמירת נתוני מועמד בסיסיים שיוצגו בטבלה
+    full_name = f"{payload.get('firstName', '')} {payload.get('lastName', '')}"
+    await io_work.run(_save_onboarding_wizard, ob_id, full_name, payload)
+    
+    return {"status": "success", "id": ob_id, "message": "Onboarding wizard completed"}
 
 @app.post("/api/onboarding")
-def create_onboarding(payload: dict):
+def create_onboarding(payload: dict, conn: sqlite3.Connection = Depends(get_write_conn)):
     """יצירת טופס קליטה חדש - שולח 'מיילים' (לוגים) לקב"ט ו-HRO"""
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        c = conn.cursor()
-        ob_id = f"ob-{uuid.uuid4().hex[:6]}"
-        c.execute('''INSERT INTO onboarding 
-                     (id, name, id_num, role, department, manager, start_date, base_salary, global_salary, parking, car_num, referral_name, referral_id, diversity, status, created_at)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (ob_id, payload.get('name'), payload.get('id_num'), payload.get('role'), payload.get('department'),
-                   payload.get('manager'), payload.get('start_date'), payload.get('base_salary', 0), payload.get('global_salary', 0),
-                   payload.get('parking', False), payload.get('car_num', ''), payload.get('referral_name', ''), 
-                   payload.get('referral_id', ''), payload.get('diversity', ''), 'pending', pd.Timestamp.now().isoformat()))
-        conn.commit()
-        return {"status": "success", "id": ob_id, "message": "Onboarding created and Fan-out triggered"}
-    finally:
-        conn.close()
+    c = conn.cursor()
+    ob_id = f"ob-{uuid.uuid4().hex[:6]}"
+    c.execute('''INSERT INTO onboarding 
+                 (id, name, id_num, role, department, manager, start_date, base_salary, global_salary, parking, car_num, referral_name, referral_id, diversity, status, created_at)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+              (ob_id, payload.get('name'), payload.get('id_num'), payload.get('role'), payload.get('department'),
+               payload.get('manager'), payload.get('start_date'), payload.get('base_salary', 0), payload.get('global_salary', 0),
+               payload.get('parking', False), payload.get('car_num', ''), payload.get('referral_name', ''), 
+               payload.get('referral_id', ''), payload.get('diversity', ''), 'pending', pd.Timestamp.now().isoformat()))
+    conn.commit()
+    return {"status": "success", "id": ob_id, "message": "Onboarding created and Fan-out triggered"}
 
 @app.put("/api/onboarding/{ob_id}")
-def update_onboarding(ob_id: str, payload: dict):
+def update_onboarding(ob_id: str, payload: dict, conn: sqlite3.Connection = Depends(get_write_conn)):
     """עריכת טופס קליטה קיים או שינוי סטטוס (ביטול / הושלם לארכיון)"""
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        c = conn.cursor()
-        
-        # אם נשלח רק עדכון סטטוס (למשל ביטול)
-        if 'status_only' in payload:
-            c.execute("UPDATE onboarding SET status = ? WHERE id = ?", (payload['status'], ob_id))
-        else:
-            c.execute('''UPDATE onboarding SET 
-                         name=?, id_num=?, role=?, department=?, manager=?, start_date=?, 
-                         base_salary=?, global_salary=?, parking=?, car_num=?, 
-                         referral_name=?, referral_id=?, diversity=?
-                         WHERE id=?''',
-                      (payload.get('name'), payload.get('id_num'), payload.get('role'), payload.get('department'),
-                       payload.get('manager'), payload.get('start_date'), payload.get('base_salary'), payload.get('global_salary'),
-                       payload.get('parking'), payload.get('car_num'), payload.get('referral_name'), 
-                       payload.get('referral_id'), payload.get('diversity'), ob_id))
-        conn.commit()
-        return {"status": "success"}
-    finally:
-        conn.close()
\ No newline at end of file
+    c = conn.cursor()
+    
+    # אם נשלח רק עדכון סטטוס (למשל ביטול)
+    if 'status_only' in payload:
+        c.execute("UPDATE onboarding SET status = ? WHERE id = ?", (payload['status'], ob_id))
+    else:
+        c.execute('''UPDATE onboarding SET 
+                     name=?, id_num=?, role=?, department=?, manager=?, start_date=?, 
+                     base_salary=?, global_salary=?, parking=?, car_num=?, 
+                     referral_name=?, referral_id=?, diversity=?
+                     WHERE id=?''',
+                  (payload.get('name'), payload.get('id_num'), payload.get('role'), payload.get('department'),
+                   payload.get('manager'), payload.get('start_date'), payload.get('base_salary'), payload.get('global_salary'),
+                   payload.get('parking'), payload.get('car_num'), payload.get('referral_name'), 
+                   payload.get('referral_id'), payload.get('diversity'), ob_id))
+    conn.commit()
+    return {"status": "success"}
\ No newline at end of file
@@ -0,0 +1,121 @@
+# masking.py
+# מיסוך עמודות רגישות (ת.ז, טלפון, כתובת) בקליטה: hash מפתחי (BLAKE2b keyed) במקום הערך הגולמי.
+# אותו ערך + אותו מפתח => אותו טוקן, כך שאפשר לחבר בין קליטות בלי לשמור את המזהה עצמו.
+# המודול לא מייבא את main, כדי שתהליכי העבודה של מאגר ה-CPU יטענו רק אותו.
+import functools
+import hashlib
+import itertools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# החלפת המפתח שוברת את ההתאמה מול טוקנים שכבר נשמרו.
+# בלי PHOENIX_MASK_KEY אין מפתח והמיסוך נכשל (fail closed): מפתח הפיתוח נמצא ב-repo, ומרחב הערכים
+# של ת.ז וטלפון קטן מספיק כדי לחשב את כולם ולשחזר את הטוקנים. הוא זמין רק עם PHOENIX_ALLOW_DEV_MASK_KEY=1.
+DEV_MASK_KEY = b"phoenix-dev-mask-key"
+
+
+def _configured_key():
+    key = os.getenv("PHOENIX_MASK_KEY")
+    if key:
+        return key.encode()
+    if os.getenv("PHOENIX_ALLOW_DEV_MASK_KEY") == "1":
+        return DEV_MASK_KEY
+    return None
+
+
+MASK_KEY = _configured_key()
+MASK_SALT = b"phoenix-pii-v1"
+TOKEN_BYTES = 8
+
+# מעבר לכמות הזו של ערכים ייחודיים (בכל העמודות יחד) ה-hash מתחלק למנות שרצות במאגר תהליכים
+PARALLEL_MASK_MIN = 100_000
+MASK_BATCH_SIZE = 50_000
+
+SENSITIVE_KEYWORDS = ('ת.ז', 'ת"ז', 'תעודת זהות', 'מספר זהות', 'טלפון', 'נייד', 'כתובת', 'phone', 'mobile', 'address')
+# "id" רק כמילה שלמה ("ID", "candidate id") - לא job_id, valid וכו'
+SENSITIVE_TOKENS = re.compile(r"(?<![a-z0-9_])id(?![a-z0-9_])")
+EMPTY_VALUES = ('', 'nan', 'none', 'nat', '<na>')
+
+
+class MaskKeyMissing(RuntimeError):
+    """אין מפתח מיסוך - אסור לקלוט נתונים רגישים"""
+
+
+def require_key(key=None):
+    key = MASK_KEY if key is None else key
+    if not key:
+        raise MaskKeyMissing("PHOENIX_MASK_KEY is not set (PHOENIX_ALLOW_DEV_MASK_KEY=1 enables the dev key)")
+    return key
+
+
+def is_sensitive_column(name):
+    col = str(name).strip().lower()
+    return any(keyword in col for keyword in SENSITIVE_KEYWORDS) or bool(SENSITIVE_TOKENS.search(col))
+
+
+@functools.lru_cache(maxsize=64)
+def sensitive_columns(columns):
+    """זיהוי פעם אחת לכל סכמת קובץ (tuple של שמות העמודות) - המקטעים הבאים מקבלים את התוצאה מה-cache"""
+    return tuple(col for col in columns if is_sensitive_column(col))
+
+
+def mask_values(values, key=None):
+    """טוקן לכל ערך: 16 תווי hex של BLAKE2b עם מפתח ו-salt (MAC תקני, זול יותר מ-HMAC-SHA256)"""
+    key = require_key(key)
+    # האתחול עם המפתח נעשה פעם אחת; כל ערך מתחיל מעותק של המצב
+    base = hashlib.blake2b(digest_size=TOKEN_BYTES, key=key, salt=MASK_SALT)
+    tokens = []
+    for value in values:
+        digest = base.copy()
+        digest.update(value.encode())
+        tokens.append(digest.hexdigest())
+    return tokens
+
+
+def _unique_values(series):
+    """
+    קודים + ערכים ייחודיים אחרי נורמליזציה; ריק/NaN מקבל קוד -1.
+    הנורמליזציה (str, strip) רצה על הערכים הייחודיים בלבד ולא על כל העמודה.
+    """
+    if series.dtype.kind == 'f':
+        # ת.ז שנקרא כ-float בגלל תאים ריקים: 123456782.0 -> 123456782
+        try:
+            series = series.astype('Int64')
+        except (TypeError, ValueError):
+            pass
+    codes, raw = pd.factorize(series)
+    text = pd.Series(raw).astype(str).str.strip()
+    norm_codes, uniques = pd.factorize(text.mask(text.str.lower().isin(EMPTY_VALUES)))
+    return np.append(norm_codes, -1)[codes], uniques
+
+
+def mask_frame(df, key=None, executor=None):
+    """
+    ממסך את כל העמודות הרגישות ב-df (במקום) ומחזיר את רשימתן.
+    כל ערך ייחודי עובר hash פעם אחת והתוצאה מופצת חזרה לכל השורות; ריקים נשארים None.
+    עם executor (מאגר תהליכים) ומספיק ערכים - המנות רצות במקביל.
+    בלי מפתח מוגדר זורק MaskKeyMissing, גם כשאין עמודות רגישות - קליטה לא רצה בלי מפתח.
+    """
+    key = require_key(key)
+    columns = sensitive_columns(tuple(df.columns))
+    if not columns:
+        return []
+
+    factorized = [_unique_values(df[col]) for col in columns]
+    uniques = list(itertools.chain.from_iterable(u.tolist() for _, u in factorized))
+    if executor is not None and len(uniques) >= PARALLEL_MASK_MIN:
+        batches = [uniques[i:i + MASK_BATCH_SIZE] for i in range(0, len(uniques), MASK_BATCH_SIZE)]
+        tokens = list(itertools.chain.from_iterable(executor.map(mask_values, batches, itertools.repeat(key))))
+    else:
+        tokens = mask_values(uniques, key)
+
+    # None בסוף: קוד -1 (ריק) נופל עליו
+    offset = 0
+    for col, (codes, col_uniques) in zip(columns, factorized):
+        lookup = np.asarray(tokens[offset:offset + len(col_uniques)] + [None], dtype=object)
+        df[col] = lookup[codes]
+        offset += len(col_uniques)
+    return list(columns)
@@ -0,0 +1,171 @@
+# pdf_render.py
+# רינדור PDF (fpdf2) - פונקציות טהורות שרצות בתהליכי העבודה של מאגר ה-CPU ומחזירות bytes (בלי קבצים על הדיסק).
+# המודול לא מייבא את main, כך שתהליך עבודה חדש טוען רק את fpdf ולא את כל השרת.
+import copy
+from datetime import datetime
+
+from fpdf import FPDF  # <-- חובה להתקין: pip install fpdf2
+
+OFFER_COMPONENTS = [
+    ("Base Gross Salary", "base"),
+    ("Global Overtime", "global"),
+    ("Meals (Cibus)", "meals"),
+    ("Travel / Car", "travel_car"),
+    ("Keren Hishtalmut (%)", "kh_pct"),
+    ("Pension (%)", "pension_pct")
+]
+
+OFFER_DISCLAIMER = (
+    "Disclaimer: This document is an offer proposal only and holds no legal binding validity. "
+    "It is valid for 30 days from the date of issue. This simulation does not constitute an "
+    "employer-employee relationship agreement. Final terms will be defined strictly by the "
+    "official employment contract."
+)
+
+REPORT_INSIGHT = ("AI Insight: Recruitment volume remains steady. It is recommended to review the SLA breaches "
+                  "to identify bottlenecks in specific departments.")
+
+# מיקומי השורות (מ"מ) - זהים לזרימה המקורית של cell/ln, כדי שהתבנית והנתונים ייפגשו באותו מקום
+REPORT_Y = {"generated": 20, "type": 40, "hires": 55, "breaches": 65, "insight": 85}
+OFFER_Y = {"name": 35, "date": 45, "total": 60, "table": 75, "rows": 85, "disclaimer": 165}
+OFFER_LABEL_W, OFFER_VALUE_W, OFFER_ROW_H = 70, 60, 10
+
+# תבניות שנבנו בתהליך הזה: (סוג, וריאנט) -> מסמך FPDF עם כל מה שסטטי כבר מצויר
+_templates = {}
+
+
+def _template(kind, variant, build):
+    """הפריסה הסטטית (מיתוג, מסגרות טבלה, טקסטים קבועים) נבנית פעם אחת לכל תהליך; כל מסמך מתחיל מעותק שלה"""
+    key = (kind, variant)
+    if key not in _templates:
+        _templates[key] = build(variant)
+    pdf = copy.deepcopy(_templates[key])
+    pdf.set_creation_date(datetime.now().astimezone())
+    return pdf
+
+
+def _build_report_template(_variant):
+    pdf = FPDF()
+    pdf.add_page()
+
+    # הערה: עברית ב-FPDF דורשת פונט מתאים. לשם הדגמה מהירה שעובדת מיד, נייצר דוח באנגלית.
+    pdf.set_font("helvetica", "B", 16)
+    pdf.cell(0, 10, "TAHub Executive Summary", ln=True, align="C")
+
+    pdf.set_y(REPORT_Y["insight"])
+    pdf.set_font("helvetica", "", 12)
+    pdf.multi_cell(0, 10, REPORT_INSIGHT)
+    return pdf
+
+
+def render_report_pdf(report_type, hires_count, sla_breaches, generated_at):
+    """דוח מנהלים קצר: מספר קליטות וחריגות SLA"""
+    pdf = _template("report", None, _build_report_template)
+
+    pdf.set_y(REPORT_Y["generated"])
+    pdf.set_font("helvetica", "I", 10)
+    pdf.cell(0, 10, f"Generated on: {generated_at}", ln=True, align="C")
+
+    pdf.set_y(REPORT_Y["type"])
+    pdf.set_font("helvetica", "B", 12)
+    pdf.cell(0, 10, f"Report Type: {report_type.replace('_', ' ').title()}", ln=True)
+
+    pdf.set_y(REPORT_Y["hires"])
+    pdf.set_font("helvetica", "", 12)
+    pdf.cell(0, 10, f"Total Hires Processed: {hires_count}", ln=True)
+    pdf.cell(0, 10, f"SLA Breaches Detected: {sla_breaches}", ln=True)
+
+    return bytes(pdf.output())
+
+
+def _build_offer_template(is_comparative):
+    pdf = FPDF()
+    pdf.add_page()
+
+    # Header - Phoenix Branding
+    pdf.set_fill_color(0, 38, 73) # Phoenix Navy Blue #002649
+    pdf.rect(0, 0, 210, 30, 'F')
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("helvetica", "B", 18)
+    pdf.set_y(10)
+    pdf.cell(0, 10, "Total Rewards & Compensation Offer", ln=True, align="C")
+    pdf.set_text_color(0, 0, 0)
+
+    # ---------------------------------------------------------
+    # DETAILS TABLE - כותרות, עמודת התוויות ומסגרות ריקות לערכים
+    # ---------------------------------------------------------
+    pdf.set_y(OFFER_Y["table"])
+    pdf.set_fill_color(240, 245, 250)
+    pdf.set_font("helvetica", "B", 10)
+    pdf.cell(OFFER_LABEL_W, OFFER_ROW_H, "Component", border=1, fill=True)
+    if is_comparative:
+        pdf.cell(OFFER_VALUE_W, OFFER_ROW_H, "Current Package", border=1, align="C", fill=True)
+    pdf.cell(OFFER_VALUE_W, OFFER_ROW_H, "Phoenix Offer", border=1, align="C", fill=True)
+    pdf.ln(OFFER_ROW_H)
+
+    pdf.set_font("helvetica", "", 10)
+    for label, _ in OFFER_COMPONENTS:
+        pdf.cell(OFFER_LABEL_W, OFFER_ROW_H, label, border=1)
+        for _ in range(2 if is_comparative else 1):
+            pdf.cell(OFFER_VALUE_W, OFFER_ROW_H, "", border=1)
+        pdf.ln(OFFER_ROW_H)
+
+    # ---------------------------------------------------------
+    # DISCLAIMER (Legal text requested)
+    # ---------------------------------------------------------
+    pdf.set_y(OFFER_Y["disclaimer"])
+    pdf.set_font("helvetica", "I", 8)
+    pdf.set_text_color(100, 100, 100)
+    pdf.multi_cell(0, 5, OFFER_DISCLAIMER)
+    pdf.set_text_color(0, 0, 0)
+    return pdf
+
+
+def render_offer_pdf(payload, issued_on):
+    """מסמך 'הצעת שכר / חבילת תגמול' למועמד - ללא עלויות מעסיק ועמלות חברת השמה"""
+    candidate_name = payload.get("candidateName", "Candidate")
+    is_comparative = bool(payload.get("isComparative", False))
+    proposed = payload.get("proposed", {})
+    current = payload.get("current", {})
+
+    pdf = _template("offer", is_comparative, _build_offer_template)
+
+    pdf.set_y(OFFER_Y["name"])
+    pdf.set_font("helvetica", "B", 14)
+    pdf.cell(0, 10, f"Prepared for: {candidate_name}", ln=True)
+    pdf.set_font("helvetica", "", 10)
+    pdf.cell(0, 5, f"Date: {issued_on}", ln=True)
+
+    # ---------------------------------------------------------
+    # MAIN OFFER HIGHLIGHT (Total Value)
+    # ---------------------------------------------------------
+    pdf.set_y(OFFER_Y["total"])
+    pdf.set_font("helvetica", "B", 14)
+    pdf.set_text_color(239, 107, 0) # Phoenix Orange #EF6B00
+    total_val = proposed.get("totalPackageValue", 0)
+    pdf.cell(0, 10, f"Total Monthly Package Value: {total_val:,.0f} ILS", ln=True)
+    pdf.set_text_color(0, 0, 0)
+
+    # ערכי הטבלה בתוך המסגרות שבתבנית
+    pdf.set_font("helvetica", "", 10)
+    for row, (_, key) in enumerate(OFFER_COMPONENTS):
+        pdf.set_xy(pdf.l_margin + OFFER_LABEL_W, OFFER_Y["rows"] + row * OFFER_ROW_H)
+        if is_comparative:
+            pdf.cell(OFFER_VALUE_W, OFFER_ROW_H, f"{current.get(key, '-')}", align="C")
+        pdf.cell(OFFER_VALUE_W, OFFER_ROW_H, f"{proposed.get(key, '-')}", align="C")
+
+    return bytes(pdf.output())
+
+
+def render_offer_batch(payloads, issued_on, first_index=0):
+    """
+    מנה של מסמכי הצעה בתהליך עבודה אחד: [(אינדקס, bytes או None, שגיאה או None), ...].
+    שגיאה בפריט אחד לא מפילה את המנה - היא נרשמת ב-manifest של הארכיון
+    """
+    results = []
+    for index, payload in enumerate(payloads, first_index):
+        try:
+            results.append((index, render_offer_pdf(payload, issued_on), None))
+        except Exception as e:
+            results.append((index, None, f"{type(e).__name__}: {e}"))
+    return results
@@ -0,0 +1,177 @@
+# pii.py
+# מנוע צנזור PII: מעבר regex יחיד (alternation מקומפל מראש) שסופר תוך כדי ההחלפה.
+# גלאים (Detectors) ניתנים להחלפה/הרחבה, וגלאי יכול לכלול ולידציה (ספרת ביקורת של ת.ז, mod-97 של IBAN).
+# המודול לא מייבא את main, כדי שתהליכי העבודה של מאגר ה-CPU יטענו רק אותו.
+import re
+
+
+def israeli_id_valid(text):
+    """ספרת ביקורת של תעודת זהות ישראלית (משקלות 1,2 לסירוגין, סכום ספרות, מודולו 10)"""
+    total = 0
+    for i, ch in enumerate(text.replace('-', '').zfill(9)):
+        d = int(ch) * (1 + i % 2)
+        total += d - 9 if d > 9 else d
+    return total % 10 == 0
+
+
+def iban_valid(text):
+    """בדיקת mod-97 של IBAN (ISO 13616)"""
+    compact = text.replace(' ', '')
+    rearranged = compact[4:] + compact[:4]
+    return int(''.join(str(int(ch, 36)) for ch in rearranged)) % 97 == 1
+
+
+class Detector:
+    """
+    גלאי אחד: name - שם הקבוצה ב-regex המאוחד (מזהה חוקי), stat_key - המפתח בסטטיסטיקה,
+    label - תיאור להודעת ה-Audit, pattern - בלי קבוצות לוכדות, starts - התווים שהתאמה יכולה להתחיל בהם (תוכן של [...]),
+    validate - בדיקה נוספת על הטקסט שנמצא (אופציונלי)
+    """
+    def __init__(self, name, stat_key, label, pattern, token, starts, validate=None):
+        self.name = name
+        self.stat_key = stat_key
+        self.label = label
+        self.pattern = pattern
+        self.token = token
+        self.starts = starts
+        self.validate = validate
+
+
+HEBREW_WORD = r"[א-ת\"'׳״\-]+"
+
+# הסדר קובע עדיפות כששני גלאים מתחילים באותו מיקום (אימייל שלם לפני המספרים שבתוכו)
+DEFAULT_DETECTORS = (
+    Detector("email", "emails", "אימיילים",
+             r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", "[EMAIL_SECURED]",
+             r"a-zA-Z0-9_.+\-"),
+    Detector("iban", "ibans", "חשבונות IBAN",
+             r"\b[A-Z]{2}\d{2}(?:[ ]?[A-Z0-9]{4}){2,7}(?:[ ]?[A-Z0-9]{1,3})?\b", "[IBAN_SECURED]", "A-Z", iban_valid),
+    Detector("phone", "phones", "טלפונים",
+             r"(?:\+972[- ]?|\b0)5\d-?\d{7}\b", "[PHONE_SECURED]", r"+0"),
+    Detector("israeli_id", "id_cards", "ת.ז",
+             r"\b\d{8}-?\d\b", "[ID_SECURED]", "0-9", israeli_id_valid),
+    Detector("address", "addresses", "כתובות",
+             rf"(?:רחוב|רח['׳]|שדרות|שד['׳]|דרך|סמטת)\s*{HEBREW_WORD}(?:\s+{HEBREW_WORD}){{0,3}}\s+\d{{1,4}}(?:/\d{{1,3}})?"
+             r"|\b\d{1,5}\s+(?:[A-Z][a-z]+\s+){1,3}(?:St|Street|Ave|Avenue|Rd|Road|Blvd|Boulevard)\b\.?",
+             "[ADDRESS_SECURED]", "רשדס0-9"),
+)
+
+
+class PIIScrubber:
+    """
+    סורק טקסט חופשי ומצנזר נתונים מזהים לפני שליחה ל-AI.
+    כל הגלאים מאוחדים ל-regex אחד שמקומפל פעם אחת; ההחלפה והספירה נעשות באותו מעבר.
+    לפני ה-alternation יש שער זול: התאמה מתחילה רק בתחילת טוקן ובאחד מתווי הפתיחה של הגלאים,
+    כך שרוב המיקומים בטקסט נפסלים בבדיקה אחת במקום לנסות כל גלאי בנפרד.
+    """
+    # אף גלאי לא מתחיל באמצע מילה לטינית/מספר
+    TOKEN_START = r"(?<![a-zA-Z0-9_])"
+    # התאמה ארוכה מזה לא נחתכת בין מקטעים במצב streaming
+    STREAM_OVERLAP = 512
+    # מסמך בלי רווחים בכלל נחתך בכל זאת כשהזנב עובר את הגודל הזה
+    STREAM_MAX_CARRY = 64 * 1024
+
+    def __init__(self, detectors=DEFAULT_DETECTORS):
+        self.detectors = tuple(detectors)
+        self._by_group = {d.name: d for d in self.detectors}
+        starts = "".join(d.starts for d in self.detectors)
+        alternation = "|".join(f"(?P<{d.name}>{d.pattern})" for d in self.detectors)
+        self.pattern = re.compile(f"{self.TOKEN_START}(?=[{starts}])(?:{alternation})")
+
+    def empty_stats(self):
+        return {d.stat_key: 0 for d in self.detectors}
+
+    def _replacer(self, stats):
+        by_group = self._by_group
+
+        def replace(match):
+            detector = by_group[match.lastgroup]
+            found = match.group()
+            if detector.validate is not None and not detector.validate(found):
+                return found
+            stats[detector.stat_key] += 1
+            return detector.token
+        return replace
+
+    def scrub(self, text, stats=None):
+        """מחזיר את הטקסט המצונזר + סטטיסטיקות לצורך Audit Log"""
+        if not text:
+            return text, {}
+        stats = self.empty_stats() if stats is None else stats
+        return self.pattern.sub(self._replacer(stats), text), stats
+
+    def scrub_many(self, texts):
+        return [self.scrub(text) for text in texts]
+
+    def stream(self):
+        return StreamScrubber(self)
+
+    def scrub_stream(self, chunks, stats=None):
+        """מצנזר מסמך גדול במקטעים (גנרטור). stats מתעדכן תוך כדי"""
+        stream = StreamScrubber(self, stats)
+        for chunk in chunks:
+            out = stream.feed(chunk)
+            if out:
+                yield out
+        tail = stream.finish()
+        if tail:
+            yield tail
+
+    def describe(self, stats):
+        """הודעת Audit: 'צונזרו 2 ת.ז, 1 טלפונים, ...'"""
+        return "צונזרו " + ", ".join(f"{stats.get(d.stat_key, 0)} {d.label}" for d in self.detectors)
+
+    @staticmethod
+    def scrub_text_for_ai(text: str) -> tuple:
+        return default_scrubber.scrub(text)
+
+
+class StreamScrubber:
+    """
+    צנזור מצטבר: כל מקטע שנכנס מצונזר עד נקודת חיתוך בטוחה, והזנב נשמר לסבב הבא.
+    החיתוך נעשה על רווח, לפחות STREAM_OVERLAP תווים לפני סוף המאגר - כך התאמה לא נחתכת באמצע
+    וגבולות מילה (\\b) בתחילת הזנב זהים לאלו שבמסמך המלא.
+    """
+    def __init__(self, scrubber, stats=None):
+        self.scrubber = scrubber
+        self.stats = scrubber.empty_stats() if stats is None else stats
+        self._carry = ""
+        self._replace = scrubber._replacer(self.stats)
+
+    def feed(self, chunk):
+        buf = self._carry + chunk
+        limit = len(buf) - self.scrubber.STREAM_OVERLAP
+        cut = max(buf.rfind(" ", 0, limit), buf.rfind("\n", 0, limit)) + 1 if limit > 0 else 0
+        if cut <= 0 and limit > self.scrubber.STREAM_MAX_CARRY:
+            cut = limit
+        if cut <= 0:
+            self._carry = buf
+            return ""
+        out, end = self._scrub_until(buf, cut)
+        self._carry = buf[end:]
+        return out
+
+    def finish(self, chunk=""):
+        buf, self._carry = self._carry + chunk, ""
+        return self._scrub_until(buf, len(buf))[0] if buf else ""
+
+    def _scrub_until(self, buf, cut):
+        """מצנזר התאמות שמתחילות לפני cut; התאמה שחוצה את cut נבלעת בשלמותה"""
+        parts, pos = [], 0
+        for match in self.scrubber.pattern.finditer(buf):
+            if match.start() >= cut:
+                break
+            parts.append(buf[pos:match.start()])
+            parts.append(self._replace(match))
+            pos = match.end()
+        end = max(cut, pos)
+        parts.append(buf[pos:end])
+        return "".join(parts), end
+
+
+default_scrubber = PIIScrubber()
+
+
+def scrub_batch(texts):
+    """נקודת הכניסה של תהליך עבודה: [(טקסט מצונזר, סטטיסטיקות), ...]"""
+    return default_scrubber.scrub_many(texts)
@@ -0,0 +1,29 @@
+# conftest.py
+# הבדיקות רצות מול מסד חדש בתיקייה זמנית: DB_PATH ותיקיית uploads יחסיים לתיקייה הנוכחית,
+# לכן עוברים אליה לפני ש-main נטען (הטעינה מריצה את המיגרציות).
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="phoenix-tests-")
+
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("PHOENIX_SNAPSHOT_DB", os.path.join(WORK_DIR, "phoenix_talent_os.db"))
+os.environ.setdefault("PHOENIX_ALLOW_DEV_MASK_KEY", "1")
+os.chdir(WORK_DIR)
+
+
+@pytest.fixture(scope="session")
+def main():
+    import main as app_module
+    return app_module
+
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,44 @@
+# test_audit.py
+import time
+
+
+def _audit_count(main, action):
+    with main.db_pool.reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM audit_logs WHERE action = ?", (action,)).fetchone()[0]
+
+
+def test_sink_thread_survives_unexpected_error(main, monkeypatch):
+    sink = main.AuditSink(flush_rows=1000, flush_seconds=0.05)
+    real_bump = main.bump_data_version
+    failures = []
+
+    def flaky_bump(conn, domain="ats"):
+        if not failures:
+            failures.append(domain)
+            raise ValueError("boom")
+        real_bump(conn, domain)
+
+    monkeypatch.setattr(main, "bump_data_version", flaky_bump)
+    sink.emit((main._new_audit_id(), "2026-01-01 00:00:00", "Sink Retry Test", "Success", "", "tests"))
+
+    deadline = time.time() + 5
+    while _audit_count(main, "Sink Retry Test") == 0 and time.time() < deadline:
+        time.sleep(0.05)
+    assert failures and sink._thread.is_alive()
+    assert _audit_count(main, "Sink Retry Test") == 1
+    sink.close()
+
+
+def test_search_pages_with_cursor(main, client):
+    for i in range(3):
+        main.log_audit_action("Cursor Test", "Success", f"event {i}", "tests")
+    main.audit_sink.flush()
+
+    first = client.get("/api/security/audit-logs/search", params={"action": "Cursor Test", "limit": 2}).json()
+    assert first["count"] == 2 and first["next_cursor"]
+    rest = client.get("/api/security/audit-logs/search",
+                      params={"action": "Cursor Test", "limit": 2, "cursor": first["next_cursor"]}).json()
+    assert rest["count"] == 1 and rest["next_cursor"] is None
+    assert {item["id"] for item in first["items"]}.isdisjoint(item["id"] for item in rest["items"])
+
+    assert client.get("/api/security/audit-logs/search", params={"cursor": "not-a-cursor"}).status_code == 400
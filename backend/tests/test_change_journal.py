@@ -0,0 +1,43 @@
+# test_change_journal.py
+import pandas as pd
+
+
+def _frame(main, statuses):
+    df = pd.DataFrame({
+        "name": [f"journal candidate {i}" for i in range(len(statuses))],
+        "job_title": ["journal role"] * len(statuses),
+        "status": statuses,
+        "recruiter": ["dana"] * len(statuses),
+        "start_date": ["2026-01-01"] * len(statuses),
+    })
+    return main.normalize_ats_frame(df)
+
+
+def test_next_day_reupload_journals_only_real_changes(main):
+    with main.db_pool.writer() as conn:
+        first = main.bulk_load_applications(conn, _frame(main, ["חדש", "חדש", "חדש"]), "journal-log-a")
+    assert first["rows_inserted"] == 3
+
+    # יום אחר: days_in_process גדל בכל השורות, ורק לאחת השתנה הסטטוס
+    df = _frame(main, ["חדש", "ראיון", "חדש"])
+    df["days_in_process"] += 1
+    with main.db_pool.writer() as conn:
+        second = main.bulk_load_applications(conn, df, "journal-log-b")
+        journaled = conn.execute("SELECT COUNT(*) FROM change_journal WHERE log_id = 'journal-log-b'").fetchone()[0]
+        days = {row[0] for row in conn.execute(
+            "SELECT days_in_process FROM applications WHERE upload_log_id IN ('journal-log-a', 'journal-log-b')")}
+        moved = conn.execute("SELECT COUNT(*) FROM applications WHERE upload_log_id = 'journal-log-b'").fetchone()[0]
+
+    assert (second["rows_updated"], second["rows_unchanged"]) == (1, 2)
+    assert journaled == 1
+    assert days == {int(df["days_in_process"].iloc[0])}  # הערך הנגזר עדיין מתרענן בכל השורות
+    assert moved == 1
+
+    with main.db_pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        result = main.revert_from_journal(conn.cursor(), "journal-log-b")
+        conn.commit()
+        statuses = {row[0] for row in conn.execute(
+            "SELECT status FROM applications a JOIN candidates c ON a.candidate_id = c.id WHERE c.name LIKE 'journal candidate %'")}
+    assert result["rows_restored"] == 1 and result["rows_deleted"] == 0
+    assert statuses == {"חדש"}
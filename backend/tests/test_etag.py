@@ -0,0 +1,61 @@
+# test_etag.py
+import pandas as pd
+import pytest
+
+
+def _etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = _etag(client, "/api/finops/data")
+    response = client.get("/api/finops/data", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_etag_carries_the_schema_version(main, client, monkeypatch):
+    etag = _etag(client, "/api/finops/data")
+    assert main.ETAG_SCHEMA in etag
+    # שינוי מבנה (מיגרציה או API_REVISION) פוסל את ה-ETag גם בלי כתיבה
+    monkeypatch.setattr(main, "ETAG_SCHEMA", main.ETAG_SCHEMA + "-next")
+    assert client.get("/api/finops/data", headers={"If-None-Match": etag}).status_code == 200
+
+
+def _load_applications(main, client):
+    df = pd.DataFrame({"name": ["etag candidate"], "job_title": ["etag role"], "status": ["חדש"],
+                       "recruiter": ["etag recruiter"], "start_date": ["2026-01-01"]})
+    with main.db_pool.writer() as conn:
+        main.bulk_load_applications(conn, main.normalize_ats_frame(df), "etag-log")
+
+
+WRITES = {
+    "save_invoice": ("/api/finops/data", lambda main, client: client.post("/api/finops/save_invoice", json={
+        "id": "INV-ETAG", "vendor": "etag vendor", "date": "01/01/2026", "amount": 10,
+        "category": "x", "status": "ממתין"})),
+    "delete_invoice": ("/api/finops/summary", lambda main, client: client.delete("/api/finops/invoice/INV-ETAG")),
+    "save_vendor": ("/api/finops/data", lambda main, client: client.post("/api/finops/save_vendor", json={
+        "id": "V-ETAG", "name": "etag vendor"})),
+    "save_categories": ("/api/finops/data", lambda main, client: client.post("/api/finops/save_categories", json={
+        "categories": [{"id": 9201, "name": "etag category", "target": 1}]})),
+    "bulk_load": ("/jobs", _load_applications),
+    "revert_upload": ("/jobs", lambda main, client: client.post("/admin/revert/etag-log")),
+    "save_etl_rule": ("/meta", lambda main, client: client.post("/api/admin/rules", json={
+        "id": "r-etag", "col_name": "x", "condition": "y", "action": "z"})),
+    "delete_etl_rule": ("/meta", lambda main, client: client.delete("/api/admin/rules/r-etag")),
+    "audit": ("/api/security/audit-logs", lambda main, client: main.log_audit_action("etag", "Success", "etag test")),
+}
+
+
+@pytest.mark.parametrize("write", list(WRITES))
+def test_write_changes_the_etag(main, client, write):
+    url, perform = WRITES[write]
+    before = _etag(client, url)
+    result = perform(main, client)
+    assert getattr(result, "status_code", 200) < 400
+    if write == "audit":
+        main.audit_sink.flush()
+    assert client.get(url, headers={"If-None-Match": before}).status_code == 200
+    assert _etag(client, url) != before
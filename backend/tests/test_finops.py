@@ -0,0 +1,79 @@
+# test_finops.py
+import sqlite3
+
+import pytest
+
+
+def _categories(client):
+    return {cat["id"]: cat for cat in client.get("/api/finops/data").json()["categories"]}
+
+
+def _category(cat_id, name, **fields):
+    return {"id": cat_id, "name": name, "target": 1000, "previousYearSpend": 0, "code": "", "notes": "",
+            "subcategories": [], **fields}
+
+
+def test_versioning_migration_bumps_finops_version(main, tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / "migrate.db")
+    try:
+        with monkeypatch.context() as m:
+            m.setattr(main, "MIGRATIONS", main.MIGRATIONS[:-1])
+            main.run_migrations(conn)
+        before = main.get_data_version(conn, "finops")
+        assert main.run_migrations(conn) == [main.SCHEMA_VERSION]
+        assert main.get_data_version(conn, "finops") > before
+    finally:
+        conn.close()
+
+
+def test_stale_category_version_is_a_conflict(client):
+    created = client.post("/api/finops/save_categories",
+                          json={"categories": [_category(9101, "conflict category")]}).json()
+    version = next(cat["version"] for cat in created["categories"] if cat["id"] == 9101)
+
+    # עורך ראשון משנה ומעלה את הגרסה
+    first = client.post("/api/finops/save_categories",
+                        json={"categories": [_category(9101, "conflict category", target=2000, version=version)]})
+    assert first.status_code == 200
+
+    # עורך שני עדיין עם הגרסה הישנה - עדכון ומחיקה נדחים, ושום דבר לא נשמר
+    stale = client.post("/api/finops/save_categories",
+                        json={"categories": [_category(9101, "conflict category", target=3000, version=version)],
+                              "deleted": []})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["conflicts"][0]["reason"] == "modified"
+    stale_delete = client.post("/api/finops/save_categories", json={"deleted": [{"id": 9101, "version": version}]})
+    assert stale_delete.status_code == 409
+
+    current = _categories(client)[9101]
+    assert current["target"] == 2000 and current["version"] == version + 1
+
+
+def _vendor(client, name):
+    return next(v for v in client.get("/api/finops/data").json()["vendors"] if v["name"] == name)
+
+
+def _invoice(inv_id, vendor, amount, status):
+    return {"id": inv_id, "vendor": vendor, "date": "01/01/2026", "budgetMonth": "2026-01", "amount": amount,
+            "category": "trigger category", "status": status}
+
+
+def test_vendor_totals_follow_invoices(client):
+    assert client.post("/api/finops/save_vendor", json={"id": "V-TRG", "name": "trigger vendor"}).status_code == 200
+    client.post("/api/finops/save_invoice", json=_invoice("INV-TRG-1", "trigger vendor", 100, "שולם"))
+    client.post("/api/finops/save_invoice", json=_invoice("INV-TRG-2", "trigger vendor", 50, "ממתין"))
+    vendor = _vendor(client, "trigger vendor")
+    assert (vendor["total_paid"], vendor["active_invoices"]) == (100, 1)
+
+    # התשלום של החשבונית השנייה מעביר אותה מפתוחה לשולמה
+    client.post("/api/finops/save_invoice", json=_invoice("INV-TRG-2", "trigger vendor", 50, "שולם"))
+    vendor = _vendor(client, "trigger vendor")
+    assert (vendor["total_paid"], vendor["active_invoices"]) == (150, 0)
+
+    client.delete("/api/finops/invoice/INV-TRG-1")
+    assert _vendor(client, "trigger vendor")["total_paid"] == pytest.approx(50)
+
+    # שינוי שם מחשב מחדש מול החשבוניות של השם החדש (שאין לו כאלה)
+    client.post("/api/finops/save_vendor", json={"id": "V-TRG", "name": "renamed trigger vendor"})
+    vendor = _vendor(client, "renamed trigger vendor")
+    assert (vendor["total_paid"], vendor["active_invoices"]) == (0, 0)
@@ -0,0 +1,19 @@
+# test_frame_cache.py
+import sqlite3
+
+import pandas as pd
+
+
+def test_cached_frame_survives_caller_edits(main, tmp_path):
+    conn = sqlite3.connect(tmp_path / "cache.db")
+    main.run_migrations(conn)
+    cache = main.VersionedFrameCache(lambda _conn: pd.DataFrame({"status": ["חדש", "ראיון"], "days": [1, 2]}))
+
+    frame = cache.get(conn)
+    frame.loc[0, "status"] = "שונה"
+    frame["days"] += 100
+
+    again = cache.get(conn)
+    assert again["status"].tolist() == ["חדש", "ראיון"]
+    assert again["days"].tolist() == [1, 2]
+    conn.close()
@@ -0,0 +1,54 @@
+# test_ingest_job.py
+import os
+
+import pytest
+
+CSV = "שם מועמד,שם המשרה,סטטוס,מגייס,תחילת גיוס\ningest candidate,ingest role,חדש,dana,2026-01-01\n"
+
+
+@pytest.fixture
+def job(main, tmp_path):
+    spool_path = tmp_path / "job.upload"
+    spool_path.write_text(CSV, encoding="utf-8")
+    job_id = f"ingest-{os.urandom(3).hex()}"
+    with main.ingest_jobs_lock:
+        main.ingest_jobs[job_id] = {"job_id": job_id, "phase": "queued", "finished_at": None}
+    return job_id, str(spool_path)
+
+
+def _logged(main, job_id):
+    with main.db_pool.reader() as conn:
+        return conn.execute("SELECT status FROM data_logs WHERE log_id = ?", (job_id,)).fetchone()
+
+
+def test_log_row_exists_before_completed_is_published(main, job, monkeypatch):
+    job_id, spool_path = job
+    seen = {}
+    publish = main._update_ingest_job
+
+    def spy(jid, **fields):
+        if fields.get("phase") == "completed":
+            seen["log_row"] = _logged(main, jid)
+        publish(jid, **fields)
+
+    monkeypatch.setattr(main, "_update_ingest_job", spy)
+    main.run_ingest_job(job_id, spool_path, "ingest.csv")
+
+    assert main.ingest_jobs[job_id]["phase"] == "completed"
+    assert seen["log_row"] == ("Success",)
+
+
+def test_failed_log_write_still_cleans_up(main, job, monkeypatch):
+    job_id, spool_path = job
+
+    def broken_log(*args):
+        raise RuntimeError("data_logs is locked")
+
+    monkeypatch.setattr(main, "_log_ingest_job", broken_log)
+    with pytest.raises(RuntimeError):
+        main.run_ingest_job(job_id, spool_path, "ingest.csv")
+
+    state = main.ingest_jobs[job_id]
+    assert state["phase"] == "failed" and "data_logs is locked" in state["error"]
+    assert state["finished_at"] is not None
+    assert not os.path.exists(spool_path)
@@ -0,0 +1,53 @@
+# test_invoice_blobs.py
+import io
+import os
+
+
+def _age_blob(main, digest):
+    """מזיז את created_at אל מחוץ לחלון החסד, כאילו ההעלאה הייתה לפני יומיים"""
+    with main.db_pool.writer() as conn:
+        conn.execute("UPDATE invoice_blobs SET created_at = '2000-01-01 00:00:00' WHERE sha256 = ?", (digest,))
+        conn.commit()
+
+
+def _upload(client, content, name="invoice.pdf"):
+    response = client.post("/api/finops/upload_invoice", files={"file": (name, content, "application/pdf")})
+    assert response.status_code == 200
+    return response.json()["blob"]
+
+
+def test_sweep_deletes_old_unreferenced_blob(main, client):
+    blob = _upload(client, b"orphan invoice bytes")
+    _age_blob(main, blob["sha256"])
+
+    assert client.post("/api/finops/blobs/sweep").json()["blobs_deleted"] == 1
+    assert not os.path.exists(main.invoice_blob_path(blob["sha256"]))
+
+
+def test_reupload_restarts_grace_window(main, client):
+    content = b"invoice uploaded twice"
+    first = _upload(client, content)
+    _age_blob(main, first["sha256"])
+
+    # אותו תוכן שוב: ה-sha256 חוזר ללקוח, ולכן ה-blob לא יכול להימחק בניקוי הבא
+    again = _upload(client, content, name="copy.pdf")
+    assert again["sha256"] == first["sha256"] and again["duplicate"]
+
+    assert client.post("/api/finops/blobs/sweep").json()["blobs_deleted"] == 0
+    assert os.path.exists(main.invoice_blob_path(first["sha256"]))
+    assert client.get(f"/api/finops/blobs/{first['sha256']}").content == content
+
+
+def test_sweep_between_spool_and_store_keeps_the_blob(main, client):
+    content = b"invoice re-uploaded while the sweep runs"
+    first = _upload(client, content)
+    _age_blob(main, first["sha256"])
+
+    # העלאה חוזרת: הקובץ הזמני כבר נכתב, ואז הניקוי רץ לפני שההעלאה לקחה את נעילת הכותב
+    digest, size, tmp_path = main.spool_invoice_blob(io.BytesIO(content))
+    assert client.post("/api/finops/blobs/sweep").json()["blobs_deleted"] == 1
+    with main.db_pool.writer() as conn:
+        duplicate = main.store_invoice_blob(conn, tmp_path, digest, size, "application/pdf", "again.pdf")
+
+    assert not duplicate and not os.path.exists(tmp_path)
+    assert client.get(f"/api/finops/blobs/{digest}").content == content
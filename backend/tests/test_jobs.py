@@ -0,0 +1,28 @@
+# test_jobs.py
+import pandas as pd
+
+
+def _load(main, job_title, recruiters, log_id):
+    df = pd.DataFrame({
+        "name": [f"{job_title} candidate {i}" for i in range(len(recruiters))],
+        "job_title": [job_title] * len(recruiters),
+        "status": ["חדש"] * len(recruiters),
+        "recruiter": recruiters,
+        "start_date": ["2026-01-01"] * len(recruiters),
+    })
+    with main.db_pool.writer() as conn:
+        main.bulk_load_applications(conn, main.normalize_ats_frame(df), log_id)
+
+
+def _recruiter(client, job_title):
+    return next(job["recruiter"] for job in client.get("/jobs").json() if job["job_title"] == job_title)
+
+
+def test_jobs_recruiter_is_the_plurality_recruiter(main, client):
+    _load(main, "plurality role", ["zeev", "avi", "avi"], "jobs-log-plurality")
+    assert _recruiter(client, "plurality role") == "avi"
+
+
+def test_jobs_recruiter_tie_goes_to_first_name(main, client):
+    _load(main, "tied role", ["zeev", "avi"], "jobs-log-tie")
+    assert _recruiter(client, "tied role") == "avi"
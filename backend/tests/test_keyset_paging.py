@@ -0,0 +1,47 @@
+# test_keyset_paging.py
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope="module")
+def nullable_keys(main):
+    """תהליכים עם מגייס, סטטוס ומחלקה NULL בחלק מהשורות (נתונים מגרסאות קודמות של הקליטה)"""
+    count = 12
+    df = pd.DataFrame({
+        "name": [f"paging candidate {i}" for i in range(count)],
+        "job_title": [f"paging role {i % 3}" for i in range(count)],
+        "status": ["חדש"] * count,
+        "recruiter": [f"paging recruiter {i % 4}" for i in range(count)],
+        "start_date": ["2026-01-01"] * count,
+    })
+    with main.db_pool.writer() as conn:
+        main.bulk_load_applications(conn, main.normalize_ats_frame(df), "paging-log")
+        # 7 שורות NULL - לא כפולה של גודל העמוד, כך שעמודים מסתיימים גם בתוך קבוצת ה-NULL וגם לפניה
+        conn.execute("""UPDATE applications SET recruiter = NULL, status = NULL
+                        WHERE app_id IN (SELECT app_id FROM applications WHERE upload_log_id = 'paging-log'
+                                         ORDER BY app_id LIMIT 7)""")
+        conn.execute("UPDATE jobs SET department = NULL WHERE job_title = 'paging role 0'")
+        conn.commit()
+        return {app_id for app_id, in conn.execute("SELECT app_id FROM applications")}
+
+
+def _walk(client, sort_by, sort_dir, limit=5):
+    seen, cursor = [], None
+    for _ in range(1000):
+        params = {"sort_by": sort_by, "sort_dir": sort_dir, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/candidates", params=params).json()
+        seen += [row["app_id"] for row in body["data"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+    raise AssertionError("the cursor walk did not terminate")
+
+
+@pytest.mark.parametrize("sort_by", ["recruiter", "department", "status", "candidate_name", "days_in_process"])
+@pytest.mark.parametrize("sort_dir", ["asc", "desc"])
+def test_cursor_walk_visits_every_row_once(client, nullable_keys, sort_by, sort_dir):
+    seen = _walk(client, sort_by, sort_dir)
+    assert len(seen) == len(set(seen))
+    assert set(seen) == nullable_keys
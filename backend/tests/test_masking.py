@@ -0,0 +1,68 @@
+# test_masking.py
+import pandas as pd
+import pytest
+
+import masking
+
+KEY = b"test-mask-key"
+
+
+def test_id_is_sensitive_only_as_a_whole_word():
+    assert masking.is_sensitive_column("ID")
+    assert masking.is_sensitive_column("Candidate ID")
+    assert masking.is_sensitive_column("ת.ז")
+    assert masking.is_sensitive_column("טלפון נייד")
+    assert not masking.is_sensitive_column("job_id")
+    assert not masking.is_sensitive_column("valid")
+    assert not masking.is_sensitive_column("שם המשרה")
+
+
+def test_mask_frame_leaves_other_columns_and_empty_cells():
+    df = pd.DataFrame({"ID": ["123456782", None, " ", "nan"], "job_id": [1, 2, 3, 4]})
+    assert masking.mask_frame(df, key=KEY) == ["ID"]
+    assert df["job_id"].tolist() == [1, 2, 3, 4]
+    assert df["ID"].iloc[0] != "123456782" and len(df["ID"].iloc[0]) == 2 * masking.TOKEN_BYTES
+    assert df["ID"].iloc[1:].isna().all()
+
+
+def test_tokens_are_stable_across_calls_and_chunks():
+    whole = pd.DataFrame({"טלפון": ["050-1234567", "052-7654321", "050-1234567"]})
+    first, second = whole.iloc[:2].copy(), whole.iloc[2:].copy()
+    masking.mask_frame(whole, key=KEY)
+    masking.mask_frame(first, key=KEY)
+    masking.mask_frame(second, key=KEY)
+
+    assert whole["טלפון"].iloc[0] == whole["טלפון"].iloc[2]
+    assert pd.concat([first, second])["טלפון"].tolist() == whole["טלפון"].tolist()
+    # מפתח אחר - טוקן אחר
+    assert masking.mask_values(["050-1234567"], b"other-key") != masking.mask_values(["050-1234567"], KEY)
+
+
+def test_float_ids_mask_like_strings():
+    floats = pd.DataFrame({"ID": [123456782.0, None]})
+    masking.mask_frame(floats, key=KEY)
+    assert floats["ID"].iloc[0] == masking.mask_values(["123456782"], KEY)[0]
+
+
+def test_missing_key_fails_closed(monkeypatch):
+    monkeypatch.setattr(masking, "MASK_KEY", None)
+    with pytest.raises(masking.MaskKeyMissing):
+        masking.mask_frame(pd.DataFrame({"ID": ["123456782"]}))
+    with pytest.raises(masking.MaskKeyMissing):
+        masking.mask_values(["123456782"])
+
+
+def test_dev_key_needs_explicit_opt_in(monkeypatch):
+    monkeypatch.delenv("PHOENIX_MASK_KEY", raising=False)
+    monkeypatch.delenv("PHOENIX_ALLOW_DEV_MASK_KEY", raising=False)
+    assert masking._configured_key() is None
+    monkeypatch.setenv("PHOENIX_ALLOW_DEV_MASK_KEY", "1")
+    assert masking._configured_key() == masking.DEV_MASK_KEY
+    monkeypatch.setenv("PHOENIX_MASK_KEY", "prod-key")
+    assert masking._configured_key() == b"prod-key"
+
+
+def test_upload_is_refused_without_a_key(main, client, monkeypatch):
+    monkeypatch.setattr(masking, "MASK_KEY", None)
+    response = client.post("/upload", files={"file": ("ats.csv", b"name\nx\n", "text/csv")})
+    assert response.status_code == 503
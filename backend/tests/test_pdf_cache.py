@@ -0,0 +1,20 @@
+# test_pdf_cache.py
+import pandas as pd
+
+
+def _report(client):
+    response = client.post("/api/tools/generate-report", json={"type": "weekly_hiring"})
+    assert response.status_code == 200 and response.content.startswith(b"%PDF")
+    return response.content
+
+
+def test_report_cache_keyed_on_generation_minute(client, monkeypatch):
+    minute = {"now": pd.Timestamp("2026-01-05 09:00:10")}
+    monkeypatch.setattr(pd.Timestamp, "now", classmethod(lambda cls, tz=None: minute["now"]))
+
+    first = _report(client)
+    minute["now"] = pd.Timestamp("2026-01-05 09:00:50")
+    assert _report(client) == first  # אותה דקה ואותה גרסת נתונים - מהמטמון
+
+    minute["now"] = pd.Timestamp("2026-01-08 14:30:00")
+    assert _report(client) != first  # שעת ההפקה המודפסת מתעדכנת
@@ -0,0 +1,22 @@
+# test_query_plans.py
+import sqlite3
+
+
+def test_hot_queries_use_indexes(main, tmp_path):
+    """כל שאילתה ב-HOT_QUERIES רצה על אינדקס במסד שנבנה מאפס דרך המיגרציות"""
+    conn = sqlite3.connect(tmp_path / "plans.db")
+    try:
+        assert main.run_migrations(conn) == [version for version, _, _ in main.MIGRATIONS]
+        main.assert_query_plans(conn)
+    finally:
+        conn.close()
+
+
+def test_plan_guard_flags_full_scan(main, tmp_path):
+    conn = sqlite3.connect(tmp_path / "plans.db")
+    try:
+        main.run_migrations(conn)
+        report = main.check_query_plans(conn, {"unindexed": ("SELECT * FROM finops_invoices WHERE note = ?", ("x",))})
+        assert report[0]["problems"]
+    finally:
+        conn.close()
@@ -0,0 +1,44 @@
+# test_snapshot_db.py
+import os
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+
+def test_import_does_not_open_snapshot_db(tmp_path):
+    snapshot_path = tmp_path / "snapshot.db"
+    env = dict(os.environ, PHOENIX_SNAPSHOT_DB=str(snapshot_path), PYTHONPATH=BACKEND_DIR)
+    subprocess.run([sys.executable, "-c", "import main"], cwd=tmp_path, env=env, check=True)
+    assert not snapshot_path.exists()
+
+
+def test_snapshot_db_opens_on_first_request(main, client, tmp_path, monkeypatch):
+    snapshot_path = tmp_path / "snapshot.db"
+    main.close_snapshot_db()
+    monkeypatch.setattr(main, "SNAPSHOT_DB_PATH", str(snapshot_path))
+
+    response = client.get("/history/uploads")
+    assert response.status_code == 200
+    assert response.json() == []
+    assert snapshot_path.exists()
+    main.close_snapshot_db()
+
+
+def test_malformed_date_is_a_bad_request(client):
+    assert client.get("/history/as-of", params={"date": "foo"}).status_code == 400
+    assert client.get("/history/diff", params={"date_a": "2026-01-01", "date_b": "not-a-date"}).status_code == 400
+
+
+def test_failed_upload_does_not_resolve(main, client, tmp_path, monkeypatch):
+    main.close_snapshot_db()
+    monkeypatch.setattr(main, "SNAPSHOT_DB_PATH", str(tmp_path / "snapshot.db"))
+    with main.snapshot_db_lock:
+        db = main.get_snapshot_db()
+        failed = db.conn.execute("INSERT INTO uploads_log (filename, upload_date, total_records, status) "
+                                 "VALUES ('broken.xlsx', '2026-01-05 10:00:00', 10, 'FAILED')").lastrowid
+        db.conn.commit()
+
+    assert client.get("/history/as-of", params={"upload_id": failed}).status_code == 404
+    assert client.get("/history/as-of", params={"date": "2026-01-06"}).status_code == 404
+    main.close_snapshot_db()
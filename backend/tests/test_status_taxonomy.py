@@ -0,0 +1,38 @@
+# test_status_taxonomy.py
+import sqlite3
+
+
+def _fresh_db(main, path):
+    conn = sqlite3.connect(path)
+    main.run_migrations(conn)
+    main.sync_status_taxonomy(conn.cursor())
+    conn.commit()
+    return conn
+
+
+def test_reclassification_bumps_ats_version(main, tmp_path, monkeypatch):
+    conn = _fresh_db(main, tmp_path / "taxonomy.db")
+    conn.execute("INSERT INTO status_taxonomy (status, status_class) VALUES ('סטטוס ישן', 0)")
+    conn.commit()
+    before = main.get_data_version(conn, "ats")
+
+    # גרסת טקסונומיה חדשה שמסווגת את הסטטוס אחרת - כמו פריסה עם הגדרות מעודכנות
+    monkeypatch.setattr(main, "STATUS_TAXONOMY_VERSION", "test-next")
+    monkeypatch.setattr(main, "classify_status", lambda status: main.STATUS_CLOSED)
+    main.sync_status_taxonomy(conn.cursor())
+    conn.commit()
+
+    assert main.get_data_version(conn, "ats") == before + 1
+    conn.close()
+
+
+def test_unchanged_taxonomy_keeps_version(main, tmp_path, monkeypatch):
+    conn = _fresh_db(main, tmp_path / "taxonomy.db")
+    before = main.get_data_version(conn, "ats")
+
+    monkeypatch.setattr(main, "STATUS_TAXONOMY_VERSION", "test-next")
+    main.sync_status_taxonomy(conn.cursor())
+    conn.commit()
+
+    assert main.get_data_version(conn, "ats") == before
+    conn.close()
@@ -0,0 +1,23 @@
+# test_upload_frames.py
+import io
+
+import pandas as pd
+
+
+def _csv(rows, tail=""):
+    lines = ["שם מועמד,שם משרה"] + [f"מועמד {i},מפתח" for i in range(rows)]
+    return "\n".join(lines) + "\n" + tail
+
+
+def test_late_non_utf8_byte_falls_back_for_whole_file(main):
+    # הבית הלא-תקין ב-UTF-8 מגיע הרבה אחרי 64KB הראשונים ואחרי המקטע הראשון
+    data = _csv(20_000).encode("utf-8") + "שורה,אחרונה\n".encode("cp1255")
+    frames = list(main.iter_upload_frames(io.BytesIO(data), chunk_rows=5_000))
+    assert sum(len(f) for f in frames) == 20_001
+
+
+def test_utf8_file_keeps_hebrew(main):
+    data = _csv(3).encode("utf-8")
+    frame = pd.concat(main.iter_upload_frames(io.BytesIO(data), chunk_rows=2))
+    assert list(frame.columns) == ["שם מועמד", "שם משרה"]
+    assert frame.iloc[-1, 0] == "מועמד 2"
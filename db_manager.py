@@ -4,15 +4,29 @@ import pandas as pd
 from datetime import datetime
 import config
 
+# Columns persisted per application (the ETL frame carries a few extra raw fields)
+SNAPSHOT_COLUMNS = ['candidate_name', 'job_title', 'status', 'recruiter', 'division', 'department',
+                    'start_date', 'days_in_process', 'source_name', 'app_hash']
+
+# A new version of an application is stored only when one of these changes.
+# days_in_process is derived from start_date and is recomputed on read.
+TRACKED_COLUMNS = ['candidate_name', 'job_title', 'status', 'recruiter', 'division', 'department',
+                   'start_date', 'source_name']
+
+# One version of an application as seen at upload u (days_in_process is relative to that upload)
+VERSION_SELECT = """s.id, u.upload_id, s.candidate_name, s.job_title, s.status, s.recruiter, s.division, s.department,
+        s.start_date, CAST(julianday(u.upload_date) - julianday(s.start_date) AS INTEGER) AS days_in_process,
+        s.source_name, s.app_hash"""
+
 class DatabaseManager:
-    def __init__(self):
-        self.conn = sqlite3.connect(config.DB_NAME, check_same_thread=False)
+    def __init__(self, db_path=None):
+        self.conn = sqlite3.connect(db_path or config.DB_NAME, check_same_thread=False)
         self.init_schema()
 
     def init_schema(self):
         """Builds the database structure if it doesn't exist."""
         c = self.conn.cursor()
-        
+
         # 1. Uploads History (Who uploaded what and when)
         c.execute('''CREATE TABLE IF NOT EXISTS uploads_log (
                         upload_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,7 +36,9 @@ class DatabaseManager:
                         status TEXT
                     )''')
 
-        # 2. Main Candidates Table (With snapshot_id linking to upload)
+        # 2. Main Candidates Table (Slowly Changing Dimension)
+        # Every row is one version of an application, valid from upload valid_from up to
+        # (not including) upload valid_to. valid_to IS NULL marks the current version.
         # This structure allows us to see the state of a candidate at ANY point in time (Time Machine)
         c.execute('''CREATE TABLE IF NOT EXISTS candidates_snapshot (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,11 +53,30 @@ class DatabaseManager:
                         days_in_process INTEGER,
                         source_name TEXT,
                         app_hash TEXT,
+                        valid_from INTEGER,
+                        valid_to INTEGER,
                         FOREIGN KEY(upload_id) REFERENCES uploads_log(upload_id)
                     )''')
-        
+        self._migrate_full_copies(c)
+
+        c.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_current ON candidates_snapshot(app_hash) WHERE valid_to IS NULL")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_validity ON candidates_snapshot(valid_from, valid_to)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_closed ON candidates_snapshot(valid_to)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_snapshot_history ON candidates_snapshot(app_hash, valid_from)")
+
         self.conn.commit()
 
+    def _migrate_full_copies(self, c):
+        """Databases from before delta storage hold one full copy per upload: give each row a one-upload validity"""
+        columns = [row[1] for row in c.execute("PRAGMA table_info(candidates_snapshot)")]
+        if 'valid_from' in columns:
+            return
+        c.execute("ALTER TABLE candidates_snapshot ADD COLUMN valid_from INTEGER")
+        c.execute("ALTER TABLE candidates_snapshot ADD COLUMN valid_to INTEGER")
+        c.execute('''UPDATE candidates_snapshot SET
+                        valid_from = upload_id,
+                        valid_to = (SELECT MIN(u.upload_id) FROM uploads_log u WHERE u.upload_id > candidates_snapshot.upload_id)''')
+
     def log_upload(self, filename, count):
         """Starts a new upload session"""
         c = self.conn.cursor()
@@ -51,28 +86,188 @@ class DatabaseManager:
         return c.lastrowid
 
     def save_snapshot(self, df, filename):
-        """Saves a full snapshot of the current report"""
+        """Saves the report as a delta: only new, changed and disappeared applications are written"""
         upload_id = self.log_upload(filename, len(df))
-        
-        # Add the upload_id to the dataframe so we know which batch this belongs to
-        df_save = df.copy()
-        df_save['upload_id'] = upload_id
-        
-        # Save to DB
-        df_save.to_sql('candidates_snapshot', self.conn, if_exists='append', index=False)
+        try:
+            self._begin_staging()
+            self._stage_snapshot_rows(df)
+            self._apply_snapshot_delta(upload_id)
+        except Exception:
+            self.conn.rollback()
+            self._finish_upload(upload_id, len(df), 'FAILED')
+            raise
         return upload_id
 
+    def save_snapshot_stream(self, chunks, filename):
+        """Streaming variant of save_snapshot: chunks are staged as they arrive, the delta is applied once"""
+        upload_id = self.log_upload(filename, 0)
+        total = 0
+        try:
+            self._begin_staging()
+            for chunk in chunks:
+                self._stage_snapshot_rows(chunk)
+                total += len(chunk)
+            self._apply_snapshot_delta(upload_id)
+        except Exception:
+            self.conn.rollback()
+            self._finish_upload(upload_id, total, 'FAILED')
+            raise
+        self._finish_upload(upload_id, total, 'SUCCESS')
+        return upload_id, total
+
+    def _begin_staging(self):
+        c = self.conn.cursor()
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_snapshot "
+                  f"({', '.join(SNAPSHOT_COLUMNS)}, PRIMARY KEY (app_hash))")
+        c.execute("DELETE FROM incoming_snapshot")
+
+    def _stage_snapshot_rows(self, df):
+        """Writes a (chunk of a) report into the temp staging table; the last row per app_hash wins"""
+        rows = df[SNAPSHOT_COLUMNS].copy()
+        rows['start_date'] = pd.to_datetime(rows['start_date']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        rows = rows.astype(object).where(rows.notna(), None)
+        self.conn.executemany(f"INSERT OR REPLACE INTO incoming_snapshot ({', '.join(SNAPSHOT_COLUMNS)}) "
+                              f"VALUES ({', '.join('?' * len(SNAPSHOT_COLUMNS))})",
+                              rows.itertuples(index=False, name=None))
+
+    def _apply_snapshot_delta(self, upload_id):
+        """Closes current versions that changed or disappeared and opens versions for new/changed ones"""
+        c = self.conn.cursor()
+        same_version = ' AND '.join(f"i.{col} IS candidates_snapshot.{col}" for col in TRACKED_COLUMNS)
+
+        # 1. Changed + disappeared: the current version has no identical row in the new report
+        c.execute(f'''UPDATE candidates_snapshot SET valid_to = ?
+                      WHERE valid_to IS NULL AND NOT EXISTS (
+                          SELECT 1 FROM incoming_snapshot i WHERE i.app_hash = candidates_snapshot.app_hash AND {same_version})''',
+                  (upload_id,))
+
+        # 2. New + changed: whatever is still without a current version
+        c.execute(f'''INSERT INTO candidates_snapshot (upload_id, valid_from, {', '.join(SNAPSHOT_COLUMNS)})
+                      SELECT ?, ?, {', '.join('i.' + col for col in SNAPSHOT_COLUMNS)} FROM incoming_snapshot i
+                      WHERE NOT EXISTS (SELECT 1 FROM candidates_snapshot s WHERE s.app_hash = i.app_hash AND s.valid_to IS NULL)''',
+                  (upload_id, upload_id))
+
+        c.execute("DELETE FROM incoming_snapshot")
+        self.conn.commit()
+
+    def _finish_upload(self, upload_id, count, status):
+        self.conn.execute("UPDATE uploads_log SET total_records = ?, status = ? WHERE upload_id = ?",
+                          (count, status, upload_id))
+        self.conn.commit()
+
     def get_latest_snapshot(self):
-        """Retrieves only the most recent data"""
-        query = """
-        SELECT * FROM candidates_snapshot 
-        WHERE upload_id = (SELECT MAX(upload_id) FROM uploads_log)
+        """Retrieves only the most recent data (the current version of every application)"""
+        query = f"""
+        SELECT {VERSION_SELECT}
+        FROM candidates_snapshot s, (SELECT upload_id, upload_date FROM uploads_log WHERE status = 'SUCCESS'
+                                     ORDER BY upload_id DESC LIMIT 1) u
+        WHERE s.valid_to IS NULL
         """
         try:
             return pd.read_sql(query, self.conn)
         except Exception:
             return pd.DataFrame()
 
+    def get_snapshot_as_of(self, upload_id, limit=None, offset=0):
+        """Rebuilds the full report exactly as it was right after the given upload"""
+        query = f"""
+        SELECT {VERSION_SELECT}
+        FROM candidates_snapshot s JOIN uploads_log u ON u.upload_id = ?
+        WHERE s.valid_from <= u.upload_id AND (s.valid_to IS NULL OR s.valid_to > u.upload_id)
+        ORDER BY s.id LIMIT ? OFFSET ?
+        """
+        try:
+            return pd.read_sql(query, self.conn, params=(upload_id, -1 if limit is None else limit, offset))
+        except Exception:
+            return pd.DataFrame()
+
+    # --- Time Machine: point-in-time, diff & history queries ---
+    def resolve_upload(self, when):
+        """An upload_id, or a date -> the last successful upload on or before that day (None if none).
+        A failed upload never resolves - its snapshot is partial."""
+        if isinstance(when, int):
+            row = self.conn.execute("SELECT upload_id FROM uploads_log WHERE upload_id = ? AND status = 'SUCCESS'",
+                                    (when,)).fetchone()
+        else:
+            day = pd.Timestamp(when).strftime('%Y-%m-%d')
+            row = self.conn.execute("""SELECT upload_id FROM uploads_log
+                                       WHERE status = 'SUCCESS' AND upload_date < date(?, '+1 day')
+                                       ORDER BY upload_id DESC LIMIT 1""", (day,)).fetchone()
+        return row[0] if row else None
+
+    def as_of(self, when, limit=None, offset=0):
+        """The report as it was at an upload_id or a date"""
+        upload_id = self.resolve_upload(when)
+        if upload_id is None:
+            return pd.DataFrame()
+        return self.get_snapshot_as_of(upload_id, limit, offset)
+
+    def status_counts_as_of(self, when):
+        """Applications per status at an upload_id or a date, aggregated inside SQLite"""
+        upload_id = self.resolve_upload(when)
+        if upload_id is None:
+            return {}
+        rows = self.conn.execute("""SELECT status, COUNT(*) FROM candidates_snapshot
+                                    WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)
+                                    GROUP BY status""", (upload_id, upload_id)).fetchall()
+        return {status: count for status, count in rows}
+
+    def diff(self, upload_a, upload_b):
+        """
+        What changed between two uploads (each an upload_id or a date).
+        Reads only the versions opened or closed in between, so the cost follows the churn
+        between the two weeks and not the size of the pipeline.
+        Returns {'added', 'removed', 'status_changed'} DataFrames.
+        """
+        a, b = self.resolve_upload(upload_a), self.resolve_upload(upload_b)
+        if a is None or b is None or a == b:
+            return {"added": pd.DataFrame(), "removed": pd.DataFrame(), "status_changed": pd.DataFrame()}
+        lo, hi = min(a, b), max(a, b)
+
+        # Versions valid at hi but not at lo / valid at lo but not at hi
+        opened = pd.read_sql(f"""
+            SELECT {VERSION_SELECT} FROM candidates_snapshot s JOIN uploads_log u ON u.upload_id = :hi
+            WHERE s.valid_from > :lo AND s.valid_from <= :hi AND (s.valid_to IS NULL OR s.valid_to > :hi)
+        """, self.conn, params={"lo": lo, "hi": hi})
+        closed = pd.read_sql(f"""
+            SELECT {VERSION_SELECT} FROM candidates_snapshot s JOIN uploads_log u ON u.upload_id = :lo
+            WHERE s.valid_to > :lo AND s.valid_to <= :hi AND s.valid_from <= :lo
+        """, self.conn, params={"lo": lo, "hi": hi})
+
+        # Diffing backwards in time swaps the roles of the two sides
+        before, after = (closed, opened) if a < b else (opened, closed)
+
+        both = before.merge(after, on='app_hash', suffixes=('_before', '_after'))
+        status_changed = both.loc[both['status_before'] != both['status_after'], [
+            'app_hash', 'candidate_name_after', 'job_title_after', 'recruiter_after',
+            'status_before', 'status_after', 'days_in_process_after'
+        ]].rename(columns={'candidate_name_after': 'candidate_name', 'job_title_after': 'job_title',
+                           'recruiter_after': 'recruiter', 'days_in_process_after': 'days_in_process'})
+
+        return {
+            "added": after[~after['app_hash'].isin(before['app_hash'])].reset_index(drop=True),
+            "removed": before[~before['app_hash'].isin(after['app_hash'])].reset_index(drop=True),
+            "status_changed": status_changed.reset_index(drop=True),
+        }
+
+    def history(self, app_hash):
+        """Every stored version of one application, oldest first"""
+        query = """
+        SELECT s.valid_from, s.valid_to, f.upload_date AS valid_from_date, t.upload_date AS valid_to_date,
+               s.candidate_name, s.job_title, s.status, s.recruiter, s.division, s.department, s.start_date, s.source_name
+        FROM candidates_snapshot s
+        JOIN uploads_log f ON f.upload_id = s.valid_from
+        LEFT JOIN uploads_log t ON t.upload_id = s.valid_to
+        WHERE s.app_hash = ?
+        ORDER BY s.valid_from
+        """
+        try:
+            versions = pd.read_sql(query, self.conn, params=(app_hash,))
+            versions['valid_to'] = versions['valid_to'].astype('Int64')
+            return versions
+        except Exception:
+            return pd.DataFrame()
+
     def get_upload_history(self):
         try:
             return pd.read_sql("SELECT * FROM uploads_log ORDER BY upload_date DESC", self.conn)
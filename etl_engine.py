@@ -2,22 +2,138 @@
 import pandas as pd
 import numpy as np
 import hashlib
+import codecs
+import itertools
+import openpyxl
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import config
 
+CHUNK_ROWS = 50_000
+FALLBACK_ENCODING = "iso-8859-8"
+
+# Low-cardinality text fields are parsed straight into categoricals
+CATEGORICAL_FIELDS = ['status', 'recruiter', 'division']
+CATEGORY_DTYPES = {raw: 'category' for raw, field in config.RAW_DATA_MAPPING.items() if field in CATEGORICAL_FIELDS}
+
+# Above this many distinct applications the hashing is fanned out to a process pool
+PARALLEL_HASH_MIN = 500_000
+HASH_BATCH_SIZE = 100_000
+
+
+def _is_utf8(stream):
+    """Validates the whole file as UTF-8 in 1MB blocks, then rewinds.
+    A sample is not enough: a chunked reader would hit the first bad byte after earlier chunks were loaded"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        stream.seek(0)
+
+
+def sniff_format(uploaded_file):
+    """xlsx / xls / csv from the magic bytes, then rewinds"""
+    head = uploaded_file.read(4)
+    uploaded_file.seek(0)
+
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        return "xls"
+    return "csv"
+
+
+def sniff_file(uploaded_file):
+    """Detects format and, for CSV, an encoding that decodes the whole file (BOM first); rewinds"""
+    file_format = sniff_format(uploaded_file)
+    if file_format != "csv":
+        return file_format, None
+    if uploaded_file.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+        uploaded_file.seek(0)
+        return "csv", "utf-8-sig"
+    uploaded_file.seek(0)
+    return "csv", "utf-8" if _is_utf8(uploaded_file) else FALLBACK_ENCODING
+
+
+def read_csv(uploaded_file, encoding, **kwargs):
+    """encoding_errors="replace": a stray byte the codec can't map becomes U+FFFD instead of failing mid-file"""
+    return pd.read_csv(uploaded_file, encoding=encoding, encoding_errors="replace", **kwargs)
+
+
+def iter_xlsx_frames(uploaded_file, chunk_rows=CHUNK_ROWS):
+    """Raw DataFrames of at most chunk_rows rows; read-only mode streams rows out of the sheet XML"""
+    wb = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h) if h is not None else "" for h in next(rows, ())]
+        while True:
+            batch = list(itertools.islice(rows, chunk_rows))
+            if not batch:
+                break
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        wb.close()
+
+
+def iter_raw_frames(uploaded_file, chunk_rows=CHUNK_ROWS, dtype=None):
+    """Raw (uncleaned) DataFrames of at most chunk_rows rows, for any supported format"""
+    file_format, encoding = sniff_file(uploaded_file)
+
+    if file_format == "xlsx":
+        yield from iter_xlsx_frames(uploaded_file, chunk_rows)
+    elif file_format == "xls":
+        # Legacy .xls (BIFF) has no streaming reader
+        yield pd.read_excel(uploaded_file, dtype=dtype)
+    else:
+        yield from read_csv(uploaded_file, encoding, dtype=dtype, chunksize=chunk_rows)
+
+
+def _md5_batch(keys):
+    return [hashlib.md5(key.encode()).hexdigest() for key in keys]
+
+
+def hash_applications(candidate_names, job_titles):
+    """md5(candidate_name + job_title) over whole columns: each distinct pair is hashed once"""
+    codes, uniques = pd.factorize(candidate_names.map(str) + job_titles.map(str))
+    uniques = uniques.tolist()
+
+    workers = os.cpu_count() or 1
+    if len(uniques) >= PARALLEL_HASH_MIN and workers > 1:
+        batches = [uniques[i:i + HASH_BATCH_SIZE] for i in range(0, len(uniques), HASH_BATCH_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            digests = list(itertools.chain.from_iterable(pool.map(_md5_batch, batches)))
+    else:
+        digests = _md5_batch(uniques)
+
+    return np.asarray(digests, dtype=object)[codes]
+
+
 class ETLEngine:
     def process_file(self, uploaded_file):
         """The Master Function: Turns raw file into clean Dataframe"""
         
-        # 1. Smart Load (Handling Encoding)
-        try:
-            df = pd.read_csv(uploaded_file)
-        except UnicodeDecodeError:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, encoding='iso-8859-8')
-        except Exception:
-            uploaded_file.seek(0)
-            df = pd.read_excel(uploaded_file)
+        # 1. Smart Load: format & encoding are sniffed once, then the file is parsed exactly once
+        file_format, encoding = sniff_file(uploaded_file)
+        if file_format == "csv":
+            df = read_csv(uploaded_file, encoding, dtype=CATEGORY_DTYPES)
+        else:
+            df = pd.read_excel(uploaded_file, dtype=CATEGORY_DTYPES)
+
+        return self.clean(df)
+
+    def iter_chunks(self, uploaded_file, chunk_rows=CHUNK_ROWS):
+        """Streaming mode: yields clean DataFrames of at most chunk_rows rows (bounded memory)"""
+        for chunk in iter_raw_frames(uploaded_file, chunk_rows, dtype=CATEGORY_DTYPES):
+            yield self.clean(chunk)
+
+    def clean(self, df):
+        """Validates, renames and enriches a raw DataFrame (a whole file or a single chunk)"""
 
         # 2. Validation
         missing_cols = [col for col in config.RAW_DATA_MAPPING.keys() if col not in df.columns]
@@ -29,6 +145,8 @@ class ETLEngine:
         clean_df = df[list(config.RAW_DATA_MAPPING.values())].copy()
 
         # 4. Data Type Conversion
+        for col in CATEGORICAL_FIELDS:
+            clean_df[col] = clean_df[col].astype('category')
         clean_df['start_date'] = pd.to_datetime(clean_df['start_date'], errors='coerce')
         # If no start date, assume today (to avoid errors)
         clean_df['start_date'] = clean_df['start_date'].fillna(pd.Timestamp.now())
@@ -40,8 +158,6 @@ class ETLEngine:
 
         # 6. Generate Unique Hash (Candidate + Job)
         # This helps us identify the same application across different weekly files
-        clean_df['app_hash'] = clean_df.apply(
-            lambda x: hashlib.md5(f"{x['candidate_name']}{x['job_title']}".encode()).hexdigest(), axis=1
-        )
+        clean_df['app_hash'] = hash_applications(clean_df['candidate_name'], clean_df['job_title'])
 
         return clean_df
@@ -78,13 +78,26 @@ export default function AdminCommandCenter() {
 
     try {
       const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/upload`, { method: "POST", body: formData });
-      const data = await res.json();
+      let data = await res.json();
 
-      if (res.ok) {
-        setFilesStatus(prev => ({ ...prev, [type]: { name: file.name, date: new Date().toLocaleTimeString('he-IL'), rows: data.rows_processed, status: "success" } }));
-        fetchSystemHealth(); 
+      // הקליטה רצה ברקע (202) - ממתינים לסיום העבודה ומציגים התקדמות בינתיים
+      while (res.ok && data.status_url && !["completed", "failed"].includes(data.phase)) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const jobRes = await fetch(`${process.env.NEXT_PUBLIC_API_URL}${data.status_url}`);
+        const job = await jobRes.json();
+        if (!jobRes.ok) { data = job; break; }
+        data = { ...job, status_url: data.status_url };
+        if (data.phase === "loading") {
+          setFilesStatus(prev => ({ ...prev, [type]: { name: file.name, date: "-", rows: data.progress_pct != null ? `${data.progress_pct}%` : data.rows_done, status: "pending" } }));
+        }
+      }
+
+      if (res.ok && data.phase === "completed") {
+        setFilesStatus(prev => ({ ...prev, [type]: { name: file.name, date: new Date().toLocaleTimeString('he-IL'), rows: data.result.rows_processed, status: "success" } }));
+        fetchSystemHealth();
       } else {
-        setFilesStatus(prev => ({ ...prev, [type]: { name: file.name, date: new Date().toLocaleTimeString('he-IL'), rows: "נכשל", status: "error", errorMsg: data.detail || "שגיאת קריאת קובץ" } }));
+        setFilesStatus(prev => ({ ...prev, [type]: { name: file.name, date: new Date().toLocaleTimeString('he-IL'), rows: "נכשל", status: "error", errorMsg: data.detail || data.error || "שגיאת קריאת קובץ" } }));
+        if (data.phase === "failed") fetchSystemHealth();
       }
     } catch (error: any) {
       setFilesStatus(prev => ({ ...prev, [type]: { name: file.name, date: "-", rows: "נכשל", status: "error", errorMsg: "השרת לא מגיב." } }));
@@ -18,6 +18,7 @@ interface Category {
   code: string;
   notes: string;
   subcategories: string[];
+  version?: number;
 }
 
 interface Vendor {
@@ -48,6 +49,22 @@ interface Invoice {
   file_url?: string;
 }
 
+interface SpendRollup {
+  name: string;
+  spend: number;
+  invoices: number;
+}
+
+interface CategorySummary extends SpendRollup {
+  subcategories: SpendRollup[];
+}
+
+interface FinopsSummary {
+  total_spend: number;
+  pending: { count: number; amount: number };
+  categories: CategorySummary[];
+}
+
 interface TabBtnProps {
   id: string;
   current: string;
@@ -63,6 +80,10 @@ const DEFAULT_CATEGORIES = [
   { id: 3, name: "כללי למיפוי", target: 0, previousYearSpend: 0, code: "NA", notes: "תיבת ממתינים", subcategories: ["אחר"] }
 ];
 
+// היומן נטען בעמודים מהשרת (keyset) - גודל התשובה קבוע גם כשההיסטוריה גדלה
+const LEDGER_PAGE_SIZE = 100;
+const PENDING_INBOX_SIZE = 60;
+
 const PIE_COLORS = ['#002649', '#EF6B00', '#3b82f6', '#8b5cf6', '#10b981', '#f43f5e', '#14b8a6'];
 
 function getStatusColor(status: string): string {
@@ -76,8 +97,13 @@ export default function UnifiedBudgetPage() {
   const [isLoading, setIsLoading] = useState(true);
   
   const [categories, setCategories] = useState<Category[]>([]);
+  // קטגוריות שנמחקו מקומית (עם הגרסה שנטענה) - נשלחות בסנכרון כדי שהשרת ימחק רק את מה שראינו
+  const [deletedCategories, setDeletedCategories] = useState<{ id: number; version: number }[]>([]);
   const [vendors, setVendors] = useState<Vendor[]>([]);
   const [invoices, setInvoices] = useState<Invoice[]>([]);
+  const [ledgerCursor, setLedgerCursor] = useState<string | null>(null);
+  const [pendingInvoices, setPendingInvoices] = useState<Invoice[]>([]);
+  const [summary, setSummary] = useState<FinopsSummary | null>(null);
   
   const [budgetTarget] = useState(380000); 
   
@@ -96,25 +122,32 @@ export default function UnifiedBudgetPage() {
   const [isYoYCompare, setIsYoYCompare] = useState(false);
 
   // --- תקשורת לשרת הפייתון (API) ---
+  const toInvoice = (i: Invoice) => ({ ...i, dueDate: i.due_date, budgetMonth: i.budget_month, fileUrl: i.file_url });
+
+  const loadCategories = (rows: (Category & { previous_year_spend?: number })[]) => {
+    setCategories(rows.map(c => ({...c, previousYearSpend: c.previous_year_spend ?? 0})));
+    setDeletedCategories([]);
+  };
+
   const fetchFinopsData = async () => {
     setIsLoading(true);
     try {
-      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/data`);
-      const data = await res.json();
+      // נתוני אב, סיכומים מחושבים בשרת ותיבת הממתינים - בלי להוריד את כל החשבוניות
+      const [data, totals, inbox] = await Promise.all([
+        fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/data`).then(res => res.json()),
+        fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/summary`).then(res => res.json()),
+        fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/invoices?pending=true&limit=${PENDING_INBOX_SIZE}`).then(res => res.json())
+      ]);
       
       if (data.categories && data.categories.length > 0) {
-        setCategories(data.categories.map((c: Category & { previous_year_spend?: number }) => ({...c, previousYearSpend: c.previous_year_spend ?? 0})));
+        loadCategories(data.categories);
       } else {
         setCategories(DEFAULT_CATEGORIES);
       }
       
       if (data.vendors) setVendors(data.vendors);
-      
-      if (data.invoices) {
-        setInvoices(data.invoices.map((i: Invoice) => ({
-          ...i, dueDate: i.due_date, budgetMonth: i.budget_month, fileUrl: i.file_url
-        })));
-      }
+      if (totals.categories) setSummary(totals);
+      if (inbox.items) setPendingInvoices(inbox.items.map(toInvoice));
     } catch (e) {
       console.error("Failed to fetch data", e);
     } finally {
@@ -122,10 +155,36 @@ export default function UnifiedBudgetPage() {
     }
   };
 
+  // עמוד ביומן: בלי cursor - מתחילים מחדש (חיפוש חדש), עם cursor - "טען עוד"
+  const fetchLedger = async (search: string, cursor: string | null = null) => {
+    try {
+      const params = new URLSearchParams({ limit: String(LEDGER_PAGE_SIZE) });
+      if (search) params.set("q", search);
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/invoices?${params}`);
+      const page = await res.json();
+      const items = (page.items || []).map(toInvoice);
+      setInvoices(prev => cursor ? [...prev, ...items] : items);
+      setLedgerCursor(page.next_cursor ?? null);
+    } catch (e) {
+      console.error("Failed to fetch ledger", e);
+    }
+  };
+
+  const refreshFinops = () => {
+    fetchFinopsData();
+    fetchLedger(ledgerSearch);
+  };
+
   useEffect(() => {
     fetchFinopsData();
   }, []);
 
+  useEffect(() => {
+    const timer = setTimeout(() => fetchLedger(ledgerSearch), 300);
+    return () => clearTimeout(timer);
+  }, [ledgerSearch]);
+
   // --- פעולות שמירה ל-DB (CRUD) ---
   const handleSaveInvoice = async (invoice: Invoice) => {
     if (invoice.category !== "כללי למיפוי" && invoice.status === "ממתין למיפוי") {
@@ -136,33 +195,44 @@ export default function UnifiedBudgetPage() {
       body: JSON.stringify(invoice)
     });
     setEditingInvoice(null);
-    fetchFinopsData(); 
+    refreshFinops(); 
   };
 
   const handleDeleteInvoice = async (id: string) => {
     if (globalThis.confirm("מחיקת החשבונית היא לצמיתות (תירשם ביומן מערכת). לאשר?")) {
       await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/invoice/${id}`, { method: "DELETE" });
-      fetchFinopsData();
+      refreshFinops();
     }
   };
 
   const handleSaveVendor = async (vendor: Partial<Vendor>) => {
     const newVendor = vendor.id ? vendor : { ...vendor, id: `v-${Date.now()}` };
-    await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/save_vendor`, {
+    const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/save_vendor`, {
       method: "POST", headers: { "Content-Type": "application/json" },
       body: JSON.stringify(newVendor)
     });
+    if (res.status === 409) {
+      alert((await res.json()).detail);
+      return;
+    }
     setEditingVendor(null);
-    fetchFinopsData();
+    refreshFinops();
   };
 
   const handleSaveCategoriesDB = async () => {
-    await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/save_categories`, {
+    const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/finops/save_categories`, {
       method: "POST", headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(categories)
+      body: JSON.stringify({ categories, deleted: deletedCategories })
     });
+    if (res.status === 409) {
+      // משתמש אחר שמר קודם - השרת לא החיל כלום ומחזיר את המצב העדכני
+      const { detail } = await res.json();
+      alert(`${detail.message}. הקטגוריות נטענו מחדש - יש לבצע את השינויים שוב.`);
+      loadCategories(detail.categories);
+      return;
+    }
     setIsCategoryManagerOpen(false);
-    fetchFinopsData();
+    refreshFinops();
   };
 
   const handleVendorClick = (vendorName: string) => {
@@ -217,17 +287,16 @@ export default function UnifiedBudgetPage() {
   };
 
   // --- חישובים אסטרטגיים ---
-  const pendingInvoices = invoices.filter(inv => inv.category === "כללי למיפוי" || inv.status === "ממתין למיפוי");
-  const mappedInvoices = invoices.filter(inv => inv.category !== "כללי למיפוי" && inv.status !== "ממתין למיפוי");
-  
-  const totalSpend = mappedInvoices.reduce((sum, inv) => sum + inv.amount, 0);
+  // הסכומים מגיעים מ-/api/finops/summary (חשבוניות ממופות בלבד, כמו קודם)
+  const pendingCount = summary?.pending.count ?? 0;
+  const totalSpend = summary?.total_spend ?? 0;
   const budgetUtilization = budgetTarget > 0 ? (totalSpend / budgetTarget) * 100 : 0;
 
-  const spendByCategory = mappedInvoices.reduce((acc: Record<string, number>, inv) => {
-    acc[inv.category] = (acc[inv.category] || 0) + inv.amount;
-    return acc;
-  }, {});
-  const pieData = Object.keys(spendByCategory).map(key => ({ name: key, value: spendByCategory[key] }));
+  const categorySummaries = summary?.categories ?? [];
+  const spendByCategory: Record<string, number> = Object.fromEntries(categorySummaries.map(c => [c.name, c.spend]));
+  const subcategorySpend = (categoryName: string, sub: string) =>
+    categorySummaries.find(c => c.name === categoryName)?.subcategories.find(s => s.name === sub)?.spend ?? 0;
+  const pieData = categorySummaries.filter(c => c.invoices > 0).map(c => ({ name: c.name, value: c.spend }));
 
   const monthsElapsed = 2; 
   const monthlyRunRate = totalSpend / monthsElapsed;
@@ -239,7 +308,12 @@ export default function UnifiedBudgetPage() {
   // --- פונקציות קטגוריות מקומיות ---
   const updateCategory = (id: number, field: string, value: string | number) => setCategories(categories.map(c => c.id === id ? { ...c, [field]: value } : c));
   const addCategory = () => setCategories([...categories, { id: Date.now(), name: "קטגוריה חדשה", target: 0, previousYearSpend: 0, code: "NEW", notes: "", subcategories: ["כללי"] }]);
-  const deleteCategory = (id: number) => globalThis.confirm("למחוק?") && setCategories(categories.filter(c => c.id !== id));
+  const deleteCategory = (id: number) => {
+    if (!globalThis.confirm("למחוק?")) return;
+    const removed = categories.find(c => c.id === id);
+    if (removed?.version !== undefined) setDeletedCategories([...deletedCategories, { id, version: removed.version }]);
+    setCategories(categories.filter(c => c.id !== id));
+  };
   const addSubcategory = (catId: number) => {
     const subName = prompt("הכנס שם תת-קטגוריה:");
     if (subName) setCategories(categories.map(c => c.id === catId ? { ...c, subcategories: [...c.subcategories, subName] } : c));
@@ -264,7 +338,7 @@ export default function UnifiedBudgetPage() {
         </div>
         <div className="flex gap-2 bg-slate-100 p-1 rounded-xl overflow-x-auto">
           <TabBtn id="analytics" current={activeTab} onClick={setActiveTab} icon={<PieChart size={16}/>} label="דשבורד ואנליטיקה" />
-          <TabBtn id="operations" current={activeTab} onClick={setActiveTab} icon={<Receipt size={16}/>} label="יומן ותפעול" alert={pendingInvoices.length} />
+          <TabBtn id="operations" current={activeTab} onClick={setActiveTab} icon={<Receipt size={16}/>} label="יומן ותפעול" alert={pendingCount} />
           <TabBtn id="vendors" current={activeTab} onClick={setActiveTab} icon={<Building2 size={16}/>} label="ספקים (CRM)" />
         </div>
       </div>
@@ -377,7 +451,7 @@ export default function UnifiedBudgetPage() {
                         <h4 className="text-xs font-bold text-slate-400 uppercase tracking-wider mb-4">פירוט הוצאות לפי תת-קטגוריה</h4>
                         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4">
                           {category.subcategories.map((sub: string) => {
-                            const subSpend = mappedInvoices.filter(inv => inv.category === category.name && inv.subcategory === sub).reduce((s, inv) => s + inv.amount, 0);
+                            const subSpend = subcategorySpend(category.name, sub);
                             return (
                               <div key={sub} className="bg-white p-4 rounded-xl border border-slate-200 shadow-sm flex justify-between items-center">
                                 <span className="font-bold text-slate-700">{sub}</span>
@@ -402,11 +476,11 @@ export default function UnifiedBudgetPage() {
       {activeTab === "operations" && (
         <div className="space-y-6 animate-in slide-in-from-right-4">
           
-          {pendingInvoices.length > 0 && (
+          {pendingCount > 0 && (
             <div className="bg-amber-50 border border-amber-200 rounded-2xl p-6 shadow-sm">
               <div className="flex items-center justify-between mb-4 border-b border-amber-200/50 pb-4">
                 <div className="flex items-center gap-3">
-                  <div className="bg-amber-500 text-white w-8 h-8 rounded-full flex items-center justify-center font-black shadow-inner">{pendingInvoices.length}</div>
+                  <div className="bg-amber-500 text-white w-8 h-8 rounded-full flex items-center justify-center font-black shadow-inner">{pendingCount}</div>
                   <div>
                     <h2 className="font-black text-amber-900">חשבוניות למיפוי (Inbox)</h2>
                     <p className="text-xs text-amber-700">חשבוניות שחולצו ע&quot;י ה-AI וממתינות לאישור חודש שיוך וקטגוריה.</p>
@@ -491,7 +565,7 @@ export default function UnifiedBudgetPage() {
                     </tr>
                   </thead>
                   <tbody className="divide-y divide-slate-100">
-                    {invoices.filter(i => i.vendor.includes(ledgerSearch) || i.category.includes(ledgerSearch)).map((inv) => (
+                    {invoices.map((inv) => (
                       <tr key={inv.id} className="hover:bg-blue-50 group transition-colors">
                         <td className="px-4 py-3 font-bold text-[#002649] truncate max-w-[120px]">{inv.vendor}</td>
                         <td className="px-4 py-3">
@@ -518,6 +592,11 @@ export default function UnifiedBudgetPage() {
                   </tbody>
                 </table>
                 {invoices.length === 0 && <div className="p-8 text-center text-slate-400 font-bold">יומן החשבוניות ריק. העלה חשבונית כדי להתחיל.</div>}
+                {ledgerCursor && (
+                  <button onClick={() => fetchLedger(ledgerSearch, ledgerCursor)} className="w-full py-3 text-xs font-bold text-[#002649] hover:bg-slate-50 border-t border-slate-100">
+                    טען חשבוניות נוספות
+                  </button>
+                )}
               </div>
             </div>
           </div>